@@ -0,0 +1,305 @@
+# -*- coding: utf-8 -*-
+# ENVY — 외부 API 응답 디스크 캐시
+#   st.cache_data 는 프로세스 메모리라 재배포/재시작/두 번째 프로세스마다 빈 캐시로 시작해 쿼터를 다시 쓴다.
+#   이 모듈은 같은 호스트의 모든 Streamlit 프로세스가 공유하는 SQLite 캐시 (WAL, TTL + 용량 초과 시 LRU 삭제).
+#   키는 정규화한 요청 (엔드포인트 + 파라미터 dict) 의 해시, 값은 pickle.
+#
+#   @api_cache.stale_on("datalab", key=_key, errors=(QuotaExceeded,))   # 거절 → 만료된 값 (메모리 캐시 밖)
+#   @st.cache_data(ttl=1800)                                             # 워밍된 호출은 여기서 끝 (SQLite 안 감)
+#   @api_cache.cached("datalab", ttl=6 * 3600, key=_key)                 # 디스크 — 프로세스 간 공유
+#   def _datalab_trend(...): ...
+import os, time, json, pickle, sqlite3, hashlib, threading, functools
+from typing import Any, Callable, Dict, List, Optional
+
+# ──────────────────────────────────────────────────────────────
+# 설정
+# ──────────────────────────────────────────────────────────────
+CACHE_PATH = os.environ.get("ENVY_API_CACHE") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "_cache", "api_cache.db")
+MAX_BYTES = 64 * 1024 * 1024   # 값 크기 합이 이를 넘으면 오래 안 쓴 항목부터 삭제 (90% 까지)
+TOUCH_EVERY = 60               # 조회 시각(LRU 기준) 갱신 최소 간격(초) — 조회마다 쓰기 방지
+STATS_FLUSH_SEC = 10           # 적중/미스 카운트를 DB 에 더하는 간격
+
+_MISS = object()
+
+def _open(path: str) -> sqlite3.Connection:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    con = sqlite3.connect(path, timeout=30, isolation_level=None)
+    con.execute("PRAGMA journal_mode=WAL")
+    con.execute("PRAGMA synchronous=NORMAL")
+    return con
+
+def normalize(obj: Any) -> Any:
+    """키 정규화 — 문자열은 strip, dict 는 키 정렬, None/빈 값 제거."""
+    if isinstance(obj, str):
+        return obj.strip()
+    if isinstance(obj, dict):
+        return {str(k): normalize(v) for k, v in sorted(obj.items()) if v not in (None, "", [], {})}
+    if isinstance(obj, (list, tuple)):
+        return [normalize(v) for v in obj]
+    return obj
+
+def make_key(ns: str, params: Any) -> str:
+    raw = json.dumps([ns, normalize(params)], ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+def _is_empty(v: Any) -> bool:
+    return v is None or bool(getattr(v, "empty", False)) or (isinstance(v, (list, dict)) and not v)
+
+class DiskCache:
+    """
+    get/set 은 스레드 안전 (스레드별 연결). 적중/미스는 메모리에 모았다가 주기적으로 증분을 더한다
+    (여러 프로세스 합산). 만료된 항목도 용량 정리 전까지 남아 있어 get(..., stale=True) 로 꺼낼 수 있다.
+    """
+    def __init__(self, path: str = None):
+        self.path = path or CACHE_PATH
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._pending: Dict[str, list] = {}   # ns → [hits, misses, stale]
+        self._flushed = time.monotonic()
+
+    def _con(self) -> sqlite3.Connection:
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = _open(self.path)
+            con.execute("""CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY, ns TEXT, params TEXT, value BLOB, size INTEGER, created REAL, accessed REAL)""")
+            con.execute("CREATE INDEX IF NOT EXISTS entries_lru ON entries (accessed)")
+            con.execute("CREATE INDEX IF NOT EXISTS entries_ns ON entries (ns)")
+            con.execute("CREATE TABLE IF NOT EXISTS stats (ns TEXT PRIMARY KEY, hits INTEGER, misses INTEGER, stale INTEGER)")
+            self._local.con = con
+        return con
+
+    # ---- 조회/저장 ----
+    def get(self, ns: str, params: Any, ttl: float, stale: bool = False) -> Any:
+        """TTL 안의 값 → 값, 없으면 _MISS. stale=True 면 만료된 값도 반환 (쿼터 부족/실패 시 대체용)."""
+        key = make_key(ns, params)
+        row = self._con().execute("SELECT value, created, accessed FROM entries WHERE key=?", (key,)).fetchone()
+        now = time.time()
+        if row is None or (not stale and now - row[1] > ttl):
+            self._count(ns, 1)
+            return _MISS
+        try:
+            val = pickle.loads(row[0])
+        except Exception:
+            self._count(ns, 1)
+            return _MISS
+        self._count(ns, 2 if now - row[1] > ttl else 0)
+        if now - row[2] > TOUCH_EVERY:
+            self._con().execute("UPDATE entries SET accessed=? WHERE key=?", (now, key))
+        return val
+
+    def set(self, ns: str, params: Any, value: Any):
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        now = time.time()
+        self._con().execute(
+            "INSERT OR REPLACE INTO entries (key, ns, params, value, size, created, accessed) VALUES (?,?,?,?,?,?,?)",
+            (make_key(ns, params), ns, json.dumps(normalize(params), ensure_ascii=False, default=str)[:500], blob, len(blob), now, now))
+        self._evict()
+
+    def _evict(self):
+        con = self._con()
+        total = con.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= MAX_BYTES:
+            return
+        target = total - int(MAX_BYTES * 0.9)
+        freed, keys = 0, []
+        for key, size in con.execute("SELECT key, size FROM entries ORDER BY accessed"):
+            keys.append(key); freed += size
+            if freed >= target:
+                break
+        con.executemany("DELETE FROM entries WHERE key=?", [(k,) for k in keys])
+
+    # ---- 통계/무효화 ----
+    def _count(self, ns: str, slot: int):
+        with self._lock:
+            self._pending.setdefault(ns, [0, 0, 0])[slot] += 1
+            due = time.monotonic() - self._flushed > STATS_FLUSH_SEC
+        if due:
+            self.flush_stats()
+
+    def flush_stats(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._flushed = time.monotonic()
+        if not pending:
+            return
+        self._con().executemany(
+            """INSERT INTO stats (ns, hits, misses, stale) VALUES (?,?,?,?)
+               ON CONFLICT(ns) DO UPDATE SET hits=hits+excluded.hits, misses=misses+excluded.misses, stale=stale+excluded.stale""",
+            [(ns, h, m, s) for ns, (h, m, s) in pending.items()])
+
+    def stats(self) -> List[dict]:
+        """ns 별 항목 수/크기/적중/미스 (모든 프로세스 합산)."""
+        self.flush_stats()
+        con = self._con()
+        sizes = {ns: (n, b) for ns, n, b in con.execute("SELECT ns, COUNT(*), SUM(size) FROM entries GROUP BY ns")}
+        hits = {ns: (h, m, s) for ns, h, m, s in con.execute("SELECT ns, hits, misses, stale FROM stats")}
+        rows = []
+        for ns in sorted(set(sizes) | set(hits)):
+            n, b = sizes.get(ns, (0, 0)); h, m, s = hits.get(ns, (0, 0, 0))
+            rows.append({"ns": ns, "entries": n, "kb": round((b or 0) / 1024, 1), "hits": h, "misses": m, "stale": s,
+                         "hit_rate": round(h / (h + m), 3) if h + m else None})
+        return rows
+
+    def invalidate(self, ns: Optional[str] = None) -> int:
+        """ns 의 항목 전체 삭제 (None 이면 전부). → 삭제 수"""
+        con = self._con()
+        cur = con.execute("DELETE FROM entries WHERE ns=?", (ns,)) if ns else con.execute("DELETE FROM entries")
+        return cur.rowcount
+
+_CACHE: Optional[DiskCache] = None
+_CACHE_LOCK = threading.Lock()
+
+def cache() -> DiskCache:
+    global _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = DiskCache()
+        return _CACHE
+
+def cached(ns: str, ttl: float, key: Callable[..., Any]):
+    """
+    함수 결과를 디스크 캐시에 둔다. key(*args, **kw) 는 정규화할 요청 dict.
+    빈 결과(빈 DataFrame/None)는 실패로 보고 저장하지 않고, 만료된 값이 남아 있으면 그 값을 돌려준다.
+    예외(쿼터 거절 등)는 그대로 올림 — 만료값 대체는 st.cache_data 바깥의 stale_on() 이 담당.
+    캐시 DB 오류는 원 함수 호출로 폴백.
+    """
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kw):
+            try:
+                params = key(*args, **kw)
+                hit = cache().get(ns, params, ttl)
+            except Exception:
+                return fn(*args, **kw)
+            if hit is not _MISS:
+                return hit
+            val = fn(*args, **kw)
+            if not _is_empty(val):
+                try: cache().set(ns, params, val)
+                except Exception: pass
+                return val
+            try:   # 실패/쿼터 거절 → 만료됐어도 저장된 값이 있으면 그것으로
+                old = cache().get(ns, params, ttl, stale=True)
+            except Exception:
+                old = _MISS
+            return val if old is _MISS else old
+        return wrapper
+    return deco
+
+def stale_on(ns: str, key: Callable[..., Any], errors: tuple):
+    """
+    errors 예외가 나면 cached(ns) 가 저장해 둔 만료된 값으로 대체, 없으면 그대로 올림.
+    st.cache_data 바깥에 둔다 — 정상 호출은 캐시 DB 를 건드리지 않고, 대체값은 메모리에 남지 않음
+    (우선순위가 낮아 거절된 prefetch 결과가 이후 interactive 호출까지 막지 않도록).
+    """
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kw):
+            try:
+                return fn(*args, **kw)
+            except errors:
+                try:
+                    old = cache().get(ns, key(*args, **kw), 0, stale=True)
+                except Exception:
+                    old = _MISS
+                if old is _MISS:
+                    raise
+                return old
+        return wrapper
+    return deco
+
+# ──────────────────────────────────────────────────────────────
+# 키워드별 트렌드 시계열 (DataLab)
+# ──────────────────────────────────────────────────────────────
+class TrendStore:
+    """
+    DataLab 값은 요청(최대 5그룹) 안에서만 상대값이라, 요청마다 같은 기준 키워드(anchor)를 넣고
+    키워드별로 '같은 날짜 anchor 대비 비율(rel)' 을 저장한다 → 어느 그룹에서 받았든 같은 척도.
+    anchor 자신의 날짜별 수준(level)은 겹치는 날짜의 중앙값 비율로 기존 값에 이어 붙여 한 척도로 유지.
+    표시값 = rel × level (호출 측에서 최대 100 으로 다시 맞춤).
+    """
+    def __init__(self, path: str = None):
+        self.path = path or CACHE_PATH
+        self._local = threading.local()
+
+    def _con(self) -> sqlite3.Connection:
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = _open(self.path)
+            con.execute("""CREATE TABLE IF NOT EXISTS trend_points (
+                keyword TEXT, unit TEXT, date TEXT, rel REAL, PRIMARY KEY (keyword, unit, date))""")
+            con.execute("""CREATE TABLE IF NOT EXISTS trend_cover (
+                keyword TEXT, unit TEXT, anchor TEXT, start TEXT, end TEXT, fetched REAL, PRIMARY KEY (keyword, unit))""")
+            con.execute("""CREATE TABLE IF NOT EXISTS trend_anchor (
+                anchor TEXT, unit TEXT, date TEXT, level REAL, PRIMARY KEY (anchor, unit, date))""")
+            self._local.con = con
+        return con
+
+    def missing(self, keywords: List[str], unit: str, anchor: str, start: str, end: str, ttl: float) -> List[str]:
+        """[start, end] 전체를 TTL 안에 같은 anchor 로 받아 둔 적이 없는 키워드."""
+        con, now, out = self._con(), time.time(), []
+        for k in keywords:
+            row = con.execute("SELECT anchor, start, end, fetched FROM trend_cover WHERE keyword=? AND unit=?", (k, unit)).fetchone()
+            if not row or row[0] != anchor or row[1] > start or row[2] < end or now - row[3] > ttl:
+                out.append(k)
+        return out
+
+    def put(self, unit: str, anchor: str, start: str, end: str, anchor_series: Dict[str, float],
+            rels: Dict[str, Dict[str, float]], ttl: float):
+        """요청 1건 결과 저장. anchor_series: 날짜→원 ratio, rels: 키워드→(날짜→anchor 대비 비율, 데이터 없음이면 {})."""
+        con, now = self._con(), time.time()
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            old = dict(con.execute("SELECT date, level FROM trend_anchor WHERE anchor=? AND unit=? AND date BETWEEN ? AND ?",
+                                   (anchor, unit, start, end)).fetchall())
+            ratios = sorted(old[d] / v for d, v in anchor_series.items() if d in old and v > 0 and old[d] > 0)
+            factor = ratios[len(ratios) // 2] if ratios else 1.0   # 겹침이 없으면 이 요청이 새 기준
+            con.executemany("INSERT OR REPLACE INTO trend_anchor (anchor, unit, date, level) VALUES (?,?,?,?)",
+                            [(anchor, unit, d, v * factor) for d, v in anchor_series.items()])
+            for k, series in rels.items():
+                con.executemany("INSERT OR REPLACE INTO trend_points (keyword, unit, date, rel) VALUES (?,?,?,?)",
+                                [(k, unit, d, r) for d, r in series.items()])
+            for k in list(rels) + [anchor]:   # anchor 자신도 구간 기록 (anchor 만 조회하는 경우)
+                row = con.execute("SELECT anchor, start, end, fetched FROM trend_cover WHERE keyword=? AND unit=?", (k, unit)).fetchone()
+                s0, e0 = start, end
+                if row and row[0] == anchor and now - row[3] <= ttl:   # 유효한 기존 구간과 합침
+                    s0, e0 = min(s0, row[1]), max(e0, row[2])
+                con.execute("INSERT OR REPLACE INTO trend_cover (keyword, unit, anchor, start, end, fetched) VALUES (?,?,?,?,?,?)",
+                            (k, unit, anchor, s0, e0, now))
+            con.execute("COMMIT")
+        except Exception:
+            con.execute("ROLLBACK")
+            raise
+
+    def series(self, keywords: List[str], unit: str, anchor: str, start: str, end: str) -> Dict[str, Dict[str, float]]:
+        """키워드 → (날짜 → rel × anchor level). anchor 자신은 level 그대로."""
+        con = self._con()
+        level = dict(con.execute("SELECT date, level FROM trend_anchor WHERE anchor=? AND unit=? AND date BETWEEN ? AND ?",
+                                 (anchor, unit, start, end)).fetchall())
+        out = {}
+        for k in keywords:
+            if k == anchor:
+                pts = dict(level)
+            else:
+                pts = {d: r * level[d] for d, r in con.execute(
+                    "SELECT date, rel FROM trend_points WHERE keyword=? AND unit=? AND date BETWEEN ? AND ?",
+                    (k, unit, start, end)) if d in level and r is not None}
+            if pts:
+                out[k] = pts
+        return out
+
+    def invalidate(self) -> int:
+        con = self._con()
+        n = con.execute("DELETE FROM trend_cover").rowcount
+        con.execute("DELETE FROM trend_points"); con.execute("DELETE FROM trend_anchor")
+        return n
+
+_TRENDS: Optional[TrendStore] = None
+
+def trend_store() -> TrendStore:
+    global _TRENDS
+    with _CACHE_LOCK:
+        if _TRENDS is None:
+            _TRENDS = TrendStore()
+        return _TRENDS
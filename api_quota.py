@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+# ENVY — 외부 API 쿼터 관리
+#   API 별 토큰 버킷(초당 호출) + 키별 일일 사용량 장부(SQLite, 모든 프로세스 공유) + 우선순위.
+#   app.py 의 공용 HTTP 클라이언트가 요청 전에 acquire() 를 부르고, 거절되면 QuotaExceeded 를 던진다
+#   → 각 fetcher 는 실패로 처리하고 디스크 캐시의 만료된 값으로 대체한다.
+#
+#   interactive : 사용자가 지금 기다리는 결과 — 토큰을 먼저 받고, 일일 한도 끝까지 쓸 수 있다
+#   prefetch    : 있으면 좋은 보조 조회 — interactive 대기 중엔 양보, 남은 일일 한도가 RESERVE 이하면 거절
+import os, time, sqlite3, hashlib, datetime as dt, threading, contextvars
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+# ──────────────────────────────────────────────────────────────
+# 설정
+# ──────────────────────────────────────────────────────────────
+LEDGER_PATH = os.environ.get("ENVY_API_QUOTA") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "_cache", "api_quota.db")
+
+# rate: 초당 토큰, burst: 버킷 크기, daily: 키당 일일 한도 (None = 무제한, 장부만 기록)
+LIMITS: Dict[str, dict] = {
+    "datalab":  {"rate": 8.0, "burst": 4, "daily": 1000},    # 검색어트렌드 — 애플리케이션당 1,000회/일
+    "searchad": {"rate": 2.0, "burst": 3, "daily": None},
+    "rakuten":  {"rate": 1.0, "burst": 1, "daily": None},    # applicationId 당 1회/초
+}   # 그 외 (쇼핑 검색 페이지 등) 는 장부 기록만 — 간격은 호출 측 limiter 가 조절
+PREFETCH_RESERVE = 0.2      # 일일 한도의 이 비율은 interactive 몫으로 남김
+WAIT_SEC = {"interactive": 8.0, "prefetch": 3.0}   # 토큰 대기 상한
+THROTTLE_SEC = 5.0          # 429 에 Retry-After 가 없을 때 멈출 시간
+KST = dt.timezone(dt.timedelta(hours=9))   # 네이버 일일 한도는 KST 자정 기준
+
+class QuotaExceeded(Exception):
+    def __init__(self, api: str, reason: str):
+        super().__init__(f"{api}: {reason}")
+        self.api, self.reason = api, reason
+
+_PRIORITY = contextvars.ContextVar("api_priority", default="interactive")
+
+@contextmanager
+def priority(level: str):
+    """with api_quota.priority("prefetch"): ... — 이 블록(같은 스레드) 안의 호출 우선순위."""
+    tok = _PRIORITY.set(level)
+    try:
+        yield
+    finally:
+        _PRIORITY.reset(tok)
+
+def key_id(secret: str) -> str:
+    """장부/관리자 표시에 쓰는 키 식별자 (원문 대신 앞 4자 + 해시)."""
+    s = (secret or "").strip()
+    return f"{s[:4]}…{hashlib.sha1(s.encode('utf-8')).hexdigest()[:6]}" if s else "-"
+
+def today() -> str:
+    return dt.datetime.now(KST).date().isoformat()
+
+# ──────────────────────────────────────────────────────────────
+# 토큰 버킷 (프로세스 내 — 같은 프로세스의 모든 세션/스레드 공유)
+# ──────────────────────────────────────────────────────────────
+class TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate, self.burst = rate, burst
+        self.tokens, self.stamp = float(burst), time.monotonic()
+        self.waiting = {"interactive": 0, "prefetch": 0}
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def take(self, level: str, timeout: float) -> bool:
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            self.waiting[level] += 1
+        try:
+            while True:
+                with self._lock:
+                    now = time.monotonic()
+                    self._refill(now)
+                    yield_turn = level == "prefetch" and self.waiting["interactive"] > 0
+                    if self.tokens >= 1 and not yield_turn:
+                        self.tokens -= 1
+                        return True
+                    wait = max((1 - self.tokens) / self.rate, 0.02) if self.tokens < 1 else 0.05
+                if now + wait > deadline:
+                    return False
+                time.sleep(min(wait, 0.25))
+        finally:
+            with self._lock:
+                self.waiting[level] -= 1
+
+    def throttle(self, seconds: float):
+        """429 → 버킷을 음수로 만들어 seconds 동안 토큰이 안 나오게."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens = min(self.tokens, -seconds * self.rate)
+
+    def level(self) -> float:
+        with self._lock:
+            self._refill(time.monotonic())
+            return self.tokens
+
+# ──────────────────────────────────────────────────────────────
+# 거버너
+# ──────────────────────────────────────────────────────────────
+class Governor:
+    def __init__(self, path: str = None):
+        self.path = path or LEDGER_PATH
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, TokenBucket] = {}
+
+    def _con(self) -> sqlite3.Connection:
+        con = getattr(self._local, "con", None)
+        if con is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            con = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            con.execute("""CREATE TABLE IF NOT EXISTS ledger (
+                api TEXT, key TEXT, day TEXT, used INTEGER DEFAULT 0, denied INTEGER DEFAULT 0,
+                throttled INTEGER DEFAULT 0, updated REAL, PRIMARY KEY (api, key, day))""")
+            self._local.con = con
+        return con
+
+    def bucket(self, api: str) -> Optional[TokenBucket]:
+        lim = LIMITS.get(api)
+        if not lim:
+            return None
+        with self._lock:
+            b = self._buckets.get(api)
+            if b is None:
+                b = self._buckets[api] = TokenBucket(lim["rate"], lim["burst"])
+            return b
+
+    def _bump(self, api: str, key: str, col: str):
+        self._con().execute(
+            f"""INSERT INTO ledger (api, key, day, {col}, updated) VALUES (?,?,?,1,?)
+                ON CONFLICT(api, key, day) DO UPDATE SET {col}={col}+1, updated=excluded.updated""",
+            (api, key, today(), time.time()))
+
+    def acquire(self, api: str, key: str = "-", level: Optional[str] = None):
+        """호출 1회 허가 (일일 장부 +1). 거절이면 QuotaExceeded."""
+        level = level or _PRIORITY.get()
+        daily = (LIMITS.get(api) or {}).get("daily")
+        if daily:
+            floor = daily * PREFETCH_RESERVE if level == "prefetch" else 0
+            if self.remaining(api, key) <= floor:
+                self._bump(api, key, "denied")
+                raise QuotaExceeded(api, "일일 한도 소진" if level == "interactive" else "일일 한도 여유 부족(prefetch)")
+        b = self.bucket(api)
+        if b and not b.take(level, WAIT_SEC.get(level, 3.0)):
+            self._bump(api, key, "denied")
+            raise QuotaExceeded(api, "호출 속도 제한 대기 초과")
+        if daily:
+            con = self._con()   # 확인~기록 사이 다른 프로세스가 끼어들지 않게
+            con.execute("BEGIN IMMEDIATE")
+            try:
+                used = con.execute("SELECT used FROM ledger WHERE api=? AND key=? AND day=?", (api, key, today())).fetchone()
+                if used and used[0] >= daily:
+                    con.execute("COMMIT")
+                    self._bump(api, key, "denied")
+                    raise QuotaExceeded(api, "일일 한도 소진")
+                self._bump(api, key, "used")
+                con.execute("COMMIT")
+            except QuotaExceeded:
+                raise
+            except Exception:
+                con.execute("ROLLBACK")
+                raise
+        else:
+            self._bump(api, key, "used")
+
+    def throttled(self, api: str, key: str = "-", retry_after: Optional[float] = None):
+        """서버가 429 를 돌려줬을 때 — 버킷을 잠시 비우고 장부에 기록."""
+        b = self.bucket(api)
+        if b:
+            b.throttle(retry_after if retry_after and retry_after > 0 else THROTTLE_SEC)
+        self._bump(api, key, "throttled")
+
+    def remaining(self, api: str, key: str = "-") -> Optional[int]:
+        daily = (LIMITS.get(api) or {}).get("daily")
+        if not daily:
+            return None
+        row = self._con().execute("SELECT used FROM ledger WHERE api=? AND key=? AND day=?", (api, key, today())).fetchone()
+        return max(0, daily - (row[0] if row else 0))
+
+    def low(self, api: str, key: str = "-") -> bool:
+        """남은 일일 한도가 prefetch 예비분 이하인가 (호출 측에서 조회 자체를 건너뛸 때)."""
+        rem, daily = self.remaining(api, key), (LIMITS.get(api) or {}).get("daily")
+        return rem is not None and rem <= daily * PREFETCH_RESERVE
+
+    def rows(self) -> List[dict]:
+        """오늘(KST) API·키별 사용량 — 관리자 표시용."""
+        out = []
+        for api, key, used, denied, thr in self._con().execute(
+                "SELECT api, key, used, denied, throttled FROM ledger WHERE day=? ORDER BY api, key", (today(),)):
+            daily = (LIMITS.get(api) or {}).get("daily")
+            b = self._buckets.get(api)
+            out.append({"api": api, "key": key, "used": used, "daily": daily,
+                        "remaining": max(0, daily - used) if daily else None,
+                        "denied": denied, "throttled": thr, "tokens": round(b.level(), 1) if b else None})
+        return out
+
+_GOV: Optional[Governor] = None
+_GOV_LOCK = threading.Lock()
+
+def governor() -> Governor:
+    global _GOV
+    with _GOV_LOCK:
+        if _GOV is None:
+            _GOV = Governor()
+        return _GOV
@@ -2,12 +2,16 @@
 # ENVY — Season 1 (Dual Proxy Edition, Radar tabs=국내/해외, Rakuten 샘플 제거, row1 ratio 8:5:3)
 # 통합본: 라쿠텐 샘플 제거 + 정확 매핑, 제목 생성기(필수 키워드 포함), 추천(user_kws 포함), 사이드바 컬러박스 복구, 11번가 배너 제거
 
-import base64, time, re, math, json, io, datetime as dt
+import base64, time, re, math, json, io, random, threading, datetime as dt
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 from urllib.parse import quote
 import pandas as pd
 import streamlit as st
 
+import api_cache
+import api_quota
+
 # -------- Optional imports --------
 try:
     import requests
@@ -329,6 +333,78 @@ def _get_view_bin():
     except:
         return 3
 
+# =========================
+# 2.9) 공용 HTTP 클라이언트 (Naver / Rakuten / 쇼핑)
+# =========================
+HTTP_TIMEOUT = (4, 12)        # (connect, read) 초
+HTTP_RETRIES = 3              # 429/5xx·연결 오류 재시도 횟수 (429 는 Retry-After 만큼 쉼)
+HTTP_BACKOFF = 0.5            # 재시도 간격 = backoff * 2^(n-1)
+HTTP_POOL_SIZE = 10           # 호스트별 keep-alive 커넥션 수
+
+class _HttpClient:
+    """앱 전역 1개 — 호스트별 keep-alive 풀 + 재시도 + API별 지연 기록(관리자 박스에 표시).
+    429/5xx 재시도는 여기서 직접 — 시도마다 쿼터 허가를 받아야 토큰 버킷/일일 장부가 실제 호출 수와 맞음."""
+    RETRY_STATUS = (429, 500, 502, 503, 504)
+
+    def __init__(self):
+        from requests.adapters import HTTPAdapter, Retry
+        # 어댑터는 연결 실패(요청이 서버에 닿지 않음)만 재시도
+        retry = Retry(total=HTTP_RETRIES, connect=HTTP_RETRIES, read=0, status=0, other=0, backoff_factor=HTTP_BACKOFF,
+                      respect_retry_after_header=False, raise_on_status=False)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=8, pool_maxsize=HTTP_POOL_SIZE, max_retries=retry)
+        self.session.mount("https://", adapter); self.session.mount("http://", adapter)
+        self._lock = threading.Lock()
+        self.stats = {}   # api → {"calls", "errors", "ms": 최근 지연 목록}
+
+    def request(self, method: str, url: str, api: str = "", key: str = "-", timeout=None, **kw):
+        """key: 쿼터 장부용 키 식별자 (api_quota.key_id). 쿼터/속도 제한에 걸리면 api_quota.QuotaExceeded."""
+        api = api or url.split("/")[2]
+        gov = api_quota.governor()
+        for attempt in range(HTTP_RETRIES + 1):
+            try: gov.acquire(api, key)
+            except api_quota.QuotaExceeded: raise
+            except Exception: pass   # 장부 DB 문제로 호출까지 막지는 않음
+            t0 = time.perf_counter(); ok = False
+            try:
+                r = self.session.request(method, url, timeout=timeout or HTTP_TIMEOUT, **kw)
+                ok = r.status_code < 400
+            finally:
+                self._record(api, (time.perf_counter() - t0) * 1000, ok)
+            if r.status_code not in self.RETRY_STATUS or attempt == HTTP_RETRIES:
+                return r
+            if r.status_code == 429:   # 버킷을 Retry-After 만큼 비움 → 다음 acquire 가 그만큼 기다림(너무 길면 QuotaExceeded)
+                try: ra = float(r.headers.get("Retry-After") or 0)
+                except ValueError: ra = 0
+                try: gov.throttled(api, key, ra)
+                except Exception: pass
+            else:
+                time.sleep(HTTP_BACKOFF * 2 ** attempt)
+        return r
+
+    def get(self, url: str, **kw): return self.request("GET", url, **kw)
+    def post(self, url: str, **kw): return self.request("POST", url, **kw)
+
+    def _record(self, api: str, ms: float, ok: bool):
+        with self._lock:
+            s = self.stats.setdefault(api, {"calls": 0, "errors": 0, "ms": []})
+            s["calls"] += 1; s["errors"] += (not ok)
+            s["ms"].append(ms); del s["ms"][:-500]
+
+    def metrics(self) -> pd.DataFrame:
+        rows = []
+        with self._lock:
+            for api, s in sorted(self.stats.items()):
+                ms = sorted(s["ms"]) or [0.0]
+                rows.append({"API": api, "호출": s["calls"], "실패": s["errors"], "평균(ms)": round(sum(ms) / len(ms)),
+                             "p50(ms)": round(ms[len(ms) // 2]), "p95(ms)": round(ms[min(len(ms) - 1, int(len(ms) * .95))]),
+                             "최대(ms)": round(ms[-1])})
+        return pd.DataFrame(rows)
+
+@st.cache_resource(show_spinner=False)
+def _http() -> "_HttpClient | None":
+    return _HttpClient() if requests else None
+
 # =========================
 # 3) Naver DataLab / Searchad 유틸
 # =========================
@@ -342,57 +418,126 @@ def _naver_keys_from_secrets():
     ak = _get_key("NAVER_API_KEY"); sk = _get_key("NAVER_SECRET_KEY"); cid= _get_key("NAVER_CUSTOMER_ID")
     return ak.strip(), sk.strip(), str(cid).strip()
 
+def _keywordstool_cache_key(hints):
+    return {"endpoint": "keywordstool", "hint": [h.strip().lower() for h in hints]}
+
+# 순서: 거절 시 만료값 대체(메모리 캐시 밖) → 메모리 → 디스크 — 워밍된 호출은 SQLite 까지 가지 않음
+@api_cache.stale_on("searchad", key=_keywordstool_cache_key, errors=(api_quota.QuotaExceeded,))
+@st.cache_data(ttl=3600, show_spinner=False)
+@api_cache.cached("searchad", ttl=24 * 3600, key=_keywordstool_cache_key)
+def _keywordstool_fetch(hints: tuple) -> pd.DataFrame:
+    """키워드도구 원 조회. 실패는 예외로 올림 — 실패/쿼터 거절이 캐시에 남지 않게."""
+    api_key, sec_key, customer_id = _naver_keys_from_secrets()
+    base_url="https://api.naver.com"; uri="/keywordstool"; ts = str(round(time.time()*1000))
+    headers = {"X-API-KEY": api_key, "X-Signature": _naver_signature(ts, "GET", uri, sec_key), "X-Timestamp": ts, "X-Customer": customer_id}
+    params={ "hintKeywords": ",".join(hints), "includeHintKeywords": "0", "showDetail": "1" }
+    r = _http().get(base_url+uri, api="searchad", key=api_quota.key_id(customer_id), headers=headers, params=params)
+    r.raise_for_status()
+
+    data = r.json().get("keywordList", [])[:200]
+    if not data: return pd.DataFrame()
+    df = pd.DataFrame(data).rename(columns={
+        "relKeyword":"키워드","monthlyPcQcCnt":"PC월간검색수","monthlyMobileQcCnt":"Mobile월간검색수",
+        "monthlyAvePcClkCnt":"PC월평균클릭수","monthlyAveMobileClkCnt":"Mobile월평균클릭수",
+        "monthlyAvePcCtr":"PC월평균클릭률","monthlyAveMobileCtr":"Mobile월평균클릭률",
+        "plAvgDepth":"월평균노출광고수","compIdx":"광고경쟁정도",
+    }).drop_duplicates(["키워드"]).reset_index(drop=True)
+    num_cols=["PC월간검색수","Mobile월간검색수","PC월평균클릭수","Mobile월평균클릭수","PC월평균클릭률","Mobile월평균클릭률","월평균노출광고수"]
+    for c in num_cols:
+        df[c]=pd.to_numeric(df[c], errors="coerce")
+    return df
+
 def _naver_keywordstool(hint_keywords: list[str]) -> pd.DataFrame:
     api_key, sec_key, customer_id = _naver_keys_from_secrets()
     if not (requests and api_key and sec_key and customer_id and hint_keywords):
         return pd.DataFrame()
-
-    base_url="https://api.naver.com"; uri="/keywordstool"; ts = str(round(time.time()*1000))
-    headers = {"X-API-KEY": api_key, "X-Signature": _naver_signature(ts, "GET", uri, sec_key), "X-Timestamp": ts, "X-Customer": customer_id}
-    params={ "hintKeywords": ",".join(hint_keywords), "includeHintKeywords": "0", "showDetail": "1" }
     try:
-        r = requests.get(base_url+uri, headers=headers, params=params, timeout=12)
-        r.raise_for_status()
+        return _keywordstool_fetch(tuple(hint_keywords))   # 쿼터 거절이면 저장된(만료 포함) 값이 있을 때 그 값
+    except api_quota.QuotaExceeded as e:
+        st.markdown(f"<div class='pill pill-yellow'>키워드도구 쿼터 제한 · {e.reason} — 저장된 결과도 없어 잠시 후 다시 시도하세요</div>", unsafe_allow_html=True)
     except Exception as e:
         code = getattr(getattr(e, "response", None), "status_code", "N/A")
         st.markdown(f"<div class='pill pill-yellow'>키워드도구 실패 · HTTP {code} — 키/시그니처/권한 확인</div>", unsafe_allow_html=True)
-        return pd.DataFrame()
-
-    try:
-        data = r.json().get("keywordList", [])[:200]
-        if not data: return pd.DataFrame()
-        df = pd.DataFrame(data).rename(columns={
-            "relKeyword":"키워드","monthlyPcQcCnt":"PC월간검색수","monthlyMobileQcCnt":"Mobile월간검색수",
-            "monthlyAvePcClkCnt":"PC월평균클릭수","monthlyAveMobileClkCnt":"Mobile월평균클릭수",
-            "monthlyAvePcCtr":"PC월평균클릭률","monthlyAveMobileCtr":"Mobile월평균클릭률",
-            "plAvgDepth":"월평균노출광고수","compIdx":"광고경쟁정도",
-        }).drop_duplicates(["키워드"]).reset_index(drop=True)
-        num_cols=["PC월간검색수","Mobile월간검색수","PC월평균클릭수","Mobile월평균클릭수","PC월평균클릭률","Mobile월평균클릭률","월평균노출광고수"]
-        for c in num_cols:
-            df[c]=pd.to_numeric(df[c], errors="coerce")
-        return df
-    except Exception:
-        return pd.DataFrame()
+    return pd.DataFrame()
+
+# ---- 네이버쇼핑 상품수: keep-alive 세션 풀 + 호스트별 요청 간격 + 키워드별 TTL 캐시 ----
+SHOP_COUNT_WORKERS = 6        # 동시 요청 수
+SHOP_MIN_INTERVAL = 0.25      # 같은 호스트 요청 간 최소 간격(초) — 동시 요청이어도 출발 시각은 이 간격으로 분산
+SHOP_COUNT_TTL = 6 * 3600     # 키워드별 상품수 캐시 유지(초)
+_SHOP_FILTER_CLASS_RE = re.compile(r"(?:^|\s)subFilter_filter__3Y-uy(?:\s|$)")
+
+class _HostRateLimiter:
+    """호스트별 최소 간격. 슬롯 예약은 lock 안, 대기는 lock 밖 (스레드 공용).
+    crawler_core.HostRateLimiter 와 같은 방식 — 앱이 셀레니움까지 끌어오지 않도록 따로 둠."""
+    MAX_HOSTS = 256
+    def __init__(self, interval: float, jitter: float = 0.0):
+        self.interval, self.jitter = interval, jitter
+        self._next, self._lock = {}, threading.Lock()
+    def wait(self, host: str):
+        with self._lock:
+            now = time.monotonic()
+            if len(self._next) >= self.MAX_HOSTS:   # 예약 시각이 지난 호스트는 기록이 없어도 결과가 같음
+                self._next = {h: t for h, t in self._next.items() if t > now}
+            slot = max(now, self._next.get(host, 0.0))
+            self._next[host] = slot + self.interval + random.uniform(0, self.jitter)
+        if slot > now: time.sleep(slot - now)
+
+SHOP_HEADERS = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 Chrome/121.0.0.0 Safari/537.36",
+                "Accept-Language": "ko-KR,ko;q=0.9"}
+
+@st.cache_resource(show_spinner=False)
+def _shopping_runtime() -> dict:
+    return {"limiter": _HostRateLimiter(SHOP_MIN_INTERVAL, 0.1), "cache": {}, "lock": threading.Lock()}
 
 def _count_product_from_shopping(keyword: str) -> int|None:
     if not requests: return None
+    rt = _shopping_runtime()
+    with rt["lock"]:
+        hit = rt["cache"].get(keyword)
+    if hit and time.time() - hit[0] < SHOP_COUNT_TTL:
+        return hit[1]
     try:
         url=f"https://search.shopping.naver.com/search/all?where=all&frm=NVSCTAB&query={quote(keyword)}"
-        r=requests.get(url, timeout=10); r.raise_for_status()
-        from bs4 import BeautifulSoup
-        soup = BeautifulSoup(r.text, "html.parser")
-        a_tags = soup.select("a.subFilter_filter__3Y-uy")
-        for a in a_tags:
+        rt["limiter"].wait("search.shopping.naver.com")
+        r=_http().get(url, api="shopping", headers=SHOP_HEADERS, timeout=(4, 10)); r.raise_for_status()
+        from bs4 import BeautifulSoup, SoupStrainer
+        # 필터 앵커만 파싱 (문서 전체 트리 생성 생략) — 파싱 단계의 class 는 분리 전 문자열이라 정규식으로 매칭
+        soup = BeautifulSoup(r.text, "html.parser", parse_only=SoupStrainer("a", class_=_SHOP_FILTER_CLASS_RE))
+        for a in soup.find_all("a"):
             if "전체" in a.text:
                 span = a.find("span")
                 if span:
                     txt = span.get_text().replace(",","").strip()
-                    return int(re.sub(r"[^0-9]", "", txt) or "0")
+                    cnt = int(re.sub(r"[^0-9]", "", txt) or "0")
+                    with rt["lock"]:
+                        rt["cache"][keyword] = (time.time(), cnt)
+                    return cnt
         return None
     except Exception:
         return None
 
-@st.cache_data(ttl=1800, show_spinner=False)
+def _count_products_parallel(keywords: list[str]):
+    """(키워드, 상품수|None) 을 끝나는 순서대로 yield — 호출 측에서 표를 점진 갱신."""
+    if not keywords: return
+    ex = ThreadPoolExecutor(max_workers=SHOP_COUNT_WORKERS)
+    try:
+        futs = {ex.submit(_count_product_from_shopping, k): k for k in dict.fromkeys(keywords)}
+        for f in as_completed(futs):
+            yield futs[f], f.result()
+    finally:
+        # 리런/중단으로 제너레이터가 닫히면 남은 요청은 버리고 바로 반환 (with 블록은 전부 끝날 때까지 대기)
+        ex.shutdown(wait=False, cancel_futures=True)
+
+# ---- DataLab: 동시 요청 수 (초당 호출·일일 한도는 api_quota 의 datalab 버킷/장부가 조절) ----
+DATALAB_WORKERS = 4
+
+def _datalab_cache_key(groups, start_date, end_date, time_unit="week", device="", gender="", ages=None):
+    return {"endpoint": "datalab/search", "groups": [[g.get("groupName"), [k.strip() for k in g.get("keywords", [])]] for g in (groups or [])[:5]],
+            "start": start_date, "end": end_date, "unit": time_unit, "device": device, "gender": gender, "ages": sorted(ages or [])}
+
+@api_cache.stale_on("datalab", key=_datalab_cache_key, errors=(api_quota.QuotaExceeded,))
+@st.cache_data(ttl=1800, show_spinner=False)   # 쿼터 거절은 예외로 빠져나가 메모리 캐시에 남지 않음
+@api_cache.cached("datalab", ttl=6 * 3600, key=_datalab_cache_key)
 def _datalab_trend(
     groups: list,
     start_date: str,
@@ -414,7 +559,7 @@ def _datalab_trend(
     payload = { "startDate": start_date, "endDate": end_date, "timeUnit": time_unit, "keywordGroups": (groups or [])[:5] }
 
     try:
-        r = requests.post(url, headers=headers, data=json.dumps(payload), timeout=12)
+        r = _http().post(url, api="datalab", key=api_quota.key_id(cid), headers=headers, data=json.dumps(payload))
         r.raise_for_status()
         js = r.json()
         rows = []
@@ -429,11 +574,69 @@ def _datalab_trend(
         big.rename(columns={"period": "날짜", "ratio": "검색지수"}, inplace=True)
         pv = big.pivot_table(index="날짜", columns="keyword", values="검색지수", aggfunc="mean")
         return pv.reset_index().sort_values("날짜")
+    except api_quota.QuotaExceeded:
+        raise
     except Exception:
         return pd.DataFrame()
 
-@st.cache_data(ttl=3600, show_spinner=False)
+# ---- 키워드별 트렌드: 요청마다 anchor 키워드를 넣어 한 척도로 맞춘 뒤 (키워드, 단위, 날짜) 단위로 캐시 ----
+DATALAB_ANCHOR = "선물"          # 검색량이 크고 꾸준한 기준 키워드 (secrets 의 DATALAB_ANCHOR 로 교체 가능)
+DATALAB_SERIES_TTL = 12 * 3600   # 키워드 시계열 재조회 주기 (마지막 주/월 구간이 갱신되도록)
+
+def _datalab_empty_msg(default: str) -> str:
+    try: rem = api_quota.governor().remaining("datalab", api_quota.key_id(_get_key("NAVER_CLIENT_ID")))
+    except Exception: rem = None
+    return "DataLab 오늘 쿼터를 모두 썼어요 (KST 자정 초기화) — 저장된 값도 없는 키워드입니다." if rem == 0 else default
+
+def _dl_anchor() -> str:
+    return (_get_key("DATALAB_ANCHOR") or DATALAB_ANCHOR).strip()
+
+def _dl_align_start(start: str, time_unit: str) -> str:
+    """주/월 경계로 당김 — 시작 구간이 잘린 채 저장되면 다른 기간 요청과 값이 어긋남."""
+    d = dt.date.fromisoformat(start)
+    if time_unit == "week": d -= dt.timedelta(days=d.weekday())
+    elif time_unit == "month": d = d.replace(day=1)
+    return d.isoformat()
+
+def _datalab_series(keywords: list[str], start: str, end: str, time_unit: str = "week",
+                    priority: str = "interactive") -> pd.DataFrame:
+    """_datalab_trend 와 같은 모양(날짜 + 키워드 열, 최대 100)이지만 키워드 수 제한 없이 캐시에서 조립.
+    캐시에 없는 키워드만 anchor + 4개씩 묶어 동시에 조회. 쿼터에 막힌 키워드는 만료된 저장값으로 대체."""
+    kws = list(dict.fromkeys(k.strip() for k in (keywords or []) if k and k.strip()))
+    if not kws: return pd.DataFrame()
+    anchor, start = _dl_anchor(), _dl_align_start(start, time_unit)
+    store = api_cache.trend_store()
+    try: todo = store.missing(kws, time_unit, anchor, start, end, DATALAB_SERIES_TTL)
+    except Exception: todo = []   # 캐시 DB 문제 → 아래 조립도 비게 되므로 결과 없음
+
+    def _fetch(chunk):
+        groups = [{"groupName": k, "keywords": [k]} for k in [anchor] + chunk]
+        with api_quota.priority(priority):   # 워커 스레드라 여기서 지정
+            ts = _datalab_trend(groups, start, end, time_unit=time_unit)
+        if ts.empty or anchor not in ts: return
+        ts = ts.set_index("날짜").apply(pd.to_numeric, errors="coerce")
+        base = ts[anchor].where(ts[anchor] > 0)
+        # 응답에 없는 키워드(검색량 없음)도 빈 시계열로 구간 기록 — 안 그러면 호출마다 다시 조회해 쿼터 낭비
+        rels = {k: (ts[k] / base).dropna().to_dict() if k in ts else {} for k in chunk}
+        store.put(time_unit, anchor, start, end, base.dropna().to_dict(), rels, DATALAB_SERIES_TTL)
+
+    rest = [k for k in todo if k != anchor]
+    chunks = [rest[i:i+4] for i in range(0, len(rest), 4)] or ([[]] if todo else [])
+    if chunks:
+        with ThreadPoolExecutor(max_workers=min(DATALAB_WORKERS, len(chunks))) as ex:
+            for f in as_completed([ex.submit(_fetch, c) for c in chunks]):
+                try: f.result()
+                except Exception: pass   # 실패한 묶음은 결과에서 빠짐 (다음 호출 때 다시 조회)
+    try: pts = store.series(kws, time_unit, anchor, start, end)
+    except Exception: return pd.DataFrame()
+    if not pts: return pd.DataFrame()
+    df = pd.DataFrame({k: pts[k] for k in kws if k in pts}).sort_index()
+    peak = df.max().max()
+    if peak and peak > 0: df = (df * 100.0 / peak).round(5)
+    return df.rename_axis("날짜").reset_index()
+
 def _cached_kstats(seed: str) -> pd.DataFrame:
+    """키워드도구 결과 + 검색합계. 캐시는 _keywordstool_fetch 쪽 (여기서 또 캐시하면 실패가 남음)."""
     if not seed: return pd.DataFrame()
     try:
         df = _naver_keywordstool([seed])
@@ -452,7 +655,13 @@ def _rakuten_keys():
     affiliate = _get_key("RAKUTEN_AFFILIATE_ID")
     return app_id, affiliate
 
+def _rk_cache_key(genre_id, topn=20, strip_emoji=True):
+    return {"endpoint": "ranking", "genre": str(genre_id).strip(), "topn": topn, "emoji": strip_emoji}
+
+# 랭킹 신선도 15분 — 디스크도 메모리와 같은 TTL
+@api_cache.stale_on("rakuten", key=_rk_cache_key, errors=(api_quota.QuotaExceeded,))
 @st.cache_data(ttl=900, show_spinner=False)
+@api_cache.cached("rakuten", ttl=900, key=_rk_cache_key)
 def _rk_fetch_rank_cached(genre_id: str, topn: int = 20, strip_emoji: bool=True) -> pd.DataFrame:
     app_id, affiliate = _rakuten_keys()
 
@@ -467,7 +676,7 @@ def _rk_fetch_rank_cached(genre_id: str, topn: int = 20, strip_emoji: bool=True)
         api = "https://app.rakuten.co.jp/services/api/IchibaItem/Ranking/20170628"
         params = {"applicationId": app_id, "genreId": str(genre_id).strip(), "hits": topn}
         if affiliate: params["affiliateId"] = affiliate
-        r = requests.get(api, params=params, timeout=12)
+        r = _http().get(api, api="rakuten", key=api_quota.key_id(app_id), params=params)
         r.raise_for_status()
         items = r.json().get("Items", [])[:topn]
         rows=[]
@@ -480,6 +689,8 @@ def _rk_fetch_rank_cached(genre_id: str, topn: int = 20, strip_emoji: bool=True)
                 "url": node.get("itemUrl",""),
             })
         return pd.DataFrame(rows, columns=["rank","keyword","shop","url"])
+    except api_quota.QuotaExceeded:
+        raise
     except Exception:
         return pd.DataFrame(columns=["rank","keyword","shop","url"])
 
@@ -502,7 +713,11 @@ def section_rakuten_ui():
         st.markdown('</div>', unsafe_allow_html=True); return
 
     with st.spinner("라쿠텐 랭킹 불러오는 중…"):
-        df = _rk_fetch_rank_cached(genre_id, topn=20, strip_emoji=strip_emoji)
+        try:
+            df = _rk_fetch_rank_cached(genre_id, topn=20, strip_emoji=strip_emoji)
+        except api_quota.QuotaExceeded as e:
+            st.warning(f"라쿠텐 호출 제한 · {e.reason} — 저장된 랭킹도 없어 잠시 후 다시 시도하세요.")
+            st.markdown('</div>', unsafe_allow_html=True); return
 
     if df.empty or "rank" not in df.columns:
         st.error("라쿠텐 API 응답이 없습니다. (앱 ID/네트워크/장르ID 확인)")
@@ -578,24 +793,32 @@ def section_korea_ui():
                                file_name="korea_keyword_B.csv", mime="text/csv")
             st.markdown("</div>", unsafe_allow_html=True); return
 
-        product_counts = []
-        if add_product:
-            with st.spinner("네이버쇼핑 상품수 수집 중…(키워드 수에 따라 수 분 소요)"):
-                for k in df2["키워드"]:
-                    cnt = _count_product_from_shopping(k)
-                    product_counts.append(cnt if cnt is not None else math.nan)
-        else:
-            product_counts = [math.nan]*len(df2)
-
-        df2["판매상품수"] = product_counts
-        df2["상품수순위"] = df2["판매상품수"].rank(na_option="bottom", method="min")
-        df2["상품발굴대상"] = (df2["검색순위"] + df2["상품수순위"]).rank(na_option="bottom", method="min")
-
         cols = ["키워드","PC월간검색수","Mobile월간검색수","판매상품수",
                 "PC월평균클릭수","Mobile월평균클릭수","PC월평균클릭률","Mobile월평균클릭률",
                 "월평균노출광고수","광고경쟁정도","검색순위","상품수순위","상품발굴대상"]
-        out = df2[cols].sort_values("상품발굴대상")
-        st.dataframe(out, use_container_width=True, height=430)
+        def _ranked(d):
+            d["상품수순위"] = d["판매상품수"].rank(na_option="bottom", method="min")
+            d["상품발굴대상"] = (d["검색순위"] + d["상품수순위"]).rank(na_option="bottom", method="min")
+            return d[cols].sort_values("상품발굴대상")
+
+        df2["판매상품수"] = math.nan
+        table = st.empty()
+        if add_product:
+            # 끝나는 대로 채워 넣고 표는 0.5초에 한 번만 다시 그림
+            idx = {k: i for i, k in enumerate(df2["키워드"])}
+            prog = st.progress(0.0, text="네이버쇼핑 상품수 수집 중…")
+            done, last = 0, 0.0
+            for k, cnt in _count_products_parallel(list(df2["키워드"])):
+                done += 1
+                if cnt is not None: df2.at[idx[k], "판매상품수"] = cnt
+                if time.monotonic() - last > 0.5 or done == len(idx):
+                    last = time.monotonic()
+                    prog.progress(done / len(idx), text=f"네이버쇼핑 상품수 수집 중… {done}/{len(idx)}")
+                    table.dataframe(_ranked(df2.copy()), use_container_width=True, height=430)
+            prog.empty()
+
+        out = _ranked(df2)
+        table.dataframe(out, use_container_width=True, height=430)
         st.download_button("CSV 다운로드", out.to_csv(index=False).encode("utf-8-sig"),
                            file_name="korea_keyword_C.csv", mime="text/csv")
     st.markdown("</div>", unsafe_allow_html=True)
@@ -650,10 +873,9 @@ def section_category_keyword_lab():
 
     topk = st.slider("라인차트 키워드 수", 3, 10, 5, help="상위 N개 키워드만 트렌드를 그립니다.")
     kws = top20["키워드"].head(topk).tolist()
-    groups = [{"groupName": k, "keywords": [k]} for k in kws]
-    ts = _datalab_trend(groups, start, end, time_unit=time_unit)
+    ts = _datalab_series(kws, start, end, time_unit=time_unit)
     if ts.empty:
-        st.info("DataLab 트렌드 응답이 비어 있어요. (Client ID/Secret, Referer/환경, 날짜/단위 확인)")
+        st.info(_datalab_empty_msg("DataLab 트렌드 응답이 비어 있어요. (Client ID/Secret, Referer/환경, 날짜/단위 확인)"))
     else:
         st.line_chart(ts.set_index("날짜"))
     st.markdown("</div>", unsafe_allow_html=True)
@@ -667,11 +889,10 @@ def section_keyword_trend_widget():
     if st.button("트렌드 조회", key="kw_run_direct"):
         start = (dt.date.today() - dt.timedelta(days=30 * months)).strftime("%Y-%m-%d")
         end = (dt.date.today() - dt.timedelta(days=1)).strftime("%Y-%m-%d")
-        kws = [k.strip() for k in (kwtxt or "").split(",") if k.strip()]
-        groups = [{"groupName": k, "keywords": [k]} for k in kws][:5]
-        df = _datalab_trend(groups, start, end, time_unit=unit)
+        kws = [k.strip() for k in (kwtxt or "").split(",") if k.strip()][:10]
+        df = _datalab_series(kws, start, end, time_unit=unit)
         if df.empty:
-            st.error("DataLab 트렌드 응답이 비어 있어요. (Client ID/Secret, Referer/환경, 권한/쿼터/날짜/단위 확인)")
+            st.error(_datalab_empty_msg("DataLab 트렌드 응답이 비어 있어요. (Client ID/Secret, Referer/환경, 권한/쿼터/날짜/단위 확인)"))
         else:
             st.dataframe(df, use_container_width=True, height=260)
             st.line_chart(df.set_index("날짜"))
@@ -721,8 +942,7 @@ def _sanitize_tokens(tokens: list[str],
         seen.add(low); out.append(s)
     return out
 
-@st.cache_data(ttl=1200, show_spinner=False)
-def _suggest_keywords_by_searchad_and_datalab(
+def _suggest_keywords_by_searchad_and_datalab(   # 메모리 캐시 없음 — 하위 조회가 캐시되고, 쿼터 거절로 줄어든 결과를 남기지 않기 위해
     main_kw: str,
     user_kws: list[str] | None = None,
     months: int = 3,
@@ -764,16 +984,11 @@ def _suggest_keywords_by_searchad_and_datalab(
     end   = (dt.date.today() - dt.timedelta(days=1)).strftime("%Y-%m-%d")
     dl_means = {}
     kws_all = df["키워드"].astype(str).tolist()
-    for i in range(0, len(kws_all), 5):
-        chunk = kws_all[i:i+5]
-        groups = [{"groupName": k, "keywords": [k]} for k in chunk]
-        ts = _datalab_trend(groups, start, end, time_unit="week")
-        if ts.empty:
-            for k in chunk: dl_means.setdefault(k, 0.0)
-        else:
-            for k in chunk:
-                try: dl_means[k] = float(pd.to_numeric(ts.get(k), errors="coerce").mean())
-                except Exception: dl_means[k] = 0.0
+    # 전 키워드를 한 척도로 (캐시 미스만 anchor 묶음으로 동시 조회) — 응답 없는 키워드는 0.0
+    ts = _datalab_series(kws_all, start, end, time_unit="week", priority="prefetch")   # 보조 점수 — 일일 한도 예비분은 안 씀
+    for k in kws_all:
+        try: dl_means[k] = float(pd.to_numeric(ts.get(k), errors="coerce").mean()) if not ts.empty else 0.0
+        except Exception: dl_means[k] = 0.0
 
     df["dl_mean"] = df["키워드"].map(dl_means).fillna(0.0)
     df["score"]   = pd.to_numeric(df["검색합계"], errors="coerce").fillna(0) * (df["dl_mean"].clip(lower=0)/100.0)
@@ -1173,10 +1388,44 @@ def _sidebar():
                 st.markdown(f'<div class="pill pill-blue">판매가: <b>{target_price:,.2f} 원</b></div>', unsafe_allow_html=True)
                 st.markdown(f'<div class="pill pill-yellow">순이익(마진): <b>{margin_value:,.2f} 원</b> — {desc}</div>', unsafe_allow_html=True)
 
+        def admin_block():
+            with st.expander("🛠 관리자", expanded=False):
+                st.caption("외부 API 호출 지연 (이 프로세스 기준, 재시도 포함)")
+                cli = _http()
+                mdf = cli.metrics() if cli else pd.DataFrame()
+                if mdf.empty: st.caption("아직 호출 없음")
+                else: st.dataframe(mdf, hide_index=True, use_container_width=True)
+
+                st.caption("디스크 캐시 (모든 프로세스 공유)")
+                try: cdf = pd.DataFrame(api_cache.cache().stats())
+                except Exception as e: cdf = pd.DataFrame(); st.caption(f"캐시 DB 오류: {e}")
+                if not cdf.empty:
+                    st.dataframe(cdf.rename(columns={"ns": "API", "entries": "항목", "kb": "KB", "hits": "적중", "misses": "미스",
+                                                     "stale": "만료대체", "hit_rate": "적중률"}),
+                                 hide_index=True, use_container_width=True)
+                st.caption("API 쿼터 — 오늘(KST) 키별 사용량")
+                try: qdf = pd.DataFrame(api_quota.governor().rows())
+                except Exception as e: qdf = pd.DataFrame(); st.caption(f"쿼터 장부 오류: {e}")
+                if qdf.empty: st.caption("오늘 호출 없음")
+                else:
+                    st.dataframe(qdf.rename(columns={"api": "API", "key": "키", "used": "사용", "daily": "한도", "remaining": "남음",
+                                                     "denied": "거절", "throttled": "429", "tokens": "토큰"}),
+                                 hide_index=True, use_container_width=True)
+
+                c1, c2 = st.columns([3, 2])
+                ns = c1.selectbox("비울 캐시", ["(전체)", "searchad", "datalab", "rakuten"], key="admin_cache_ns", label_visibility="collapsed")
+                if c2.button("캐시 비우기", key="admin_cache_clear", use_container_width=True):
+                    n = api_cache.cache().invalidate(None if ns == "(전체)" else ns)
+                    if ns in ("(전체)", "datalab"): n += api_cache.trend_store().invalidate()
+                    st.cache_data.clear()   # 메모리 캐시도 같이 — 안 그러면 이 프로세스는 계속 옛 값을 씀
+                    st.toast(f"캐시 {n}건 삭제")
+
         if show_tr:
             translator_block(expanded=True); fx_block(expanded=False); margin_block(expanded=False)
         else:
             fx_block(expanded=True); margin_block(expanded=True); translator_block(expanded=False)
+        if SHOW_ADMIN_BOX:
+            admin_block()
 
 # 초기화/레이아웃
 _ = _sidebar()
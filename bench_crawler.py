@@ -0,0 +1,308 @@
+# -*- coding: utf-8 -*-
+# ENVY — 크롤러 오프라인 벤치마크
+#   로컬 HTTP 서버로 녹화(또는 합성)된 카테고리 HTML/이미지를 서빙하고 crawler_core 를 끝까지 돌려
+#   상품/초, 상품당 WebDriver 호출 수, 다운로드 바이트, 자동저장 시간, 최대 RSS(파이썬 / 브라우저 프로세스 트리) 를 JSON 으로 기록한다.
+#
+#   사용 예)
+#     python bench_crawler.py --generate 120 --modes http                # 합성 픽스처 120개 상품
+#     python bench_crawler.py --fixtures ./fixtures --modes http,browser --out bench_results.jsonl
+#     python bench_crawler.py --generate 300 --stages                   # 단계별 시간 포함
+#
+#   픽스처 폴더 구성 (--fixtures)
+#     manifest.json              {"urls": ["/스토어/category/ID?page=1&size=60", ...], "pages": 2}
+#     <스토어>/category/<ID>      1페이지 HTML (확장자 없음)
+#     <스토어>/category/<ID>.p2   2페이지 이후 HTML
+#     _img/<호스트>/<경로>         이미지 — HTML 안의 https://<호스트>/ 주소는 서빙 시 로컬 주소로 바뀐다
+import os, re, sys, json, time, random, argparse, tempfile, threading, platform
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+import crawler_core as core
+
+IMG_HOST_RE = re.compile(r"https://([a-z0-9.-]+\.(?:pstatic\.net|naver\.net))/", re.I)
+
+# ──────────────────────────────────────────────────────────────
+# 픽스처 서버
+# ──────────────────────────────────────────────────────────────
+class FixtureHandler(SimpleHTTPRequestHandler):
+    bytes_sent = 0
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def _resolve_page(self):
+        u = urlparse(self.path)
+        page = int((parse_qs(u.query).get("page") or ["1"])[0])
+        base = self.translate_path(u.path)
+        for cand in ([base] if page == 1 else []) + [f"{base}.p{page}"]:
+            if os.path.isfile(cand):
+                return cand
+        return None
+
+    def do_GET(self):
+        u = urlparse(self.path)
+        if u.path.startswith("/_img/") or os.path.splitext(u.path)[1]:
+            return super().do_GET()
+        path = self._resolve_page()
+        if path is None:
+            body = b"<html><body><ul></ul></body></html>"  # 마지막 페이지 다음: 상품 없음
+        else:
+            with open(path, "r", encoding="utf-8") as f:
+                local = f"http://{self.headers.get('Host')}/_img/"
+                body = IMG_HOST_RE.sub(lambda m: local + m.group(1) + "/", f.read()).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self._count(len(body))
+
+    def copyfile(self, source, outputfile):
+        n = 0
+        while True:
+            buf = source.read(64 * 1024)
+            if not buf:
+                break
+            outputfile.write(buf)
+            n += len(buf)
+        self._count(n)
+
+    @classmethod
+    def _count(cls, n: int):
+        with cls.lock:
+            cls.bytes_sent += n
+
+def serve(root: str):
+    handler = lambda *a, **k: FixtureHandler(*a, directory=root, **k)
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd, f"http://127.0.0.1:{httpd.server_address[1]}"
+
+# ──────────────────────────────────────────────────────────────
+# 합성 픽스처
+# ──────────────────────────────────────────────────────────────
+def generate_fixtures(root: str, products: int, page_size: int = 60, imgs_per_product: int = 3, store: str = "bench_store") -> dict:
+    rnd = random.Random(42)
+    img_dir = os.path.join(root, "_img", "shop-phinf.pstatic.net", store)
+    cat_dir = os.path.join(root, store, "category")
+    os.makedirs(img_dir, exist_ok=True)
+    os.makedirs(cat_dir, exist_ok=True)
+
+    shared = [f"shared_{i}.jpg" for i in range(5)]  # 여러 상품이 같이 쓰는 썸네일 (중복 제거 측정용)
+    for name in shared:
+        with open(os.path.join(img_dir, name), "wb") as f:
+            f.write(rnd.randbytes(rnd.randint(5_000, 30_000)))
+
+    pages = max(1, -(-products // page_size))
+    for p in range(1, pages + 1):
+        cards = []
+        for i in range((p - 1) * page_size + 1, min(products, p * page_size) + 1):
+            names = [f"p{i}_{k}.jpg" for k in range(1, imgs_per_product + 1)] + [rnd.choice(shared)]
+            for name in names[:-1]:
+                with open(os.path.join(img_dir, name), "wb") as f:
+                    f.write(rnd.randbytes(rnd.randint(5_000, 30_000)))
+            dtl = json.dumps([{"key": "chnl_prod_nm", "value": f"벤치 상품 {i}"},
+                              {"key": "price", "value": str(1000 * i)},
+                              {"key": "chnl_prod_no", "value": str(900000 + i)}], ensure_ascii=False)
+            slides = "".join(f'<div class="swiper-slide"><img data-src="https://shop-phinf.pstatic.net/{store}/{n}"></div>' for n in names[1:])
+            cards.append(
+                f'<li><a class="linkAnchor" href="/{store}/products/{900000 + i}" data-shp-contents-dtl="{dtl.replace(chr(34), "&quot;")}">'
+                f'<div class="I3B6dXSHqa"><img src="https://shop-phinf.pstatic.net/{store}/{names[0]}"></div></a>'
+                f'<div class="swiper-wrapper">{slides}</div>'
+                f'<span class="zIK_uvWc6D">{900 * i:,}원</span><div class="UVrxHKBc0E">배송비 3,000원</div>'
+                f'<em>리뷰 {rnd.randint(0, 5000):,}</em><span>평점 {rnd.uniform(3, 5):.1f}</span></li>'
+            )
+        name = "bench" if p == 1 else f"bench.p{p}"
+        with open(os.path.join(cat_dir, name), "w", encoding="utf-8") as f:
+            f.write("<html><body><ul>" + "".join(cards) + "</ul></body></html>")
+
+    manifest = {"urls": [f"/{store}/category/bench?st=TOTALSALE&page=1&size={page_size}"], "pages": pages}
+    with open(os.path.join(root, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    return manifest
+
+# ──────────────────────────────────────────────────────────────
+# 측정
+# ──────────────────────────────────────────────────────────────
+def python_peak_rss_mb():
+    """이 파이썬 프로세스의 최대 RSS — chromedriver/크롬은 별도 프로세스라 포함되지 않음."""
+    try:
+        import resource
+        kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return round(kb / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+    except Exception:
+        pass
+    try:
+        import psutil
+        return round(psutil.Process().memory_info().peak_wset / 2**20, 1)
+    except Exception:
+        return None
+
+class _TreeRss:
+    """chromedriver 와 그 자식(크롬 브라우저·렌더러) RSS 합계를 주기적으로 샘플링해 최대값 기록 (psutil 필요)."""
+    def __init__(self, driver, every: float = 0.25):
+        self.peak = None
+        self._stop = threading.Event()
+        try:
+            import psutil
+            self._root = psutil.Process(driver.service.process.pid)
+        except Exception:
+            return
+        self.peak = 0
+        self._every = every
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def sample(self):
+        total = 0
+        try:
+            procs = [self._root] + self._root.children(recursive=True)
+        except Exception:
+            return
+        for p in procs:
+            try:
+                total += p.memory_info().rss
+            except Exception:
+                pass  # 샘플 사이에 끝난 렌더러
+        self.peak = max(self.peak, total)
+
+    def _run(self):
+        while not self._stop.wait(self._every):
+            self.sample()
+
+    def stop(self) -> float:
+        """샘플링 종료 후 최대값(MB), psutil 이 없거나 드라이버가 없으면 None."""
+        if self.peak is None:
+            return None
+        self.sample()
+        self._stop.set()
+        self._thread.join()
+        return round(self.peak / 2**20, 1)
+
+class _Counting:
+    """WebDriver.execute 를 감싸 원격 호출 수를 센다 (WebElement 호출도 driver.execute 를 거침)."""
+    def __init__(self, driver):
+        self.calls = 0
+        orig = driver.execute
+        def execute(*a, **k):
+            self.calls += 1
+            return orig(*a, **k)
+        driver.execute = execute
+
+def run_once(mode: str, base_url: str, manifest: dict, sink: str, work_dir: str) -> dict:
+    core.BASE_DIR = work_dir
+    core.IMG_ROOT = os.path.join(work_dir, "images")
+    core.EXCEL_PATH = os.path.join(work_dir, "bench.xlsx")
+    core.FETCH_MODE = mode
+    core.SINK = sink
+    core.RESUME = False
+    core.CAPTCHA_TIMEOUT = 0
+    core.MAX_PAGES = int(manifest.get("pages", 1))
+    core.wb = core.openpyxl.Workbook()
+    core.wb.active.title = core.PLACEHOLDER_NAME
+    FixtureHandler.bytes_sent = 0
+
+    driver = wait = counter = tree = None
+    if mode != "http":
+        core.HEADLESS = True
+        driver, wait = core.make_driver()
+        counter = _Counting(driver)
+        tree = _TreeRss(driver)
+
+    sk = core.output_sink()
+    stats = {"products": 0, "autosaves": 0, "autosave_sec": 0.0}
+    orig_append, orig_ckpt = sk.append, sk.checkpoint
+    def append(*a, **k):
+        stats["products"] += 1
+        return orig_append(*a, **k)
+    def checkpoint():
+        t = time.perf_counter()
+        orig_ckpt()
+        stats["autosaves"] += 1
+        stats["autosave_sec"] += time.perf_counter() - t
+    sk.append, sk.checkpoint = append, checkpoint
+
+    stages = {}
+    t0 = time.perf_counter()
+    try:
+        for u in manifest["urls"]:
+            core.collect_one_market(driver, wait, base_url + u)
+            for r in core.METRICS.rows():  # 마켓마다 reset 되므로 누적
+                acc = stages.setdefault(r["단계"], {"count": 0, "sec": 0.0})
+                acc["count"] += r["횟수"]
+                acc["sec"] = round(acc["sec"] + (r["합계(s)"] or 0.0), 4)
+        crawl_sec = time.perf_counter() - t0
+        t1 = time.perf_counter()
+        core.finalize_output()
+        finalize_sec = time.perf_counter() - t1
+    finally:
+        driver_rss = tree.stop() if tree else None  # quit 전에 — 끝나면 프로세스 트리가 사라짐
+        if driver is not None:
+            driver.quit()
+
+    n = stats["products"]
+    return {
+        "mode": mode,
+        "sink": sink,
+        "products": n,
+        "crawl_sec": round(crawl_sec, 3),
+        "products_per_sec": round(n / crawl_sec, 2) if crawl_sec else None,
+        "webdriver_calls": counter.calls if counter else 0,
+        "webdriver_calls_per_product": round(counter.calls / n, 2) if counter and n else 0,
+        "bytes_downloaded": FixtureHandler.bytes_sent,
+        "autosaves": stats["autosaves"],
+        "autosave_sec": round(stats["autosave_sec"], 4),
+        "finalize_sec": round(finalize_sec, 3),
+        "python_peak_rss_mb": python_peak_rss_mb(),
+        "driver_peak_rss_mb": driver_rss,
+        "image_store": core.image_store().stats_snapshot() if core.IMG_DEDUPE else None,
+        "stages": stages if core.METRICS_ENABLED else None,
+    }
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="crawler_core 오프라인 벤치마크")
+    ap.add_argument("--fixtures", help="녹화된 픽스처 폴더 (manifest.json 포함)")
+    ap.add_argument("--generate", type=int, default=120, help="--fixtures 가 없을 때 만들 합성 상품 수")
+    ap.add_argument("--page-size", type=int, default=60)
+    ap.add_argument("--modes", default="http", help="콤마 구분: http,browser")
+    ap.add_argument("--sink", default="jsonl", choices=["xlsx", "jsonl", "csv", "sqlite"])
+    ap.add_argument("--autosave-every", type=int, default=core.AUTOSAVE_EVERY)
+    ap.add_argument("--stages", action="store_true", help="단계별 시간(METRICS)도 결과에 포함")
+    ap.add_argument("--out", help="결과를 한 줄 JSON 으로 추가할 파일 (예: bench_results.jsonl)")
+    args = ap.parse_args(argv)
+
+    root = args.fixtures
+    if root:
+        with open(os.path.join(root, "manifest.json"), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    else:
+        root = tempfile.mkdtemp(prefix="envy_fx_")
+        manifest = generate_fixtures(root, args.generate, args.page_size)
+
+    core.AUTOSAVE_EVERY = args.autosave_every
+    core.METRICS_ENABLED = args.stages
+    httpd, base_url = serve(root)
+    results = []
+    try:
+        for mode in [m.strip() for m in args.modes.split(",") if m.strip()]:
+            res = run_once(mode, base_url, manifest, args.sink, tempfile.mkdtemp(prefix=f"envy_bench_{mode}_"))
+            res.update({
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "fixtures": args.fixtures or f"synthetic:{args.generate}",
+                "python": platform.python_version(),
+                "config": {k: getattr(core, k) for k in ("IMG_WORKERS", "IMG_PER_HOST", "IMG_DEDUPE", "FAST_EXTRACT", "AUTOSAVE_EVERY")},
+            })
+            results.append(res)
+            print(json.dumps(res, ensure_ascii=False))
+    finally:
+        httpd.shutdown()
+
+    if args.out:
+        with open(args.out, "a", encoding="utf-8") as f:
+            for res in results:
+                f.write(json.dumps(res, ensure_ascii=False) + "\n")
+    return results
+
+if __name__ == "__main__":
+    main()
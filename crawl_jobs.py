@@ -0,0 +1,403 @@
+# -*- coding: utf-8 -*-
+# ENVY — 백그라운드 크롤 작업 관리자
+#   Streamlit 스크립트 실행과 분리된 작업 대기열. UI 는 submit → 상태 조회 → 결과 다운로드만 하고,
+#   실제 크롤은 분리(detached)된 러너 프로세스가 작업마다 자식 프로세스를 띄워 수행한다.
+#   새로고침/탭 닫기/위젯 조작과 무관하게 계속 돌고, 여러 사용자가 동시에 대기열에 넣을 수 있다.
+#
+#   python crawl_jobs.py --runner      # 러너 (submit 이 필요할 때 자동 기동 — 직접 띄울 일은 거의 없음)
+#   python crawl_jobs.py --job <ID>    # 작업 1개 실행 (러너가 호출)
+#   python crawl_jobs.py --list        # 작업 목록 출력
+import os, sys, json, time, uuid, shutil, signal, sqlite3, argparse, threading, subprocess, traceback
+from typing import List, Dict, Optional
+
+# ──────────────────────────────────────────────────────────────
+# 설정
+# ──────────────────────────────────────────────────────────────
+JOBS_DIR = os.environ.get("ENVY_JOBS_DIR") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "_jobs")
+JOB_SLOTS = 2            # 동시에 실행할 작업 수 (같은 BASE_DIR 작업은 저널/레지스트리 공유 때문에 항상 순차)
+RUNNER_IDLE_EXIT = 120   # 대기/실행 작업이 없으면 이 초 뒤 러너 종료 (다음 submit 때 다시 기동)
+HEARTBEAT_SEC = 2.0      # 러너/작업 프로세스가 살아 있음을 기록하는 간격
+STALE_SEC = 30           # 하트비트가 이보다 오래되면 죽은 것으로 간주
+MAX_ATTEMPTS = 3         # 작업 프로세스가 비정상 종료되면 다시 대기열로 (RESUME 으로 이어서) — 최대 시도 수
+CANCEL_GRACE = 60        # 취소 요청 후 작업이 스스로 저장·종료하길 기다리는 초 — 넘기면 terminate, 다시 넘기면 kill
+
+# 작업 config 로 넘길 수 있는 crawler_core 설정 (그 외 키는 무시)
+JOB_CONFIG_KEYS = (
+    "BASE_DIR", "EXCEL_PATH", "DOWNLOAD_IMAGES", "AUTOSAVE_EVERY", "SINK", "RESUME", "FOLLOW_PAGES", "MAX_PAGES",
+    "DELTA_MODE", "FETCH_MODE", "WAIT_SEC", "PAGELOAD_TIMEOUT", "METRICS_ENABLED", "LEAN_BROWSER", "HEADLESS",
+    "POOL_WORKERS", "CAPTCHA_TIMEOUT", "CAPTCHA_TIMEOUT_HEADLESS",
+)
+
+STATUSES = ("queued", "running", "cancelling", "done", "failed", "cancelled")
+
+def db_path() -> str:
+    return os.path.join(JOBS_DIR, "crawl_jobs.db")
+
+def log_path(job_id: str) -> str:
+    return os.path.join(JOBS_DIR, f"{job_id}.log")
+
+def job_dir(job_id: str) -> str:
+    """작업별 저널/중단 표시 — 같은 작업 ID 로 다시 실행될 때만 이어서 수집."""
+    return os.path.join(JOBS_DIR, job_id)
+
+def stop_path(job_id: str) -> str:
+    return os.path.join(job_dir(job_id), "stop")
+
+def _request_stop(job_id: str):
+    os.makedirs(job_dir(job_id), exist_ok=True)
+    with open(stop_path(job_id), "w") as f:
+        f.write(str(time.time()))
+
+def connect() -> sqlite3.Connection:
+    os.makedirs(JOBS_DIR, exist_ok=True)
+    con = sqlite3.connect(db_path(), timeout=30, check_same_thread=False, isolation_level=None)
+    con.row_factory = sqlite3.Row
+    con.execute("PRAGMA journal_mode=WAL")
+    con.execute("PRAGMA synchronous=NORMAL")
+    con.execute("""CREATE TABLE IF NOT EXISTS jobs (
+        id TEXT PRIMARY KEY, owner TEXT, title TEXT, status TEXT, created REAL, started REAL, finished REAL,
+        heartbeat REAL, attempts INTEGER DEFAULT 0, base_dir TEXT, urls TEXT, config TEXT,
+        progress TEXT, result_path TEXT, error TEXT)""")
+    con.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created)")
+    con.execute("CREATE TABLE IF NOT EXISTS runner (id INTEGER PRIMARY KEY CHECK (id = 1), pid INTEGER, heartbeat REAL)")
+    return con
+
+def _job_excel_path(excel_path: str, job_id: str) -> str:
+    stem, ext = os.path.splitext(excel_path)
+    return f"{stem}_{job_id}{ext or '.xlsx'}"
+
+# ──────────────────────────────────────────────────────────────
+# UI 쪽 API
+# ──────────────────────────────────────────────────────────────
+def submit(urls: List[str], config: Dict, owner: str = "", title: str = "") -> str:
+    """작업을 대기열에 넣고(결과 엑셀은 작업별 파일) 러너가 없으면 띄운다. → 작업 ID"""
+    job_id = time.strftime("%Y%m%d_%H%M%S_") + uuid.uuid4().hex[:6]
+    cfg = {k: v for k, v in config.items() if k in JOB_CONFIG_KEYS}
+    base_dir = cfg.get("BASE_DIR") or ""
+    cfg["EXCEL_PATH"] = _job_excel_path(cfg.get("EXCEL_PATH") or os.path.join(base_dir, "crawl.xlsx"), job_id)
+    con = connect()
+    try:
+        con.execute("INSERT INTO jobs (id, owner, title, status, created, base_dir, urls, config, progress) VALUES (?,?,?,?,?,?,?,?,?)",
+                    (job_id, owner, title or (urls[0] if urls else ""), "queued", time.time(), os.path.normcase(os.path.abspath(base_dir)),
+                     json.dumps(urls, ensure_ascii=False), json.dumps(cfg, ensure_ascii=False), "{}"))
+    finally:
+        con.close()
+    ensure_runner()
+    return job_id
+
+def _job_dict(r: sqlite3.Row) -> dict:
+    d = dict(r)
+    for k, empty in (("urls", "[]"), ("config", "{}"), ("progress", "{}")):
+        d[k] = json.loads(d[k] or empty)
+    return d
+
+def list_jobs(owner: Optional[str] = None, limit: int = 50) -> List[dict]:
+    con = connect()
+    try:
+        q = "SELECT * FROM jobs" + (" WHERE owner=?" if owner else "") + " ORDER BY created DESC LIMIT ?"
+        return [_job_dict(r) for r in con.execute(q, ((owner, limit) if owner else (limit,)))]
+    finally:
+        con.close()
+
+def get_job(job_id: str) -> Optional[dict]:
+    con = connect()
+    try:
+        r = con.execute("SELECT * FROM jobs WHERE id=?", (job_id,)).fetchone()
+        return _job_dict(r) if r else None
+    finally:
+        con.close()
+
+def cancel(job_id: str) -> bool:
+    """대기 중이면 바로 취소, 실행 중이면 러너가 프로세스를 종료하도록 표시."""
+    con = connect()
+    try:
+        cur = con.execute("UPDATE jobs SET status='cancelled', finished=? WHERE id=? AND status='queued'", (time.time(), job_id))
+        if cur.rowcount:
+            return True
+        cur = con.execute("UPDATE jobs SET status='cancelling' WHERE id=? AND status='running'", (job_id,))
+        if cur.rowcount:
+            _request_stop(job_id)  # 작업 프로세스가 카드/페이지 경계에서 보고 저장 후 종료 (Windows 포함)
+        return bool(cur.rowcount)
+    finally:
+        con.close()
+
+def tail_log(job_id: str, max_bytes: int = 8000) -> str:
+    try:
+        with open(log_path(job_id), "rb") as f:
+            f.seek(0, os.SEEK_END)
+            f.seek(max(0, f.tell() - max_bytes))
+            return f.read().decode("utf-8", "replace")
+    except OSError:
+        return ""
+
+def runner_alive(con: sqlite3.Connection = None) -> bool:
+    own = con is None
+    con = con or connect()
+    try:
+        r = con.execute("SELECT heartbeat FROM runner WHERE id=1").fetchone()
+        return bool(r and r["heartbeat"] and time.time() - r["heartbeat"] < STALE_SEC)
+    finally:
+        if own:
+            con.close()
+
+def _spawn(args: List[str], log_file: str) -> subprocess.Popen:
+    """부모(Streamlit/러너)가 죽어도 계속 도는 분리 프로세스."""
+    kw = {}
+    if os.name == "nt":
+        kw["creationflags"] = subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP
+    else:
+        kw["start_new_session"] = True
+    env = dict(os.environ, PYTHONIOENCODING="utf-8", PYTHONUNBUFFERED="1", ENVY_JOBS_DIR=JOBS_DIR)
+    with open(log_file, "ab") as log:
+        return subprocess.Popen([sys.executable, os.path.abspath(__file__)] + args, stdin=subprocess.DEVNULL,
+                                stdout=log, stderr=subprocess.STDOUT, cwd=os.path.dirname(os.path.abspath(__file__)),
+                                env=env, **kw)
+
+def ensure_runner():
+    if not runner_alive():
+        _spawn(["--runner"], os.path.join(JOBS_DIR, "runner.log"))
+
+# ──────────────────────────────────────────────────────────────
+# 러너 — 대기열에서 작업을 꺼내 자식 프로세스로 실행/감시
+# ──────────────────────────────────────────────────────────────
+def _claim_runner(con: sqlite3.Connection) -> bool:
+    con.execute("BEGIN IMMEDIATE")
+    try:
+        r = con.execute("SELECT pid, heartbeat FROM runner WHERE id=1").fetchone()
+        if r and r["pid"] != os.getpid() and r["heartbeat"] and time.time() - r["heartbeat"] < STALE_SEC:
+            con.execute("ROLLBACK")
+            return False
+        con.execute("INSERT OR REPLACE INTO runner (id, pid, heartbeat) VALUES (1, ?, ?)", (os.getpid(), time.time()))
+        con.execute("COMMIT")
+        return True
+    except Exception:
+        con.execute("ROLLBACK")
+        raise
+
+def _recover_stale(con: sqlite3.Connection, children: Dict[str, subprocess.Popen]):
+    """러너가 모르는 running 작업인데 하트비트가 끊긴 것 → 다시 대기열(또는 실패)."""
+    now = time.time()
+    for r in con.execute("SELECT id, attempts, status, heartbeat FROM jobs WHERE status IN ('running','cancelling')").fetchall():
+        if r["id"] in children or (r["heartbeat"] and now - r["heartbeat"] < STALE_SEC):
+            continue
+        if r["status"] == "cancelling":
+            con.execute("UPDATE jobs SET status='cancelled', finished=? WHERE id=?", (now, r["id"]))
+        elif r["attempts"] < MAX_ATTEMPTS:
+            con.execute("UPDATE jobs SET status='queued' WHERE id=?", (r["id"],))
+        else:
+            con.execute("UPDATE jobs SET status='failed', finished=?, error=? WHERE id=?", (now, "작업 프로세스 응답 없음", r["id"]))
+
+def _claim_next(con: sqlite3.Connection) -> Optional[sqlite3.Row]:
+    con.execute("BEGIN IMMEDIATE")
+    try:
+        busy = {r["base_dir"] for r in con.execute("SELECT base_dir FROM jobs WHERE status IN ('running','cancelling')")}
+        for r in con.execute("SELECT * FROM jobs WHERE status='queued' ORDER BY created").fetchall():
+            if r["base_dir"] in busy:
+                continue
+            con.execute("UPDATE jobs SET status='running', started=COALESCE(started, ?), heartbeat=?, attempts=attempts+1 WHERE id=?",
+                        (time.time(), time.time(), r["id"]))
+            con.execute("COMMIT")
+            return r
+        con.execute("COMMIT")
+        return None
+    except Exception:
+        con.execute("ROLLBACK")
+        raise
+
+def run_runner():
+    con = connect()
+    if not _claim_runner(con):
+        print("다른 러너가 실행 중 — 종료")
+        return
+    children: Dict[str, subprocess.Popen] = {}
+    cancel_seen: Dict[str, float] = {}
+    idle_since = time.time()
+    print(f"[runner {os.getpid()}] 시작 — 작업 폴더 {JOBS_DIR}")
+    try:
+        while True:
+            con.execute("UPDATE runner SET heartbeat=? WHERE id=1 AND pid=?", (time.time(), os.getpid()))
+            _recover_stale(con, children)
+
+            # 취소 요청 / 종료된 자식 정리
+            for job_id, proc in list(children.items()):
+                r = con.execute("SELECT status FROM jobs WHERE id=?", (job_id,)).fetchone()
+                if r and r["status"] == "cancelling" and proc.poll() is None:
+                    # 정상 경로는 stop 파일 → 작업이 스스로 저장·드라이버 종료. 응답이 없을 때만 강제 종료
+                    since = cancel_seen.setdefault(job_id, time.time())
+                    if not os.path.exists(stop_path(job_id)):
+                        _request_stop(job_id)
+                    if time.time() - since > CANCEL_GRACE * 2:
+                        proc.kill()
+                    elif time.time() - since > CANCEL_GRACE:
+                        proc.terminate()
+                code = proc.poll()
+                if code is None:
+                    continue
+                del children[job_id]
+                cancel_seen.pop(job_id, None)
+                r = con.execute("SELECT status, attempts FROM jobs WHERE id=?", (job_id,)).fetchone()
+                if r and r["status"] == "cancelling":
+                    con.execute("UPDATE jobs SET status='cancelled', finished=? WHERE id=?", (time.time(), job_id))
+                elif r and r["status"] == "running":  # 상태를 못 남기고 죽음
+                    if r["attempts"] < MAX_ATTEMPTS:
+                        con.execute("UPDATE jobs SET status='queued' WHERE id=?", (job_id,))
+                    else:
+                        con.execute("UPDATE jobs SET status='failed', finished=?, error=? WHERE id=?",
+                                    (time.time(), f"작업 프로세스 비정상 종료 (exit {code})", job_id))
+                print(f"[runner] 작업 {job_id} 종료 (exit {code})")
+
+            while len(children) < JOB_SLOTS:
+                job = _claim_next(con)
+                if job is None:
+                    break
+                children[job["id"]] = _spawn(["--job", job["id"]], log_path(job["id"]))
+                print(f"[runner] 작업 {job['id']} 시작 (pid {children[job['id']].pid})")
+
+            queued = con.execute("SELECT COUNT(*) FROM jobs WHERE status='queued'").fetchone()[0]
+            if children or queued:
+                idle_since = time.time()
+            elif time.time() - idle_since > RUNNER_IDLE_EXIT:
+                break
+            time.sleep(HEARTBEAT_SEC)
+    finally:
+        con.execute("DELETE FROM runner WHERE id=1 AND pid=?", (os.getpid(),))
+        con.close()
+        print(f"[runner {os.getpid()}] 종료")
+
+# ──────────────────────────────────────────────────────────────
+# 작업 프로세스 — crawler_core 로 실제 수집
+# ──────────────────────────────────────────────────────────────
+class _Progress:
+    """core 이벤트를 집계해 HEARTBEAT_SEC 마다 jobs.progress / heartbeat 에 기록 (UI 폴링용)."""
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self.lock = threading.Lock()
+        self.data = {"rows": 0, "images": 0, "markets": {}, "started": time.time(), "captcha": ""}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def on_event(self, ev: dict):
+        with self.lock:
+            m = self.data["markets"].setdefault(ev.get("market") or "-", {"rows": 0, "page": 0, "status": "대기"})
+            kind = ev["type"]
+            if kind == "market_start":
+                m["status"] = "수집 중"
+            elif kind == "page":
+                m["page"] = ev["page"]
+            elif kind == "product":
+                m["rows"] += 1
+                self.data["rows"] += 1
+            elif kind == "images":
+                self.data["images"] += ev["saved"]
+            elif kind == "captcha":
+                m["status"] = "캡차 대기"
+                self.data["captcha"] = ev.get("market") or ""
+            elif kind == "captcha_cleared":
+                m["status"] = "수집 중"
+                self.data["captcha"] = ""
+            elif kind == "market_done":
+                m["status"] = "완료" if ev["completed"] else "중단/실패"
+
+    def write(self, con: sqlite3.Connection):
+        with self.lock:
+            payload = json.dumps(self.data, ensure_ascii=False)
+        con.execute("UPDATE jobs SET progress=?, heartbeat=? WHERE id=?", (payload, time.time(), self.job_id))
+
+    def _loop(self):
+        con = connect()
+        try:
+            while not self._stop.wait(HEARTBEAT_SEC):
+                self.write(con)
+        finally:
+            con.close()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(timeout=HEARTBEAT_SEC * 2)
+
+def _raise_interrupt(signum, frame):
+    raise KeyboardInterrupt  # 러너의 terminate() → 코어의 중단 처리(진행분 저장) 경로로
+
+def run_job(job_id: str):
+    if hasattr(signal, "SIGTERM"):
+        signal.signal(signal.SIGTERM, _raise_interrupt)
+    con = connect()
+    job = con.execute("SELECT * FROM jobs WHERE id=?", (job_id,)).fetchone()
+    if job is None:
+        print(f"작업 없음: {job_id}")
+        return
+    urls, cfg = json.loads(job["urls"]), json.loads(job["config"])
+
+    import crawler_core as core
+    for k, v in cfg.items():
+        setattr(core, k, v)
+    # 저널은 작업별 — 다른 작업(다른 결과 파일)이 남긴 진행 기록을 이어받지 않음
+    os.makedirs(job_dir(job_id), exist_ok=True)
+    core.JOURNAL_PATH = os.path.join(job_dir(job_id), "crawl_state.db")
+    core.STOP_FILE = stop_path(job_id)
+    core.IMG_ROOT = os.path.join(core.BASE_DIR, "images")
+    os.makedirs(core.IMG_ROOT, exist_ok=True)
+    core.wb = core.openpyxl.Workbook()
+    core.wb.active.title = core.PLACEHOLDER_NAME
+
+    progress = _Progress(job_id)
+    core.add_event_hook(progress.on_event)
+    driver = None
+    status, error = "done", ""
+    print(f"[job {job_id}] 시작 — URL {len(urls)}개, 결과 {core.EXCEL_PATH}")
+    try:
+        if int(cfg.get("POOL_WORKERS") or 1) > 1 and len(urls) > 1:
+            core.HEADLESS = True
+            core.crawl_markets_parallel(urls, int(cfg["POOL_WORKERS"]))
+        else:
+            if core.FETCH_MODE != "http":
+                driver = core.LazyDriver(core.build_driver)  # auto 는 HTTP 가 실패한 페이지에서만 크롬 기동
+            for u in urls:
+                try:
+                    core.collect_one_market(driver, None, u)
+                except Exception as e:
+                    print(f"[에러] {u}\n{e}\n{traceback.format_exc()}")
+    except KeyboardInterrupt:
+        status, error = "cancelled", "취소됨"
+    except BaseException as e:
+        status, error = "failed", f"{type(e).__name__}: {e}"
+        traceback.print_exc()
+    finally:
+        try:
+            core.finalize_output()
+        except Exception as e:
+            status, error = "failed", error or f"최종 저장 실패: {e}"
+        if driver is not None:
+            driver.quit()
+        progress.stop()
+        progress.write(con)
+        # 결과 경로는 취소 중이어도 기록 (부분 결과 다운로드) — 상태는 취소 요청이 없을 때만, 있으면 러너가 cancelled 로 정리
+        con.execute("UPDATE jobs SET result_path=?, error=? WHERE id=? AND status IN ('running','cancelling')",
+                    (core.EXCEL_PATH if os.path.exists(core.EXCEL_PATH) else "", error, job_id))
+        con.execute("UPDATE jobs SET status=?, finished=? WHERE id=? AND status='running'", (status, time.time(), job_id))
+        con.close()
+        shutil.rmtree(job_dir(job_id), ignore_errors=True)  # 상태를 남겼으면 다시 실행될 일 없음
+        print(f"[job {job_id}] {status}")
+
+# ──────────────────────────────────────────────────────────────
+# CLI
+# ──────────────────────────────────────────────────────────────
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="ENVY 백그라운드 크롤 작업 관리자")
+    g = ap.add_mutually_exclusive_group(required=True)
+    g.add_argument("--runner", action="store_true", help="대기열 러너 실행")
+    g.add_argument("--job", help="작업 1개 실행 (러너 내부용)")
+    g.add_argument("--list", action="store_true", help="작업 목록")
+    args = ap.parse_args(argv)
+    if args.runner:
+        run_runner()
+    elif args.job:
+        run_job(args.job)
+    else:
+        for j in list_jobs():
+            p = j["progress"]
+            print(f"{j['id']}  {j['status']:<10} {j['owner'] or '-':<10} 행 {p.get('rows', 0):>6}  {j['title']}")
+
+if __name__ == "__main__":
+    main()
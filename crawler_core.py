@@ -1,7 +1,11 @@
 # -*- coding: utf-8 -*-
-import os, re, json, time, random, html, hashlib
+import os, re, csv, json, time, random, html, hashlib, threading, sqlite3, shutil, queue
+import multiprocessing as mp
+from contextlib import contextmanager, nullcontext
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Tuple
-from urllib.parse import urlparse
+from urllib.parse import urlparse, urljoin, parse_qs, urlencode
 import openpyxl, requests
 from requests.adapters import HTTPAdapter, Retry
 from selenium import webdriver
@@ -11,6 +15,10 @@ from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException
+try:
+    from bs4 import BeautifulSoup, NavigableString, Comment
+except Exception:
+    BeautifulSoup = None
 
 # ──────────────────────────────────────────────────────────────
 # 설정
@@ -32,39 +40,289 @@ MARKETS = [
     "https://smartstore.naver.com/nutri_health/category/a932ac29907c43a9bda9c1e60ab0e244?st=TOTALSALE&dt=IMAGE&page=1&size=60",
 ]
 AUTOSAVE_EVERY = 10
+IMG_WORKERS = 8       # 이미지 다운로드 스레드 수 (= 세션 커넥션 풀 크기)
+IMG_PER_HOST = 4      # 호스트별 동시 다운로드 상한
+IMG_DEDUPE = True     # URL/내용 해시 기준 이미지 캐시(_cas) 사용 — 같은 이미지는 한 번만 받고 상품 폴더엔 하드링크
+IMG_REVALIDATE = True # 이전 실행에서 받은 URL 은 조건부 GET(ETag/Last-Modified)으로 확인, False 면 네트워크 생략
+HEADLESS = False      # make_driver 헤드리스 여부
+LEAN_BROWSER = True   # 이미지/미디어/폰트/트래커 요청 차단 + eager 로딩 — DOM 속성(src, data-src, srcset, background-image)은 그대로 남음
+CAPTCHA_TIMEOUT = 600 # 캡차/보안확인 감지 시 해당 브라우저만 멈추고 해결(상품 앵커 등장)을 기다리는 최대 초, 0 = 기다리지 않고 페이지 건너뜀
+CAPTCHA_TIMEOUT_HEADLESS = 0  # 헤드리스 브라우저의 대기 초 — 풀 창이 없으므로 기본 0(바로 건너뜀)
+CAPTCHA_POLL = 1.0    # 해결 여부 확인 간격(초) — 감지되지 않으면 대기 없음
+POOL_WORKERS = 1      # 2 이상: 브라우저 N개(프로세스)로 MARKETS 병렬 수집, 0 = CPU 코어 수
+RESUME = True         # 비정상 종료된 이전 실행을 이어서: 완료 URL/상품은 건너뛰고, 이미지 일부만 받은 상품은 남은 것만 받음
+JOURNAL_PATH = ""     # 크롤 저널 파일 — 비우면 BASE_DIR/crawl_state.db (결과 파일이 따로인 작업은 저널도 따로 둘 것)
+STOP_FILE = ""        # 지정 시 이 파일이 생기면 카드/페이지 경계에서 중단(KeyboardInterrupt 와 같은 저장 경로) — 신호 없이 외부에서 취소
+FOLLOW_PAGES = True   # page= 파라미터를 올려가며 다음 페이지 자동 수집 (새 상품 ID 가 없으면 중단)
+MAX_PAGES = 50        # 페이지 수 상한 (시작 페이지 포함)
+DELTA_MODE = False    # 변경 감지: 이전 실행과 가격/리뷰/평점/이미지 등이 같은 상품은 건너뛰고, 신규·변경 상품만 "변경필드"와 함께 기록
+METRICS_ENABLED = False  # 단계별 시간/카운터 계측 (끄면 span 은 빈 컨텍스트 — 오버헤드 없음)
+TRACE_PATH = ""          # 지정 시 span 마다 JSONL 한 줄 기록 (METRICS_ENABLED 일 때만)
+FETCH_MODE = "auto"   # "browser" | "http"(requests+bs4 만) | "auto"(HTTP 먼저, 상품 앵커 없으면 셀레니움)
+FAST_EXTRACT = True   # True: 카드 필드/이미지 후보를 execute_script 1회로 일괄 추출, False: WebElement 개별 호출
+LAZY_TIMEOUT = 4.0    # 페이지 1회 스크롤 후 lazy 이미지(data-src → src) 승격을 기다리는 최대 초
+PAGE_MIN_INTERVAL = 0.5  # 같은 호스트에 대한 페이지 요청(driver.get / HTTP) 최소 간격(초), 0 = 제한 없음
+PAGE_JITTER = 0.3        # 간격에 더하는 무작위 지터 상한(초)
+IMG_MIN_INTERVAL = 0.0   # 같은 이미지 호스트에 대한 실제 네트워크 요청 최소 간격(초)
+
+# ──────────────────────────────────────────────────────────────
+# 계측 — 단계별 span(시간) / 카운터
+# ──────────────────────────────────────────────────────────────
+class Metrics:
+    """
+    with span("page_load"): ...  /  incr("img_bytes", n)
+    - 마켓이 끝날 때 print_summary() 로 표 출력
+    - TRACE_PATH 가 있으면 span 종료마다 JSONL 기록
+    - hook(rows) 는 tick() 을 부른 스레드(크롤 루프)에서만, HOOK_INTERVAL 간격으로 호출 → Streamlit 갱신용
+    """
+    HOOK_INTERVAL = 0.5
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hook = None
+        self._trace = None
+        self._last_hook = 0.0
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.spans: Dict[str, list] = {}    # name → [횟수, 합계초, 최대초]
+            self.counters: Dict[str, float] = {}
+
+    @contextmanager
+    def _span(self, name: str, tags: dict):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            dt = time.perf_counter() - t0
+            with self._lock:
+                rec = self.spans.setdefault(name, [0, 0.0, 0.0])
+                rec[0] += 1
+                rec[1] += dt
+                rec[2] = max(rec[2], dt)
+                if TRACE_PATH:
+                    if self._trace is None or self._trace.name != TRACE_PATH:
+                        os.makedirs(os.path.dirname(TRACE_PATH) or ".", exist_ok=True)
+                        self._trace = open(TRACE_PATH, "a", encoding="utf-8")
+                    self._trace.write(json.dumps({"ts": time.time(), "span": name, "sec": round(dt, 6), **tags}, ensure_ascii=False) + "\n")
+
+    def span(self, name: str, **tags):
+        if not METRICS_ENABLED:
+            return _NULL_SPAN
+        return self._span(name, tags)
+
+    def incr(self, name: str, n: float = 1):
+        if not METRICS_ENABLED:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def rows(self) -> List[dict]:
+        with self._lock:
+            out = [{"단계": k, "횟수": c, "합계(s)": round(t, 3), "평균(ms)": round(t / c * 1000, 1) if c else 0.0,
+                    "최대(ms)": round(mx * 1000, 1)} for k, (c, t, mx) in self.spans.items()]
+            out.sort(key=lambda r: -r["합계(s)"])
+            out += [{"단계": f"#{k}", "횟수": v, "합계(s)": None, "평균(ms)": None, "최대(ms)": None}
+                    for k, v in sorted(self.counters.items())]
+            return out
+
+    def tick(self, force: bool = False):
+        if not METRICS_ENABLED or self.hook is None:
+            return
+        now = time.monotonic()
+        if force or now - self._last_hook >= self.HOOK_INTERVAL:
+            self._last_hook = now
+            try:
+                self.hook(self.rows())
+            except Exception:
+                pass
+
+    def print_summary(self, title: str):
+        if not METRICS_ENABLED:
+            return
+        rows = self.rows()
+        if not rows:
+            return
+        print(f"── 단계별 시간: {title} " + "─" * 20)
+        print(f"{'단계':<22}{'횟수':>8}{'합계(s)':>10}{'평균(ms)':>10}{'최대(ms)':>10}")
+        for r in rows:
+            if r["합계(s)"] is None:
+                print(f"{r['단계']:<22}{r['횟수']:>8}")
+            else:
+                print(f"{r['단계']:<22}{r['횟수']:>8}{r['합계(s)']:>10}{r['평균(ms)']:>10}{r['최대(ms)']:>10}")
+        if self._trace is not None:
+            self._trace.flush()
+
+_NULL_SPAN = nullcontext()
+METRICS = Metrics()
+span, incr = METRICS.span, METRICS.incr
+
+# ──────────────────────────────────────────────────────────────
+# 이벤트 — 진행/캡차 알림을 UI/부모 프로세스로 전달
+# ──────────────────────────────────────────────────────────────
+# type: market_start / page / product(row: 헤더→값) / images(requested, saved) / market_done(rows, completed)
+#       / captcha / captcha_cleared / captcha_timeout / selector_drop(field, strategy, before, now)
+_EVENT_HOOKS: List = []
+
+def add_event_hook(fn):
+    if fn not in _EVENT_HOOKS:
+        _EVENT_HOOKS.append(fn)
+
+def remove_event_hook(fn):
+    if fn in _EVENT_HOOKS:
+        _EVENT_HOOKS.remove(fn)
+
+def dispatch_event(ev: dict):
+    for fn in list(_EVENT_HOOKS):
+        try:
+            fn(ev)
+        except Exception as e:
+            print(f"[EVENT] 훅 오류(무시): {e}")
+
+def emit(kind: str, **data):
+    """hook(ev) 는 emit 한 스레드에서 호출됨. ev = {"type", "ts", "pid", ...data}"""
+    if _EVENT_HOOKS:
+        dispatch_event({"type": kind, "ts": time.time(), "pid": os.getpid(), **data})
 
 # ──────────────────────────────────────────────────────────────
 # 브라우저
 # ──────────────────────────────────────────────────────────────
-def make_driver() -> Tuple[webdriver.Chrome, WebDriverWait]:
+# LEAN_BROWSER: 이미지는 어차피 SESSION 으로 다시 받으므로 브라우저에선 받지 않는다
+BLOCKED_URL_PATTERNS = [
+    # 이미지 / 미디어 / 폰트
+    "*.jpg*", "*.jpeg*", "*.png*", "*.gif*", "*.webp*", "*.avif*", "*.svg*", "*.ico*", "*.bmp*",
+    "*.mp4*", "*.webm*", "*.m3u8*", "*.ts?*", "*.mp3*",
+    "*.woff*", "*.ttf*", "*.otf*", "*.eot*",
+    # 광고 / 분석
+    "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*", "*googlesyndication.com*",
+    "*facebook.net*", "*connect.facebook.com*", "*criteo.*", "*wcs.naver.net*", "*lcs.naver.com*",
+    "*nlog.naver.com*", "*nlog.commerce.naver.com*", "*siape.veta.naver.com*", "*adcr.naver.com*",
+]
+
+LEAN_CHROME_ARGS = [
+    "--blink-settings=imagesEnabled=false",
+    "--autoplay-policy=user-gesture-required",
+    "--mute-audio",
+    "--disable-extensions",
+    "--disable-background-networking",
+    "--disable-background-timer-throttling",
+    "--disable-renderer-backgrounding",
+    "--disable-component-update",
+    "--disable-default-apps",
+    "--disable-sync",
+    "--disable-notifications",
+    "--no-first-run",
+    "--no-default-browser-check",
+    "--disable-features=Translate,OptimizationHints,MediaRouter,InterestFeedContentSuggestions,BackForwardCache",
+]
+
+def apply_lean_options(opts: Options):
+    for a in LEAN_CHROME_ARGS:
+        opts.add_argument(a)
+    opts.add_experimental_option("prefs", {
+        "profile.managed_default_content_settings.images": 2,
+        "profile.managed_default_content_settings.media_stream": 2,
+        "profile.default_content_setting_values.notifications": 2,
+    })
+    opts.page_load_strategy = "eager"   # DOMContentLoaded 에서 driver.get 반환 — 앵커 존재는 ensure_products_loaded 가 확인
+
+def apply_lean_network(d: webdriver.Chrome):
+    try:
+        d.execute_cdp_cmd("Network.enable", {})
+        d.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_URL_PATTERNS})
+    except Exception as e:
+        print(f"[LEAN] 요청 차단 설정 실패(무시): {e}")
+
+def build_driver(headless: bool = None, page_load_strategy: str = None, window_size: Tuple[int, int] = None,
+                 lean: bool = None) -> Tuple[webdriver.Chrome, WebDriverWait]:
+    """크롬 1개 생성. 인자 None 이면 모듈 설정(HEADLESS/LEAN_BROWSER) 사용."""
+    headless = HEADLESS if headless is None else headless
+    lean = LEAN_BROWSER if lean is None else lean
     opts = Options()
     opts.add_argument("--disable-blink-features=AutomationControlled")
     opts.add_argument("--lang=ko-KR")
-    opts.add_argument("start-maximized")
     opts.add_argument(f"user-agent={UA}")
-    service = Service(CHROMEDRIVER_PATH)
-    d = webdriver.Chrome(service=service, options=opts)
+    if headless:
+        opts.add_argument("--headless=new")
+        window_size = window_size or (1920, 1080)  # 헤드리스는 start-maximized 가 먹지 않음
+    if window_size:
+        opts.add_argument(f"--window-size={window_size[0]},{window_size[1]}")
+    else:
+        opts.add_argument("start-maximized")
+    if lean:
+        apply_lean_options(opts)
+    if page_load_strategy:
+        opts.page_load_strategy = page_load_strategy
+    if os.path.isfile(CHROMEDRIVER_PATH):
+        d = webdriver.Chrome(service=Service(CHROMEDRIVER_PATH), options=opts)
+    else:
+        d = webdriver.Chrome(options=opts)  # Selenium Manager 가 드라이버 탐색
     d.set_page_load_timeout(PAGELOAD_TIMEOUT)
     d.execute_cdp_cmd(
         "Page.addScriptToEvaluateOnNewDocument",
         {"source": "Object.defineProperty(navigator,'webdriver',{get:()=>undefined});"}
     )
+    if lean:
+        apply_lean_network(d)
+    d.envy_headless = bool(headless)  # park_until_cleared 가 대기 시간 고를 때 참조
     return d, WebDriverWait(d, WAIT_SEC)
 
+def make_driver() -> Tuple[webdriver.Chrome, WebDriverWait]:
+    return build_driver()
+
+class LazyDriver:
+    """
+    처음 브라우저가 필요할 때 factory() 로 (driver, wait) 생성 — collect_one_market 에 driver 대신 넘김.
+    FETCH_MODE=auto 에서 HTTP 로 끝나는 스토어는 크롬을 띄우지 않는다.
+    """
+    def __init__(self, factory=None):
+        self.factory = factory or make_driver
+        self.driver = self.wait = None
+
+    def resolve(self) -> Tuple[webdriver.Chrome, WebDriverWait]:
+        if self.driver is None:
+            self.driver, self.wait = self.factory()
+        return self.driver, self.wait
+
+    def quit(self):
+        if self.driver is not None:
+            try:
+                self.driver.quit()
+            except Exception:
+                pass
+            self.driver = self.wait = None
+
+def driver_alive(d) -> bool:
+    """세션이 살아 있고 창이 남아 있는지 (재사용 전 헬스 체크)."""
+    try:
+        return bool(d.window_handles) and d.execute_script("return 1") == 1
+    except Exception:
+        return False
+
 # ──────────────────────────────────────────────────────────────
 # 엑셀
 # ──────────────────────────────────────────────────────────────
+HEADER = [
+    "번호","상품번호","상품명","정가","할인가","배송비","리뷰수","평점",
+    "상세페이지 URL","원본상품ID","이미지폴더","첫이미지","저장파일목록","이미지수"
+]
+
+DELTA_COLUMN = "변경필드"
+
+def header() -> List[str]:
+    return HEADER + [DELTA_COLUMN] if DELTA_MODE else list(HEADER)
+
 wb = openpyxl.Workbook()
 PLACEHOLDER_NAME = "_init"
 wb.active.title = PLACEHOLDER_NAME
 
+def sheet_name(name: str) -> str:
+    return re.sub(r'[\/:*?"<>|]', "_", name)[:31]
+
 def ensure_ws(name: str):
-    safe = re.sub(r'[\/:*?"<>|]', "_", name)[:31]
-    ws = wb.create_sheet(safe)
-    ws.append([
-        "번호","상품번호","상품명","정가","할인가","배송비","리뷰수","평점",
-        "상세페이지 URL","원본상품ID","이미지폴더","첫이미지","저장파일목록","이미지수"
-    ])
+    ws = wb.create_sheet(sheet_name(name))
+    ws.append(header())
     if PLACEHOLDER_NAME in wb.sheetnames and len(wb.sheetnames) > 1:
         del wb[PLACEHOLDER_NAME]
     return ws
@@ -77,6 +335,240 @@ def safe_save_workbook(wb, path: str):
         try: os.remove(tmp)
         except: pass
 
+# ──────────────────────────────────────────────────────────────
+# 출력 싱크 — 행 단위 append + 체크포인트, 마지막에 xlsx 생성
+#   positions() = 체크포인트 시점의 파일 크기/행 수 → 저널과 같은 커밋에 기록.
+#   이어서 수집할 때 marks 로 넘기면 그 뒤(저널이 모르는 행)는 잘라내고 이어 씀 — 중복 행 방지.
+# ──────────────────────────────────────────────────────────────
+SINK = "xlsx"   # "xlsx"(기존: 메모리 wb 전체 저장) | "jsonl" | "csv" | "sqlite"(행 즉시 기록 → 종료 시 xlsx 생성)
+
+def sink_path(kind: str) -> str:
+    stem = os.path.splitext(EXCEL_PATH)[0]
+    return stem + {"jsonl": ".rows.jsonl", "csv": ".rows", "sqlite": ".rows.db"}[kind]
+
+def materialize_xlsx(rows, path: str):
+    """(market_id, row) 스트림 → write-only 워크북. 메모리 사용량은 행 수와 무관."""
+    out = openpyxl.Workbook(write_only=True)
+    sheets = {}
+    for market_id, values in rows:
+        ws = sheets.get(market_id)
+        if ws is None:
+            ws = sheets[market_id] = out.create_sheet(sheet_name(market_id))
+            ws.append(header())
+        ws.append(values)
+    if not sheets:
+        out.create_sheet(PLACEHOLDER_NAME)
+    tmp = path + ".tmp"
+    out.save(tmp)
+    os.replace(tmp, path)
+
+def _truncate(path: str, size: int):
+    if os.path.exists(path):
+        with open(path, "r+b") as f:
+            f.truncate(max(0, size))
+
+class XlsxSink:
+    """기존 동작: 모듈 전역 wb 에 쌓고 체크포인트마다 전체 저장."""
+    def __init__(self, resume: bool = False, marks: Dict[str, int] = None):
+        global wb
+        self.sheets = {}
+        self.resume = resume and os.path.exists(EXCEL_PATH)
+        if self.resume:
+            wb = openpyxl.load_workbook(EXCEL_PATH)
+            if marks is not None:
+                for ws in wb.worksheets:
+                    keep = max(1, marks.get(self._key(ws.title), 1))  # 헤더 행은 유지
+                    if ws.max_row > keep:
+                        ws.delete_rows(keep + 1, ws.max_row - keep)
+
+    @staticmethod
+    def _key(title: str) -> str:
+        return f"{EXCEL_PATH}#{title}"
+
+    def begin_market(self, market_id: str):
+        name = sheet_name(market_id)
+        if self.resume and name in wb.sheetnames:
+            self.sheets[market_id] = wb[name]
+        else:
+            self.sheets[market_id] = ensure_ws(market_id)
+
+    def append(self, market_id: str, values: list):
+        self.sheets[market_id].append(values)
+
+    def checkpoint(self):
+        safe_save_workbook(wb, EXCEL_PATH)
+
+    def positions(self) -> Dict[str, int]:
+        return {self._key(ws.title): ws.max_row for ws in self.sheets.values()}
+
+    def close(self):
+        self.checkpoint()
+
+def read_jsonl_rows(path: str):
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                d = json.loads(line)
+            except ValueError:
+                continue  # 비정상 종료로 잘린 마지막 줄
+            yield d["market"], d["row"]
+
+class JsonlSink:
+    """행마다 한 줄 append (flush), 체크포인트마다 fsync."""
+    def __init__(self, path: str, append: bool = False, marks: Dict[str, int] = None):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        if append and marks is not None:
+            _truncate(path, marks.get(path, 0))
+        self.f = open(path, "a" if append else "w", encoding="utf-8")
+
+    def begin_market(self, market_id: str):
+        pass
+
+    def append(self, market_id: str, values: list):
+        self.f.write(json.dumps({"market": market_id, "row": values}, ensure_ascii=False) + "\n")
+        self.f.flush()
+
+    def checkpoint(self):
+        os.fsync(self.f.fileno())
+
+    def positions(self) -> Dict[str, int]:
+        return {self.path: os.fstat(self.f.fileno()).st_size}
+
+    def rows(self):
+        return read_jsonl_rows(self.path)
+
+    def close(self, materialize: bool = True):
+        self.checkpoint()
+        self.f.close()
+        if materialize:
+            materialize_xlsx(self.rows(), EXCEL_PATH)
+
+class CsvSink:
+    """마켓별 CSV 파일(utf-8-sig, 엑셀 호환)에 행 append."""
+    def __init__(self, folder: str, append: bool = False, marks: Dict[str, int] = None):
+        self.folder, self.append_mode, self.marks = folder, append, marks
+        os.makedirs(folder, exist_ok=True)
+        self.files = {}
+        self.order = []
+
+    def _path(self, market_id: str) -> str:
+        return os.path.join(self.folder, sheet_name(market_id) + ".csv")
+
+    def begin_market(self, market_id: str):
+        if market_id in self.files:
+            return
+        path = self._path(market_id)
+        if self.append_mode and self.marks is not None:
+            _truncate(path, self.marks.get(path, 0))
+        fresh = not (self.append_mode and os.path.exists(path) and os.path.getsize(path) > 0)
+        f = open(path, "w" if fresh else "a", encoding="utf-8-sig", newline="")
+        w = csv.writer(f)
+        if fresh:
+            w.writerow(header())
+        self.files[market_id] = (f, w)
+        self.order.append(market_id)
+
+    def append(self, market_id: str, values: list):
+        f, w = self.files[market_id]
+        w.writerow(values)
+        f.flush()
+
+    def checkpoint(self):
+        for f, _ in self.files.values():
+            os.fsync(f.fileno())
+
+    def positions(self) -> Dict[str, int]:
+        return {self._path(m): os.fstat(f.fileno()).st_size for m, (f, _) in self.files.items()}
+
+    def rows(self):
+        for market_id in self.order:
+            with open(self._path(market_id), "r", encoding="utf-8-sig", newline="") as f:
+                r = csv.reader(f)
+                next(r, None)
+                for values in r:
+                    # 번호/이미지수는 숫자로 복원 (CSV 는 문자열만 보존)
+                    for i in (0, HEADER.index("이미지수")):
+                        if i < len(values) and values[i].isdigit():
+                            values[i] = int(values[i])
+                    yield market_id, values
+
+    def close(self):
+        self.checkpoint()
+        for f, _ in self.files.values():
+            f.close()
+        materialize_xlsx(self.rows(), EXCEL_PATH)
+
+def connect_sqlite(path: str, autocommit: bool = False) -> sqlite3.Connection:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    con = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None if autocommit else "")
+    con.execute("PRAGMA journal_mode=WAL")
+    con.execute("PRAGMA synchronous=NORMAL")
+    return con
+
+class SqliteSink:
+    """rows 테이블에 행 insert, 체크포인트마다 commit (배치 단위 내구성)."""
+    def __init__(self, path: str, append: bool = False, marks: Dict[str, int] = None):
+        self.path = path
+        self.con = connect_sqlite(path)
+        self.con.execute("CREATE TABLE IF NOT EXISTS rows (id INTEGER PRIMARY KEY, market TEXT, row TEXT)")
+        if not append:
+            self.con.execute("DELETE FROM rows")
+        elif marks is not None:
+            self.con.execute("DELETE FROM rows WHERE id > ?", (marks.get(path, 0),))
+        self.con.commit()
+
+    def begin_market(self, market_id: str):
+        pass
+
+    def append(self, market_id: str, values: list):
+        self.con.execute("INSERT INTO rows (market, row) VALUES (?, ?)", (market_id, json.dumps(values, ensure_ascii=False)))
+
+    def checkpoint(self):
+        self.con.commit()
+
+    def positions(self) -> Dict[str, int]:
+        return {self.path: self.con.execute("SELECT COALESCE(MAX(id), 0) FROM rows").fetchone()[0]}
+
+    def rows(self):
+        for market_id, row in self.con.execute("SELECT market, row FROM rows ORDER BY id"):
+            yield market_id, json.loads(row)
+
+    def close(self):
+        self.checkpoint()
+        materialize_xlsx(self.rows(), EXCEL_PATH)
+        self.con.close()
+
+_SINK = None
+
+def output_sink():
+    global _SINK
+    if _SINK is None:
+        journal = crawl_journal()
+        resume = journal.resuming  # 이어서 수집: 이전 실행 행(저널에 커밋된 만큼)을 보존하고 뒤에 추가
+        marks = journal.sink_marks() if resume else None
+        if SINK == "jsonl":
+            _SINK = JsonlSink(sink_path("jsonl"), append=resume, marks=marks)
+        elif SINK == "csv":
+            _SINK = CsvSink(sink_path("csv"), append=resume, marks=marks)
+        elif SINK == "sqlite":
+            _SINK = SqliteSink(sink_path("sqlite"), append=resume, marks=marks)
+        else:
+            _SINK = XlsxSink(resume=resume, marks=marks)
+    return _SINK
+
+def finalize_output():
+    """실행 종료 시 1회: 싱크를 닫고 EXCEL_PATH 에 최종 xlsx 생성."""
+    global _SINK
+    try:
+        if _SINK is None:
+            safe_save_workbook(wb, EXCEL_PATH)
+        else:
+            _SINK.close()
+    finally:
+        _SINK = None
+        end_journal_session()
+
 # ──────────────────────────────────────────────────────────────
 # 유틸
 # ──────────────────────────────────────────────────────────────
@@ -96,6 +588,40 @@ def market_id_from_url(url: str) -> str:
     path = urlparse(url).path.strip('/')
     return re.sub(r'[^0-9a-zA-Z_ㄱ-힣-]', '_', path.split('/')[0]) or "market"
 
+class HostRateLimiter:
+    """호스트별 최소 간격(+지터). 슬롯은 lock 안에서 예약하고 대기는 lock 밖에서 — 스레드 여럿이 같이 써도 됨."""
+    MAX_HOSTS = 256   # 넘으면 예약 시각이 지난 호스트를 정리 (지난 예약은 없는 것과 같음)
+
+    def __init__(self, interval: float = 0.0, jitter: float = 0.0):
+        self.interval, self.jitter = interval, jitter
+        self._next: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def wait(self, url: str):
+        if self.interval <= 0 and self.jitter <= 0:
+            return
+        host = urlparse(url).netloc.lower()
+        with self._lock:
+            now = time.monotonic()
+            if len(self._next) >= self.MAX_HOSTS:
+                self._next = {h: t for h, t in self._next.items() if t > now}
+            slot = max(now, self._next.get(host, 0.0))
+            self._next[host] = slot + self.interval + random.uniform(0, self.jitter)
+        if slot > now:
+            with span("rate_wait"):
+                time.sleep(slot - now)
+
+_PAGE_LIMITER = HostRateLimiter()
+_IMG_LIMITER = HostRateLimiter()
+
+def page_limiter() -> HostRateLimiter:
+    _PAGE_LIMITER.interval, _PAGE_LIMITER.jitter = PAGE_MIN_INTERVAL, PAGE_JITTER
+    return _PAGE_LIMITER
+
+def img_limiter() -> HostRateLimiter:
+    _IMG_LIMITER.interval = IMG_MIN_INTERVAL
+    return _IMG_LIMITER
+
 # ──────────────────────────────────────────────────────────────
 # 상품 목록 로딩
 # ──────────────────────────────────────────────────────────────
@@ -115,35 +641,229 @@ def ensure_products_loaded(driver: webdriver.Chrome, wait: WebDriverWait, retrie
 # 이미지
 # ──────────────────────────────────────────────────────────────
 SESSION = requests.Session()
-SESSION.mount("https://", HTTPAdapter(max_retries=Retry(total=3, backoff_factor=0.3)))
 SESSION.headers.update({"User-Agent": UA})
 
+def _mount_session_pool(size: int):
+    adapter = HTTPAdapter(max_retries=Retry(total=3, backoff_factor=0.3), pool_connections=size, pool_maxsize=size)
+    SESSION.mount("https://", adapter)
+    SESSION.mount("http://", adapter)
+
+_mount_session_pool(IMG_WORKERS)
+
+def _img_ext(url: str) -> str:
+    ext = re.search(r'\.(jpg|jpeg|png|gif|bmp)', url.split("?")[0], re.I)
+    return "." + (ext.group(1).lower() if ext else "jpg")
+
+class ImageStore:
+    """
+    내용 주소(content-addressed) 이미지 저장소.
+      - URL → (sha256, ETag, Last-Modified) 인덱스 (SQLite, 실행 간 유지)
+      - 같은 바이트는 _cas/ab/<sha256><ext> 에 한 번만 저장, 상품 폴더에는 하드링크(실패 시 복사)
+      - 이번 실행에서 받은 URL 은 네트워크 생략, 이전 실행 URL 은 조건부 GET(304 면 재사용)
+    """
+    def __init__(self, root: str, db_path: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self.con = connect_sqlite(db_path)
+        self.con.execute("""CREATE TABLE IF NOT EXISTS urls (
+            url TEXT PRIMARY KEY, sha TEXT, ext TEXT, etag TEXT, last_modified TEXT, size INTEGER, fetched_at REAL)""")
+        self.con.commit()
+        self._db_lock = threading.Lock()
+        self._url_locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+        self._run: Dict[str, str] = {}  # 이번 실행에서 확정된 url → blob
+        self.stats = {"net": 0, "not_modified": 0, "memo": 0, "new_blobs": 0, "dup_blobs": 0, "bytes": 0}
+        self._stats_lock = threading.Lock()  # 다운로드 스레드들이 동시에 갱신 — += 는 원자적이지 않음
+
+    def _count(self, key: str, n: int = 1):
+        with self._stats_lock:
+            self.stats[key] += n
+
+    def stats_snapshot(self) -> Dict[str, int]:
+        with self._stats_lock:
+            return dict(self.stats)
+
+    def _url_lock(self, url: str) -> threading.Lock:
+        with self._locks_guard:
+            lk = self._url_locks.get(url)
+            if lk is None:
+                lk = self._url_locks[url] = threading.Lock()
+            return lk
+
+    def blob_path(self, sha: str, ext: str) -> str:
+        return os.path.join(self.root, sha[:2], sha + ext)
+
+    def _lookup(self, url: str):
+        with self._db_lock:
+            return self.con.execute("SELECT sha, ext, etag, last_modified FROM urls WHERE url=?", (url,)).fetchone()
+
+    def _remember(self, url: str, sha: str, ext: str, etag: str, last_modified: str, size: int):
+        with self._db_lock:
+            self.con.execute("INSERT OR REPLACE INTO urls VALUES (?,?,?,?,?,?,?)",
+                             (url, sha, ext, etag, last_modified, size, time.time()))
+            self.con.commit()
+
+    def _write_blob(self, content: bytes, ext: str) -> str:
+        sha = hashlib.sha256(content).hexdigest()
+        path = self.blob_path(sha, ext)
+        if os.path.exists(path):
+            self._count("dup_blobs")
+            return sha
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(content)
+        os.replace(tmp, path)
+        self._count("new_blobs")
+        return sha
+
+    def fetch(self, url: str, referer: str) -> str:
+        """url 의 blob 경로 (실패 시 "")."""
+        with self._url_lock(url):
+            memo = self._run.get(url)
+            if memo and os.path.exists(memo):
+                self._count("memo")
+                return memo
+            self._run.pop(url, None)  # 웜 프로세스에서 그 사이 blob 이 지워짐 → 아래에서 다시 받음
+            known = self._lookup(url)
+            headers = {"Referer": referer}
+            if known and os.path.exists(self.blob_path(known[0], known[1])):
+                if not IMG_REVALIDATE:
+                    self._run[url] = self.blob_path(known[0], known[1])
+                    return self._run[url]
+                if known[2]: headers["If-None-Match"] = known[2]
+                if known[3]: headers["If-Modified-Since"] = known[3]
+            else:
+                known = None
+
+            img_limiter().wait(url)
+            r = SESSION.get(url, headers=headers, timeout=10)
+            self._count("net")
+            if r.status_code == 304 and known:
+                self._count("not_modified")
+                blob = self.blob_path(known[0], known[1])
+            elif r.status_code != 200 or len(r.content) < 1024:
+                return ""
+            else:
+                self._count("bytes", len(r.content))
+                incr("img_bytes", len(r.content))
+                ext = _img_ext(url)
+                sha = self._write_blob(r.content, ext)
+                self._remember(url, sha, ext, r.headers.get("ETag", ""), r.headers.get("Last-Modified", ""), len(r.content))
+                blob = self.blob_path(sha, ext)
+            self._run[url] = blob
+            return blob
+
+    @staticmethod
+    def place(blob: str, dest: str):
+        """blob 을 dest 로 하드링크 (이미 같은 파일이면 생략, 링크 불가 시 복사)."""
+        if os.path.exists(dest):
+            try:
+                if os.path.samefile(blob, dest):
+                    return
+            except OSError:
+                pass
+            os.remove(dest)
+        try:
+            os.link(blob, dest)
+        except OSError:
+            shutil.copyfile(blob, dest)
+
+_STORE = None
+_STORE_LOCK = threading.Lock()
+
+def image_store() -> ImageStore:
+    global _STORE
+    with _STORE_LOCK:
+        root = os.path.join(IMG_ROOT, "_cas")
+        if _STORE is None or _STORE.root != root:
+            _STORE = ImageStore(root, os.path.join(BASE_DIR, "image_cache.db"))
+        return _STORE
+
 def save_image_as_seq(url: str, folder: str, prod_no: str, seq: int, referer: str) -> str:
     try:
         os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, f"{prod_no}_{seq:02d}{_img_ext(url)}")
+        if _JOURNAL is not None and _JOURNAL.resuming and os.path.exists(path) and os.path.getsize(path) >= 1024:
+            return path  # 이어서 수집 중 — 중단된 실행에서 이미 받은 장
+        if IMG_DEDUPE:
+            blob = image_store().fetch(url, referer)
+            if not blob:
+                return ""
+            ImageStore.place(blob, path)
+            return path
+        img_limiter().wait(url)
         r = SESSION.get(url, headers={"Referer": referer}, timeout=10)
         if r.status_code != 200 or len(r.content) < 1024:
             return ""
-        ext = re.search(r'\.(jpg|jpeg|png|gif|bmp)', url.split("?")[0], re.I)
-        ext = "." + (ext.group(1).lower() if ext else "jpg")
-        path = os.path.join(folder, f"{prod_no}_{seq:02d}{ext}")
         with open(path, "wb") as f:
             f.write(r.content)
         return path
     except Exception:
         return ""
 
-def _push_candidates_from_img(el, seen: set, out: list):
-    cand = [
-        el.get_attribute("src"),
-        el.get_attribute("data-src"),
-        el.get_attribute("data-lazy-src"),
-        el.get_attribute("currentSrc"),
-    ]
-    ss = el.get_attribute("srcset") or ""
-    if ss:
-        parts = [p.strip().split(" ")[0] for p in ss.split(",") if p.strip()]
-        cand.extend(parts)
+class ImageDownloader:
+    """
+    상품 단위 이미지 다운로드 풀.
+    카드 루프는 submit_product()로 URL 목록만 넘기고 바로 다음 카드로 진행,
+    결과(저장 경로 목록)는 상품별 future 묶음으로 나중에 회수한다.
+    """
+    def __init__(self, workers: int = None, per_host: int = None):
+        self.workers = int(workers or IMG_WORKERS)
+        self.per_host = int(per_host or IMG_PER_HOST)
+        _mount_session_pool(self.workers)
+        self.pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="img")
+        self._host_sem: Dict[str, threading.BoundedSemaphore] = {}
+        self._lock = threading.Lock()
+
+    def _sem(self, url: str) -> threading.BoundedSemaphore:
+        host = urlparse(url).netloc.lower()
+        with self._lock:
+            sem = self._host_sem.get(host)
+            if sem is None:
+                sem = self._host_sem[host] = threading.BoundedSemaphore(self.per_host)
+            return sem
+
+    def _fetch(self, url: str, folder: str, prod_no: str, seq: int, referer: str) -> str:
+        with self._sem(url), span("image_download"):
+            return save_image_as_seq(url, folder, prod_no, seq, referer=referer)
+
+    def submit_product(self, urls: List[str], folder: str, prod_no: str, referer: str) -> list:
+        return [self.pool.submit(self._fetch, u, folder, prod_no, i, referer) for i, u in enumerate(urls, start=1)]
+
+    @staticmethod
+    def done(futs: list) -> bool:
+        return all(f.done() for f in futs)
+
+    @staticmethod
+    def results(futs: list) -> List[str]:
+        out = []
+        for f in futs:
+            try:
+                out.append("" if f.cancelled() else f.result())
+            except Exception:
+                out.append("")
+        return out
+
+    def cancel_pending(self, futs_list):
+        for futs in futs_list:
+            for f in futs:
+                f.cancel()
+
+    def shutdown(self):
+        self.pool.shutdown(wait=True)
+
+_DOWNLOADER = None
+
+def image_downloader() -> ImageDownloader:
+    global _DOWNLOADER
+    if _DOWNLOADER is None or _DOWNLOADER.workers != IMG_WORKERS or _DOWNLOADER.per_host != IMG_PER_HOST:
+        if _DOWNLOADER is not None:
+            _DOWNLOADER.shutdown()
+        _DOWNLOADER = ImageDownloader()
+    return _DOWNLOADER
+
+def _push_candidate_urls(cand: list, seen: set, out: list):
     for u in cand:
         if not u or not u.startswith("http"): 
             continue
@@ -156,13 +876,23 @@ def _push_candidates_from_img(el, seen: set, out: list):
         seen.add(key)
         out.append(u)
 
-def _push_background_images(scope_el, seen: set, out: list):
-    # style="background-image:url(...)" 형태도 수집
-    els = scope_el.find_elements(By.CSS_SELECTOR, "[style*='background-image']")
-    for e in els:
-        style = e.get_attribute("style") or ""
+def _srcset_urls(ss: str) -> List[str]:
+    return [p.strip().split(" ")[0] for p in (ss or "").split(",") if p.strip()]
+
+def _push_candidates_from_img(el, seen: set, out: list):
+    cand = [
+        el.get_attribute("src"),
+        el.get_attribute("data-src"),
+        el.get_attribute("data-lazy-src"),
+        el.get_attribute("currentSrc"),
+    ]
+    cand.extend(_srcset_urls(el.get_attribute("srcset") or ""))
+    _push_candidate_urls(cand, seen, out)
+
+def _push_background_styles(styles: List[str], seen: set, out: list):
+    for style in styles:
         # url("...") 또는 url('...') 또는 url(...)
-        m = re.search(r"url\((['\"]?)(.+?)\1\)", style)
+        m = re.search(r"url\((['\"]?)(.+?)\1\)", style or "")
         if not m: 
             continue
         u = m.group(2)
@@ -176,6 +906,11 @@ def _push_background_images(scope_el, seen: set, out: list):
         seen.add(key)
         out.append(u)
 
+def _push_background_images(scope_el, seen: set, out: list):
+    # style="background-image:url(...)" 형태도 수집
+    els = scope_el.find_elements(By.CSS_SELECTOR, "[style*='background-image']")
+    _push_background_styles([e.get_attribute("style") or "" for e in els], seen, out)
+
 def collect_card_img_urls(card_el) -> List[str]:
     """
     상품 카드 내 모든 이미지 URL 수집:
@@ -192,12 +927,7 @@ def collect_card_img_urls(card_el) -> List[str]:
     except Exception:
         container = card_el
 
-    try:
-        driver.execute_script("arguments[0].scrollIntoView({block:'center'});", container)
-        time.sleep(random.uniform(0.15, 0.45))
-    except Exception:
-        pass
-
+    # lazy 로딩은 load_cards 의 wait_lazy_images 가 페이지 단위로 이미 처리함 (카드별 스크롤/대기 없음)
     for img in container.find_elements(By.CSS_SELECTOR, "img"):
         _push_candidates_from_img(img, seen, urls)
     _push_background_images(container, seen, urls)
@@ -213,141 +943,829 @@ def collect_card_img_urls(card_el) -> List[str]:
 
     return urls
 
+# ──────────────────────────────────────────────────────────────
+# 카드 필드 추출 — raw dict 로 통일 (JS 1회 / WebElement 개별 호출)
+# ──────────────────────────────────────────────────────────────
+# raw = {
+#   "dtl": data-shp-contents-dtl, "href": 링크, "has_li": 부모 <li> 존재 여부,
+#   "sale_text": 할인가 텍스트, "free_ship": 무료배송 여부, "fee_texts": [div.UVrxHKBc0E 텍스트],
+#   "ship_text" / "review_text" / "rating_text": 각 필드 전략의 첫 매칭 텍스트 (없으면 None),
+#   "img_groups": [{"imgs": [[src, data-src, data-lazy-src, currentSrc, srcset], ...], "bg": [style, ...]}, ...]
+#                 (컨테이너 → li swiper 순서)  또는  "img_urls": 이미 정리된 URL 목록,
+#   "_sel": {필드: [[시도한 전략 id, ...], 적중 여부]}  — 셀렉터 통계용 (상태 JSON 경로엔 없음)
+# }
+
+# 필드별 셀렉터 전략 — 위에서부터 시도, 첫 적중에서 멈춤. 선언 순서가 곧 우선순위(정밀 → 느슨한 폴백)이고,
+# 통계는 기록만 한다. 클래스명이 바뀌어 css 가 빗나가면 다음 전략이 받아 주므로 결과는 같고 시도 1회만 늘어남.
+#   {"css": 선택자}  또는  {"text": [포함어, ...], "not": [제외어, ...]}  (XPath contains(text()) — 첫 텍스트 노드 기준)
+# SELECTOR_ADAPTIVE 필드만 스토어별 적중률로 재정렬 — 전략들이 같은 요소를 가리키는 동등한 대안일 때만 넣을 것
+# (폴백이 앞에 오면 할인 없는 카드에서 정가를 할인가로 읽는 식으로 값이 바뀜).
+SELECTOR_ADAPTIVE = {"review"}
+SELECTOR_PROBE_EVERY = 5   # 재정렬 필드도 실행 첫 페이지와 N 페이지마다 선언 순서로 — 밀려난 전략이 회복할 기회
+SELECTOR_WARN_DROP = 0.3   # 1순위 전략의 이번 실행 적중률이 누적 적중률보다 이만큼 낮으면 경고 (순서와 무관, 모든 필드)
+SELECTOR_WARN_MIN = 30     # 경고 판단에 필요한 이번 실행 최소 시도 수
+SELECTOR_STRATEGIES = {
+    "sale":      [{"css": "span.zIK_uvWc6D"}, {"text": ["원"], "not": ["배송"]}],
+    "free_ship": [{"text": ["무료배송"]}],
+    "fee":       [{"css": "div.UVrxHKBc0E"}],
+    "ship":      [{"text": ["배송"]}],
+    "review":    [{"text": ["리뷰"]}, {"css": "[class*='GF9']"}],
+    "rating":    [{"text": ["평점", "★"]}],
+}
+# 필드 → (raw 키, 값 형태)  text: 첫 요소 텍스트 / exists: 존재 여부 / list: 매칭 요소 전체 텍스트
+SELECTOR_FIELDS = {
+    "sale": ("sale_text", "text"), "free_ship": ("free_ship", "exists"), "fee": ("fee_texts", "list"),
+    "ship": ("ship_text", "text"), "review": ("review_text", "text"), "rating": ("rating_text", "text"),
+}
+
+def _xp_literal(s: str) -> str:
+    return f'"{s}"' if '"' not in s else "concat(" + ",'\"',".join(f'"{p}"' for p in s.split('"')) + ")"
+
+def compile_strategy(spec: dict) -> dict:
+    """전략 spec → id / xpath / bs4 술어까지 미리 만들어 둔 dict (카드마다 다시 만들지 않음)."""
+    out = {"css": spec.get("css")}
+    if out["css"]:
+        out["id"] = "css:" + out["css"]
+        return out
+    inc, exc = list(spec.get("text") or []), list(spec.get("not") or [])
+    cond = "(" + " or ".join(f"contains(text(),{_xp_literal(w)})" for w in inc) + ")"
+    cond += "".join(f" and not(contains(text(),{_xp_literal(w)}))" for w in exc)
+    out["id"] = "text:" + "|".join(inc) + ("!" + "|".join(exc) if exc else "")
+    out["xpath"] = f".//*[{cond}]"
+    out["_pred"] = _bs_text_has(*inc, exclude=tuple(exc)) if BeautifulSoup is not None else None
+    return out
+
+COMPILED_STRATEGIES: Dict[str, List[dict]] = {}
+
+def compile_strategies():
+    """SELECTOR_STRATEGIES 를 바꿨다면 다시 호출."""
+    COMPILED_STRATEGIES.clear()
+    for field, specs in SELECTOR_STRATEGIES.items():
+        COMPILED_STRATEGIES[field] = [compile_strategy(sp) for sp in specs]
+
+def selector_order(store: str = None) -> Dict[str, List[dict]]:
+    if not COMPILED_STRATEGIES:
+        compile_strategies()
+    return selector_stats().order(store) if store else dict(COMPILED_STRATEGIES)
+
+def apply_strategies(scope, order: Dict[str, List[dict]], find, text_of) -> dict:
+    """order 대로 필드별 전략 시도 → raw 필드 + _sel. find(scope, 전략, 전부?) → 요소 리스트 (없으면 빈 리스트)."""
+    raw, sel = {}, {}
+    for field, specs in order.items():
+        key, kind = SELECTOR_FIELDS[field]
+        tried, els = [], None
+        for sp in specs:
+            tried.append(sp["id"])
+            found = find(scope, sp, kind == "list")
+            if found:
+                els = found
+                break
+        sel[field] = [tried, els is not None]
+        if kind == "exists":
+            raw[key] = els is not None
+        elif kind == "list":
+            raw[key] = [text_of(e) for e in els] if els else []
+        else:
+            raw[key] = text_of(els[0]) if els else None
+    raw["_sel"] = sel
+    return raw
+
+CARD_EXTRACT_JS = r"""
+const ORDER = arguments[0];  // [[필드, raw 키, 형태, [{id, css, xpath}, ...]], ...] — 스토어별 정렬 순서
+for (const [, , , specs] of ORDER) for (const s of specs) {
+  if (s.xpath) { try { s.expr = document.createExpression(s.xpath, null); } catch(e) { s.expr = null; } }  // 페이지당 1회 컴파일
+}
+function find(scope, s, all){
+  if (s.css) return all ? Array.from(scope.querySelectorAll(s.css)) : [scope.querySelector(s.css)].filter(Boolean);
+  if (!s.expr) return [];
+  const n = s.expr.evaluate(scope, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+  return n ? [n] : [];
+}
+function text(el){ return el ? (el.innerText || "").trim() : null; }
+function fields(li, out){
+  const sel = {};
+  for (const [field, key, kind, specs] of ORDER) {
+    const tried = []; let els = null;
+    for (const s of specs) {
+      tried.push(s.id);
+      const f = find(li, s, kind === "list");
+      if (f.length) { els = f; break; }
+    }
+    sel[field] = [tried, els !== null];
+    out[key] = kind === "exists" ? els !== null : kind === "list" ? (els || []).map(text) : (els ? text(els[0]) : null);
+  }
+  out._sel = sel;
+}
+function imgCand(img){
+  return [img.src || null, img.getAttribute("data-src"), img.getAttribute("data-lazy-src"),
+          img.currentSrc || null, img.getAttribute("srcset") || ""];
+}
+function group(scope, imgSel){
+  return {
+    imgs: Array.from(scope.querySelectorAll(imgSel)).map(imgCand),
+    bg: Array.from(scope.querySelectorAll("[style*='background-image']")).map(e => e.getAttribute("style") || "")
+  };
+}
+return Array.from(document.querySelectorAll("a.linkAnchor[data-shp-contents-dtl]")).map(a => {
+  const li = a.parentElement ? a.parentElement.closest("li") : null;
+  const container = a.querySelector(".I3B6dXSHqa, .zslOZxOl9K") || a;
+  const out = {
+    dtl: a.getAttribute("data-shp-contents-dtl") || "",
+    href: a.href || "",
+    has_li: !!li,
+    img_groups: [group(container, "img")]
+  };
+  if (li) {
+    fields(li, out);
+    out.img_groups.push(group(li, ".swiper-wrapper img"));
+  }
+  return out;
+});
+"""
+
+LAZY_READY_JS = r"""
+const done = arguments[arguments.length - 1];
+const timeoutMs = arguments[0];
+const anchors = Array.from(document.querySelectorAll("a.linkAnchor[data-shp-contents-dtl]"));
+// 준비 조건은 카드 대표 이미지만 — 안 보이는 swiper 슬라이드는 스크롤해도 승격되지 않음
+const boxes = anchors.map(a => (a.closest("li") || a).querySelector(".I3B6dXSHqa, .zslOZxOl9K") || a);
+function pending() {
+  let n = 0;
+  for (const b of boxes) for (const img of b.querySelectorAll("img[data-src], img[data-lazy-src]")) {
+    const want = img.getAttribute("data-src") || img.getAttribute("data-lazy-src");
+    const src = img.getAttribute("src") || "";
+    if (want && (!src || src.startsWith("data:"))) n++;
+  }
+  return n;
+}
+const t0 = performance.now();
+const stepPx = Math.max(200, Math.floor(window.innerHeight * 0.9));
+let y = 0, finished = false;
+function finish() {
+  if (finished) return;
+  finished = true;
+  done({cards: anchors.length, pending: pending(), ms: Math.round(performance.now() - t0)});
+}
+// 화면 높이 단위로 프레임마다 한 번씩 내려가며 사이트의 IntersectionObserver 를 깨운 뒤, 승격 여부만 폴링
+// 무한 스크롤로 scrollHeight 가 계속 늘어도 timeoutMs 에서 끊음
+function scrollStep() {
+  if (finished) return;
+  if (performance.now() - t0 > timeoutMs) { finish(); return; }
+  const end = Math.max(document.body.scrollHeight, document.documentElement.scrollHeight);
+  window.scrollTo(0, y);
+  if (y < end) { y += stepPx; requestAnimationFrame(scrollStep); return; }
+  poll();
+}
+function poll() {
+  if (finished) return;
+  if (pending() === 0 || performance.now() - t0 > timeoutMs) { finish(); return; }
+  setTimeout(poll, 50);
+}
+// 가려진 창에선 requestAnimationFrame 이 멈출 수 있음 — 그래도 timeoutMs 에 반환
+setTimeout(finish, timeoutMs + 50);
+scrollStep();
+"""
+
+def wait_lazy_images(driver: webdriver.Chrome, timeout: float = None) -> dict:
+    """페이지 전체를 한 번 훑고 대표 이미지의 data-src 승격(또는 timeout)까지 대기 — 카드 단위 sleep 없음."""
+    timeout = LAZY_TIMEOUT if timeout is None else timeout
+    try:
+        driver.set_script_timeout(timeout + 10)
+        res = driver.execute_async_script(LAZY_READY_JS, int(timeout * 1000)) or {}
+    except Exception as e:
+        print("[LAZY] 대기 스크립트 실패(무시):", e)
+        return {}
+    if res.get("pending"):
+        incr("lazy_timeout_imgs", res["pending"])
+    return res
+
+def extract_cards_js(driver: webdriver.Chrome, order: Dict[str, List[dict]] = None) -> List[dict]:
+    order = order or selector_order()
+    spec = [[f, *SELECTOR_FIELDS[f], [{k: v for k, v in sp.items() if not k.startswith("_")} for sp in sps]]
+            for f, sps in order.items()]
+    return driver.execute_script(CARD_EXTRACT_JS, spec) or []
+
+def _dom_find(scope, sp: dict, all_: bool) -> list:
+    # find_elements 는 없으면 빈 리스트 — 미스마다 예외 처리 비용 없음
+    els = scope.find_elements(By.CSS_SELECTOR, sp["css"]) if sp.get("css") else scope.find_elements(By.XPATH, sp["xpath"])
+    return els if all_ else els[:1]
+
+def read_card_dom(tag, order: Dict[str, List[dict]] = None) -> dict:
+    # WebElement 개별 호출 방식 (FAST_EXTRACT=False)
+    raw = {
+        "dtl": tag.get_attribute("data-shp-contents-dtl") or "",
+        "href": tag.get_attribute("href") or "",
+        "has_li": False,
+    }
+    if not raw["href"]:
+        return raw
+    try:
+        li = tag.find_element(By.XPATH, "./ancestor::li[1]")
+    except:
+        li = None
+    if li:
+        raw["has_li"] = True
+        raw.update(apply_strategies(li, order or selector_order(), _dom_find, lambda el: el.text))
+    raw["img_urls"] = collect_card_img_urls(tag)
+    return raw
+
+def card_img_urls_from_raw(raw: dict) -> List[str]:
+    if "img_urls" in raw:
+        return list(raw["img_urls"])
+    urls, seen = [], set()
+    for g in raw.get("img_groups") or []:
+        for c in g.get("imgs") or []:
+            c = list(c or [])
+            srcset = c.pop() if len(c) >= 5 else ""
+            _push_candidate_urls(c + _srcset_urls(srcset), seen, urls)
+        _push_background_styles(g.get("bg") or [], seen, urls)
+    return urls
+
+def parse_card(raw: dict) -> Dict[str, str]:
+    href = raw.get("href") or ""
+    if not href:
+        return {}
+    detail_json = raw.get("dtl") or ""
+    data = json.loads(html.unescape(detail_json)) if detail_json else []
+    kv = {d.get("key"): d.get("value") for d in data if isinstance(d, dict)}
+
+    sale_price = shipping_fee = review_count = rating = ""
+    if raw.get("has_li"):
+        # 할인가
+        if raw.get("sale_text") is not None:
+            sale_price = re.sub(r"[^\d]", "", raw["sale_text"])
+
+        # 배송비
+        if raw.get("free_ship"):
+            shipping_fee = "0"
+        else:
+            for txt in raw.get("fee_texts") or []:
+                digits = re.sub(r"[^\d]", "", (txt or "").strip())
+                if digits:
+                    shipping_fee = digits
+                    break
+            else:
+                t = raw.get("ship_text")
+                if t is not None:
+                    m = re.search(r"(\d[\d,]*)\s*원", t)
+                    shipping_fee = m.group(1).replace(",", "") if m else re.sub(r"[^\d]", "", t)
+
+        # 리뷰/평점
+        if raw.get("review_text") is not None:
+            review_count = re.sub(r"[^\d]", "", raw["review_text"])
+        if raw.get("rating_text") is not None:
+            m = re.search(r"[\d\.]+", raw["rating_text"])
+            rating = m.group(0) if m else ""
+
+    return {
+        "title": kv.get("chnl_prod_nm", ""),
+        "price": kv.get("price", ""),
+        "href": href,
+        "product_id": extract_product_id(href, kv),
+        "sale_price": sale_price,
+        "shipping_fee": shipping_fee,
+        "review_count": review_count,
+        "rating": rating,
+    }
+
+# ──────────────────────────────────────────────────────────────
+# HTTP 모드 — 서버 렌더링된 카테고리 페이지는 브라우저 없이 파싱
+# ──────────────────────────────────────────────────────────────
+STATE_RE = re.compile(r"window\.__PRELOADED_STATE__\s*=\s*(\{.*?\})\s*;?\s*</script>", re.S)
+
+def fetch_page_http(url: str) -> str:
+    page_limiter().wait(url)
+    r = SESSION.get(url, headers={"Accept-Language": "ko-KR,ko;q=0.9"}, timeout=PAGELOAD_TIMEOUT)
+    r.raise_for_status()
+    return r.text
+
+def _bs_text(el) -> str:
+    # WebElement.text 와 같은 공백 정규화
+    return " ".join(el.get_text(" ").split())
+
+def _bs_first_text_node(el) -> str:
+    # XPath contains(text(), ...) 는 첫 번째 텍스트 노드만 본다
+    for c in el.children:
+        if isinstance(c, NavigableString) and not isinstance(c, Comment):
+            return str(c)
+    return ""
+
+def _bs_first(scope, pred):
+    for el in scope.find_all(True):
+        if pred(el):
+            return el
+    return None
+
+def _bs_text_has(*include, exclude=()):
+    def pred(el):
+        t = _bs_first_text_node(el)
+        return any(w in t for w in include) and not any(w in t for w in exclude)
+    return pred
+
+def _bs_find(scope, sp: dict, all_: bool) -> list:
+    if sp.get("css"):
+        if all_:
+            return scope.select(sp["css"])
+        el = scope.select_one(sp["css"])
+        return [el] if el is not None else []
+    el = _bs_first(scope, sp["_pred"])
+    return [el] if el is not None else []
+
+def _bs_img_groups(scope, img_sel: str, base_url: str) -> dict:
+    imgs = []
+    for img in scope.select(img_sel):
+        src = img.get("src")
+        imgs.append([urljoin(base_url, src) if src else None, img.get("data-src"), img.get("data-lazy-src"),
+                     None, img.get("srcset") or ""])
+    bg = [e.get("style") or "" for e in scope.select("[style*='background-image']")]
+    return {"imgs": imgs, "bg": bg}
+
+def _raw_from_anchor(a, base_url: str, order: Dict[str, List[dict]] = None) -> dict:
+    li = a.find_parent("li")
+    container = a.select_one(".I3B6dXSHqa, .zslOZxOl9K") or a
+    raw = {
+        "dtl": a.get("data-shp-contents-dtl") or "",
+        "href": urljoin(base_url, a.get("href") or "") if a.get("href") else "",
+        "has_li": li is not None,
+        "img_groups": [_bs_img_groups(container, "img", base_url)],
+    }
+    if li is not None:
+        raw.update(apply_strategies(li, order or selector_order(), _bs_find, _bs_text))
+        raw["img_groups"].append(_bs_img_groups(li, ".swiper-wrapper img", base_url))
+    return raw
+
+def _iter_state_products(node):
+    # __PRELOADED_STATE__ 안의 상품 객체(id + name + salePrice) 탐색
+    if isinstance(node, dict):
+        if node.get("id") and node.get("name") and "salePrice" in node:
+            yield node
+            return
+        for v in node.values():
+            yield from _iter_state_products(v)
+    elif isinstance(node, list):
+        for v in node:
+            yield from _iter_state_products(v)
+
+def _raw_from_state(p: dict, base_url: str) -> dict:
+    pid = str(p.get("id"))
+    benefit = p.get("benefitsView") or {}
+    review = p.get("reviewAmount") or {}
+    delivery = p.get("productDeliveryInfo") or {}
+    kv = [{"key": "chnl_prod_nm", "value": p.get("name", "")},
+          {"key": "price", "value": str(p.get("salePrice", ""))},
+          {"key": "chnl_prod_no", "value": pid}]
+    path = urlparse(base_url).path.strip("/").split("/")[0]
+    imgs = [p.get("representativeImageUrl")] + [i.get("url") for i in (p.get("productImages") or []) if isinstance(i, dict)]
+    fee = delivery.get("baseFee")
+    return {
+        "dtl": json.dumps(kv, ensure_ascii=False),
+        "href": urljoin(base_url, f"/{path}/products/{pid}"),
+        "has_li": True,
+        "sale_text": str(benefit.get("discountedSalePrice") or p.get("salePrice") or ""),
+        "free_ship": fee == 0,
+        "fee_texts": [str(fee)] if fee else [],
+        "ship_text": None,
+        "review_text": str(review.get("totalReviewCount", "")) if review else None,
+        "rating_text": str(review.get("averageReviewScore", "")) if review else None,
+        "img_urls": [u for u in dict.fromkeys(imgs) if u and u.startswith("http") and IMG_EXT_RE.search(u.split("?")[0])],
+    }
+
+def extract_cards_html(page_html: str, base_url: str, order: Dict[str, List[dict]] = None) -> List[dict]:
+    """카테고리 HTML → 카드 raw 목록 (extract_cards_js 와 같은 형식). 앵커 우선, 없으면 임베드 상태 JSON."""
+    soup = BeautifulSoup(page_html, "html.parser")
+    anchors = soup.select("a.linkAnchor[data-shp-contents-dtl]")
+    if anchors:
+        order = order or selector_order()
+        return [_raw_from_anchor(a, base_url, order) for a in anchors]
+    m = STATE_RE.search(page_html)
+    if not m:
+        return []
+    try:
+        state = json.loads(m.group(1))
+    except ValueError:
+        return []
+    return [_raw_from_state(p, base_url) for p in _iter_state_products(state)]
+
+def extract_cards_http(url: str, order: Dict[str, List[dict]] = None) -> List[dict]:
+    if BeautifulSoup is None:
+        return []
+    return extract_cards_html(fetch_page_http(url), url, order)
+
+# ──────────────────────────────────────────────────────────────
+# 캡차 / 보안 확인
+# ──────────────────────────────────────────────────────────────
+CHALLENGE_JS = r"""
+if (document.querySelector("a.linkAnchor[data-shp-contents-dtl]")) return "";
+const u = location.href;
+if (/captcha|ncpt\.naver\.com|\/challenge|nid\.naver\.com\/nidlogin/i.test(u)) return "url:" + location.host + location.pathname;
+const sel = "iframe[src*='captcha' i], #captcha, .captcha, #rcpt_form, #wtm_captcha, input[name*='captcha' i], img[src*='captcha' i]";
+if (document.querySelector(sel)) return "dom";
+const t = ((document.body && document.body.innerText) || "").slice(0, 3000);
+if (/보안\s*확인|자동\s*입력\s*방지|로봇이\s*아닙니다|비정상적인\s*(접근|요청)|captcha/i.test(t)) return "text";
+return "";
+"""
+
+def detect_challenge(driver: webdriver.Chrome) -> str:
+    """캡차/보안확인 화면이면 감지 근거("url:..."/"dom"/"text"), 아니면 "". 상품 앵커가 있으면 항상 ""."""
+    try:
+        return driver.execute_script(CHALLENGE_JS) or ""
+    except Exception:
+        return ""
+
+def park_until_cleared(driver: webdriver.Chrome, url: str, reason: str) -> bool:
+    """
+    이 브라우저(워커)만 멈추고 해결을 기다림 — 다른 워커/이미지 다운로드는 계속 진행.
+    UI 에는 emit("captcha") 로 알리고, 앵커가 보이거나 화면이 사라지면 자동 재개.
+    """
+    market = market_id_from_url(url)
+    headless = getattr(driver, "envy_headless", HEADLESS)
+    timeout = CAPTCHA_TIMEOUT_HEADLESS if headless else CAPTCHA_TIMEOUT
+    if timeout <= 0:  # 헤드리스는 사람이 풀 창이 없음 — 기다려 봐야 시간만 소모
+        print(f"⏭️ [{market}] 캡차/보안확인 감지({reason}){' — 헤드리스' if headless else ''} — 이 페이지는 건너뜁니다")
+        emit("captcha_timeout", market=market, url=url, reason=reason, headless=headless)
+        return False
+    print(f"🧩 [{market}] 캡차/보안확인 감지({reason}) — 브라우저에서 해결하면 자동으로 이어갑니다 (최대 {timeout}s)")
+    emit("captcha", market=market, url=url, reason=reason, timeout=timeout)
+    deadline = time.monotonic() + timeout
+    with span("captcha_wait"):
+        while time.monotonic() < deadline:
+            time.sleep(CAPTCHA_POLL)
+            check_stop()
+            if detect_challenge(driver):
+                continue
+            try:
+                if not driver.find_elements(By.CSS_SELECTOR, 'a.linkAnchor[data-shp-contents-dtl]'):
+                    driver.get(url)  # 해결 후 다른 곳으로 이동했으면 원래 페이지로
+                    if detect_challenge(driver):
+                        continue
+            except Exception:
+                continue
+            print(f"▶️ [{market}] 캡차 해결 확인 — 수집 재개")
+            emit("captcha_cleared", market=market, url=url)
+            return True
+    print(f"⏭️ [{market}] 캡차 대기 시간 초과 — 이 페이지는 건너뜁니다")
+    emit("captcha_timeout", market=market, url=url, reason=reason, headless=headless)
+    return False
+
 # ──────────────────────────────────────────────────────────────
 # 크롤링 (세이프가드 저장 포함)
 # ──────────────────────────────────────────────────────────────
-def collect_one_market(driver: webdriver.Chrome, wait: WebDriverWait, user_url: str):
-    market_id = market_id_from_url(user_url)
-    ws = ensure_ws(market_id)
-    prod_map, last_no = load_index(market_id)
+def load_cards(driver: webdriver.Chrome, wait: WebDriverWait, url: str, mode: str,
+               order: Dict[str, List[dict]] = None) -> Tuple[list, str]:
+    """한 페이지의 카드 목록 로딩 → (cards 또는 None, 실제 사용한 방식 "http"/"browser")."""
+    if mode in ("http", "auto"):
+        try:
+            with span("http_fetch_parse"):
+                cards = extract_cards_http(url, order) or None
+        except Exception as e:
+            print("[HTTP] 요청 실패:", e)
+            cards = None
+        if cards is not None:
+            return cards, "http"
+        print("HTTP 모드: 상품 앵커 없음" + (" → 브라우저로 전환" if mode == "auto" else ""))
+    if mode == "http" or driver is None:
+        return None, mode
+    if isinstance(driver, LazyDriver):
+        try:
+            driver, wait = driver.resolve()
+        except Exception as e:
+            print("[브라우저] 웹드라이버 생성 실패:", e)
+            return None, "browser"
 
-    print(f"\n=== {market_id} ===")
-    driver.get(user_url)
-    input("✅ 캡차 풀었으면 엔터… ")
-    ok = ensure_products_loaded(driver, wait)
+    page_limiter().wait(url)
+    with span("driver_get"):
+        driver.get(url)
+    reason = detect_challenge(driver)  # 앵커가 이미 있거나 챌린지가 없으면 즉시 "" — 추가 대기 없음
+    if reason and not park_until_cleared(driver, url, reason):
+        return None, "browser"
+    with span("ensure_products_loaded"):
+        ok = ensure_products_loaded(driver, wait)
     if not ok:
-        print("⚠️ 상품 목록 로딩 실패")
+        reason = detect_challenge(driver)  # 늦게 뜨는 보안확인 화면
+        if not (reason and park_until_cleared(driver, url, reason) and ensure_products_loaded(driver, wait)):
+            return None, "browser"
+    with span("lazy_ready"):
+        wait_lazy_images(driver)
+    if FAST_EXTRACT:
+        with span("extract_js"):
+            return extract_cards_js(driver, order), "browser"
+    return driver.find_elements(By.CSS_SELECTOR, 'a.linkAnchor[data-shp-contents-dtl]'), "browser"
+
+_PREFETCH = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prefetch")
+
+def _prefetch_http(url: str, order: Dict[str, List[dict]] = None):
+    try:
+        return extract_cards_http(url, order) or None
+    except Exception:
+        return None
+
+def collect_one_market(driver: webdriver.Chrome, wait: WebDriverWait, user_url: str):
+    market_id = market_id_from_url(user_url)
+    journal = crawl_journal()
+    sink = output_sink()
+    sink.begin_market(market_id)  # 완료된 마켓도 등록 — 이전 실행 행이 최종 xlsx 에 포함되도록 (CsvSink 는 begin 한 마켓만 읽음)
+    if journal.url_status(user_url) == "done":
+        print(f"\n=== {market_id} === (이전 실행에서 완료 — 건너뜀)")
         return
+    registry = product_registry()
+    registry.import_json(market_id)
+    journal.open_url(market_id, user_url)
+    done_ids = journal.done_ids(user_url)
+    partial_ids = journal.partial_ids(user_url)
 
-    cards = driver.find_elements(By.CSS_SELECTOR, 'a.linkAnchor[data-shp-contents-dtl]')
-    print("상품 수:", len(cards))
+    print(f"\n=== {market_id} ===" + (f" (이어서 수집: 완료 {len(done_ids)}개 건너뜀, 이미지 보완 {len(partial_ids)}개)" if done_ids or partial_ids else ""))
+    METRICS.reset()
+    emit("market_start", market=market_id, url=user_url, skipped=len(done_ids))
 
-    row, autosave_counter = 1, 0
+    row, autosave_counter = len(done_ids) + len(partial_ids) + 1, 0
+    downloader = image_downloader()
+    pending = deque()  # (row_values, img_folder, futures, page, 지문/변경필드, 보완 여부) — 이미지 완료 순이 아니라 카드 순서대로 기록
+    seen_ids = set()   # 이번 순회에서 본 상품 ID (페이지 종료 판단용)
+    unchanged = 0
+    completed = False
+    sel_stats = selector_stats()
+
+    def checkpoint():
+        # 순서: 결과 행 → 저널(+싱크 위치) → 지문. 저널보다 앞선 행은 이어서 수집할 때 잘려 나가고,
+        # "지문은 있는데 행이 없는" 상품은 생기지 않음
+        sink.checkpoint()
+        journal.set_sink_marks(sink.positions())
+        journal.commit()
+        registry.commit_fingerprints()
+
+    def flush(block: bool):
+        nonlocal autosave_counter
+        while pending and (block or ImageDownloader.done(pending[0][2])):
+            values, img_folder, futs, pg, delta, repair = pending.popleft()
+            saved_rel = [os.path.relpath(p, BASE_DIR).replace("\\", "/") for p in ImageDownloader.results(futs) if p]
+            status = "done" if len(saved_rel) >= len(futs) else "partial"
+            if repair:  # 행은 이전 실행에서 이미 기록됨 — 이미지 파일만 채우고 상태 갱신
+                journal.mark(user_url, market_id, pg, values[9], status, len(futs), len(saved_rel))
+                if _EVENT_HOOKS and futs:
+                    emit("images", market=market_id, product_no=values[1], requested=len(futs), saved=len(saved_rel))
+                print(f"🔁 {values[1]}: 이미지 보완 {len(saved_rel)}/{len(futs)}")
+                continue
+            first_rel = saved_rel[0] if saved_rel else ""
+            folder_rel = os.path.relpath(img_folder, BASE_DIR).replace("\\", "/")
+
+            out = values + [folder_rel, first_rel, "; ".join(saved_rel), len(saved_rel)]
+            if delta is not None:
+                fields, changed = delta
+                out.append(", ".join(changed))
+                registry.save_fingerprint(market_id, values[9], fields)
+            sink.append(market_id, out)
+            journal.mark(user_url, market_id, pg, values[9], status, len(futs), len(saved_rel))
+            if _EVENT_HOOKS:
+                if futs:
+                    emit("images", market=market_id, product_no=values[1], requested=len(futs), saved=len(saved_rel))
+                emit("product", market=market_id, url=user_url, page=pg, row=dict(zip(header(), out)))
+
+            print(f"✅ {values[0]}: {values[2]} | 정가:{values[3]} | 할인가:{values[4]} | 배송:{values[5]} | 리뷰:{values[6]} | 평점:{values[7]} | imgs:{len(saved_rel)}")
+
+            autosave_counter += 1
+            if autosave_counter >= AUTOSAVE_EVERY:
+                with span("autosave"):
+                    checkpoint()
+                autosave_counter = 0
+
+    first_page = page_of(user_url)
+    last_page = first_page + (MAX_PAGES if FOLLOW_PAGES else 1) - 1
+    mode, prefetch = FETCH_MODE, None
 
     try:
-        for tag in cards:
-            try:
-                detail_json = tag.get_attribute("data-shp-contents-dtl") or ""
-                data = json.loads(html.unescape(detail_json)) if detail_json else []
-                kv = {d.get("key"): d.get("value") for d in data if isinstance(d, dict)}
-                title = kv.get("chnl_prod_nm", "")
-                price = kv.get("price", "")
-                href = tag.get_attribute("href") or ""
-                if not href:
-                    continue
+        for page in range(first_page, last_page + 1):
+            check_stop()
+            url = user_url if page == first_page else page_url(user_url, page)
+            order = selector_order(market_id)  # 페이지마다 (재정렬 허용 필드만) 적중률 순으로
+            cards = prefetch.result() if prefetch is not None else None
+            prefetch = None
+            if cards is None:
+                cards, used = load_cards(driver, wait, url, mode, order)
+                if used == "browser" and mode == "auto":
+                    mode = "browser"  # 이 스토어는 서버 렌더링이 아님 → 다음 페이지부터 HTTP 시도 생략
+            if not cards:
+                if page == first_page:
+                    print("⚠️ 상품 목록 로딩 실패")
+                    return  # URL 은 open 으로 남겨 다음 실행에서 다시 시도
+                break
+            print(f"[p{page}] 상품 수:", len(cards))
+            emit("page", market=market_id, url=user_url, page=page, cards=len(cards), mode=mode)
 
-                product_id = extract_product_id(href, kv)
-                product_no, last_no = assign_product_no(product_id, prod_map, last_no)
+            # 이미지가 받아지는 동안 다음 페이지 HTML 을 미리 받아 둠 (HTTP 경로)
+            if page < last_page and mode != "browser":
+                prefetch = _PREFETCH.submit(_prefetch_http, page_url(user_url, page + 1), order)
 
-                # li 기준 부가 필드
-                sale_price = shipping_fee = review_count = rating = ""
+            new_on_page = 0
+            for tag in cards:
                 try:
-                    li = tag.find_element(By.XPATH, "./ancestor::li[1]")
-                except:
-                    li = None
-
-                if li:
-                    # 할인가
-                    try:
-                        sale_el = li.find_element(By.CSS_SELECTOR, "span.zIK_uvWc6D")
-                        sale_price = re.sub(r"[^\d]", "", sale_el.text)
-                    except:
-                        try:
-                            sale_el = li.find_element(By.XPATH, './/*[contains(text(),"원") and not(contains(text(),"배송"))]')
-                            sale_price = re.sub(r"[^\d]", "", sale_el.text)
-                        except:
-                            pass
-
-                    # 배송비
-                    try:
-                        if li.find_elements(By.XPATH, './/*[contains(text(),"무료배송")]'):
-                            shipping_fee = "0"
-                        else:
-                            fee_nodes = li.find_elements(By.CSS_SELECTOR, "div.UVrxHKBc0E")
-                            got_fee = False
-                            for node in fee_nodes:
-                                txt = (node.text or "").strip()
-                                digits = re.sub(r"[^\d]", "", txt)
-                                if digits:
-                                    shipping_fee = digits
-                                    got_fee = True
-                                    break
-                            if not got_fee:
-                                try:
-                                    ship_el = li.find_element(By.XPATH, './/*[contains(text(),"배송")]')
-                                    t = ship_el.text
-                                    m = re.search(r"(\d[\d,]*)\s*원", t)
-                                    shipping_fee = m.group(1).replace(",", "") if m else re.sub(r"[^\d]", "", t)
-                                except:
-                                    shipping_fee = ""
-                    except:
-                        shipping_fee = ""
-
-                    # 리뷰/평점
-                    try:
-                        rv = li.find_element(By.XPATH, './/*[contains(text(),"리뷰") or contains(@class,"GF9")]')
-                        review_count = re.sub(r"[^\d]", "", rv.text)
-                    except: pass
-                    try:
-                        rt = li.find_element(By.XPATH, './/*[contains(text(),"평점") or contains(text(),"★")]')
-                        m = re.search(r"[\d\.]+", rt.text)
-                        rating = m.group(0) if m else ""
-                    except: pass
-
-                # 이미지 — 여러 장 모두 저장
-                img_folder = os.path.join(IMG_ROOT, market_id, product_no)
-                urls = collect_card_img_urls(tag)
-                saved_rel = []
-                if DOWNLOAD_IMAGES and urls:
-                    for i, u in enumerate(urls, start=1):
-                        p = save_image_as_seq(u, img_folder, product_no, i, referer=user_url)
-                        if p:
-                            saved_rel.append(os.path.relpath(p, BASE_DIR).replace("\\", "/"))
-
-                first_rel = saved_rel[0] if saved_rel else ""
-                folder_rel = os.path.relpath(img_folder, BASE_DIR).replace("\\", "/")
-
-                ws.append([
-                    row, product_no, title, price, sale_price, shipping_fee,
-                    review_count, rating, href, product_id,
-                    folder_rel, first_rel, "; ".join(saved_rel), len(saved_rel)
-                ])
-
-                print(f"✅ {row}: {title} | 정가:{price} | 할인가:{sale_price} | 배송:{shipping_fee} | 리뷰:{review_count} | 평점:{rating} | imgs:{len(saved_rel)}")
-
-                row += 1
-                autosave_counter += 1
-                if autosave_counter >= AUTOSAVE_EVERY:
-                    safe_save_workbook(wb, EXCEL_PATH)
-                    save_index(market_id, prod_map, last_no)
-                    autosave_counter = 0
-
-            except KeyboardInterrupt:
-                print("\n🟥 사용자 중단 — 현재까지 진행분 저장합니다…")
-                safe_save_workbook(wb, EXCEL_PATH)
-                save_index(market_id, prod_map, last_no)
-                raise
-            except Exception as e:
-                print("[SKIP]", e)
-                continue
+                    check_stop()
+                    with span("card_fields"):
+                        raw = tag if isinstance(tag, dict) else read_card_dom(tag, order)
+                        card = parse_card(raw)
+                        if "_sel" in raw:
+                            sel_stats.record(market_id, raw["_sel"])
+                    incr("cards")
+                    if not card:
+                        continue
+                    title, price, href = card["title"], card["price"], card["href"]
+                    sale_price, shipping_fee = card["sale_price"], card["shipping_fee"]
+                    review_count, rating = card["review_count"], card["rating"]
+
+                    product_id = card["product_id"]
+                    if product_id not in seen_ids:
+                        seen_ids.add(product_id)
+                        new_on_page += 1
+                    if product_id in done_ids:
+                        continue
+                    urls = card_img_urls_from_raw(raw)
+                    repair = product_id in partial_ids
+                    delta = None
+                    if DELTA_MODE and not repair:
+                        fields = {"상품명": title, "정가": price, "할인가": sale_price, "배송비": shipping_fee,
+                                  "리뷰수": review_count, "평점": rating, "이미지URL": urls}
+                        changed = registry.fingerprint_diff(market_id, product_id, fields)
+                        if changed is None:
+                            unchanged += 1
+                            continue
+                        delta = (fields, changed)
+                    product_no = registry.assign(market_id, product_id)
+
+                    # 이미지 — 여러 장 모두 저장 (백그라운드 풀에 넘기고 다음 카드로 진행)
+                    img_folder = os.path.join(IMG_ROOT, market_id, product_no)
+                    futs = downloader.submit_product(urls, img_folder, product_no, referer=url) if DOWNLOAD_IMAGES and urls else []
+                    journal.mark(user_url, market_id, page, product_id, "partial" if repair else "queued", len(futs))
+                    done_ids.add(product_id)  # 다른 페이지에 다시 나와도 한 번만 기록
+
+                    pending.append(([
+                        row, product_no, title, price, sale_price, shipping_fee,
+                        review_count, rating, href, product_id,
+                    ], img_folder, futs, page, delta, repair))
+                    if not repair:
+                        row += 1
+                    flush(block=False)
+                    METRICS.tick()
+
+                except KeyboardInterrupt:
+                    print("\n🟥 사용자 중단 — 현재까지 진행분 저장합니다…")
+                    downloader.cancel_pending(entry[2] for entry in pending)
+                    flush(block=True)
+                    checkpoint()
+                    raise
+                except Exception as e:
+                    print("[SKIP]", e)
+                    continue
+
+            if new_on_page == 0:
+                print(f"[p{page}] 새 상품 없음 — 페이지 순회 종료")
+                break
+        completed = True
     finally:
-        safe_save_workbook(wb, EXCEL_PATH)
-        save_index(market_id, prod_map, last_no)
-        print(f"📁 중간 저장 완료: {EXCEL_PATH}")
+        if prefetch is not None:
+            prefetch.cancel()
+        with span("image_drain"):
+            flush(block=True)
+        with span("autosave"):
+            checkpoint()
+        if completed:
+            journal.finish_url(user_url)
+        sel_stats.flush()
+        sel_stats.print_changes(market_id)
+        if DELTA_MODE:
+            print(f"[DELTA] 변경 없음 {unchanged}개 건너뜀")
+        METRICS.tick(force=True)
+        METRICS.print_summary(market_id)
+        emit("market_done", market=market_id, url=user_url, rows=row - 1, completed=completed)
+        print(f"📁 중간 저장 완료: {EXCEL_PATH if SINK == 'xlsx' else sink_path(SINK)}")
 
 # ──────────────────────────────────────────────────────────────
-# 인덱스
+# 인덱스 — 상품번호(P000001) 레지스트리 (SQLite, 프로세스 간 공유)
 # ──────────────────────────────────────────────────────────────
+def registry_path() -> str:
+    return os.path.join(BASE_DIR, "product_registry.db")
+
+class ProductRegistry:
+    """
+    (market_id, product_id) → product_no. 번호 발급은 BEGIN IMMEDIATE 트랜잭션 안에서
+    counters 를 +1 하므로 여러 크롤(프로세스)이 같은 마켓을 동시에 돌려도 중복 번호가 나오지 않는다.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.con = connect_sqlite(path, autocommit=True)
+        self.con.execute("""CREATE TABLE IF NOT EXISTS products (
+            market_id TEXT, product_id TEXT, product_no TEXT, created REAL,
+            PRIMARY KEY (market_id, product_id))""")
+        self.con.execute("CREATE TABLE IF NOT EXISTS counters (market_id TEXT PRIMARY KEY, last_no INTEGER)")
+        self.con.execute("""CREATE TABLE IF NOT EXISTS fingerprints (
+            market_id TEXT, product_id TEXT, fp TEXT, fields TEXT, updated REAL,
+            PRIMARY KEY (market_id, product_id))""")
+        self._lock = threading.Lock()
+        self._imported = set()
+        self._fp_pending: List[tuple] = []  # 싱크·저널 체크포인트 때 함께 커밋할 지문
+
+    def lookup(self, market_id: str, product_id: str) -> str:
+        row = self.con.execute("SELECT product_no FROM products WHERE market_id=? AND product_id=?",
+                               (market_id, product_id)).fetchone()
+        return row[0] if row else ""
+
+    def last_no(self, market_id: str) -> int:
+        row = self.con.execute("SELECT last_no FROM counters WHERE market_id=?", (market_id,)).fetchone()
+        return int(row[0]) if row else 0
+
+    def assign(self, market_id: str, product_id: str) -> str:
+        no = self.lookup(market_id, product_id)
+        if no:
+            return no
+        with self._lock:
+            self.con.execute("BEGIN IMMEDIATE")
+            try:
+                no = self.lookup(market_id, product_id)  # 다른 프로세스가 먼저 발급했을 수 있음
+                if not no:
+                    self.con.execute("INSERT OR IGNORE INTO counters VALUES (?, 0)", (market_id,))
+                    self.con.execute("UPDATE counters SET last_no = last_no + 1 WHERE market_id=?", (market_id,))
+                    no = f"P{self.last_no(market_id):06d}"
+                    self.con.execute("INSERT INTO products VALUES (?,?,?,?)", (market_id, product_id, no, time.time()))
+                self.con.execute("COMMIT")
+            except Exception:
+                self.con.execute("ROLLBACK")
+                raise
+        return no
+
+    def fingerprint_diff(self, market_id: str, product_id: str, fields: dict):
+        """저장된 지문과 비교 → None(변경 없음) / 바뀐 필드명 목록 (처음 보는 상품은 ["신규"])."""
+        fp = hashlib.sha1(json.dumps(fields, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+        row = self.con.execute("SELECT fp, fields FROM fingerprints WHERE market_id=? AND product_id=?",
+                               (market_id, product_id)).fetchone()
+        if row is None:
+            return ["신규"]
+        if row[0] == fp:
+            return None
+        old = json.loads(row[1])
+        return [k for k in fields if old.get(k) != fields[k]] or ["기타"]
+
+    def save_fingerprint(self, market_id: str, product_id: str, fields: dict):
+        """지문은 버퍼에만 — commit_fingerprints() 전에 죽으면 다음 실행에서 다시 변경으로 잡힘(누락보다 중복이 안전)."""
+        fp = hashlib.sha1(json.dumps(fields, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+        with self._lock:
+            self._fp_pending.append((market_id, product_id, fp, json.dumps(fields, ensure_ascii=False), time.time()))
+
+    def commit_fingerprints(self):
+        """싱크 저장 + 저널 커밋 뒤에 호출 — 결과 파일에 확정된 행의 지문만 남긴다."""
+        with self._lock:
+            batch, self._fp_pending = self._fp_pending, []
+            if not batch:
+                return
+            self.con.execute("BEGIN IMMEDIATE")
+            try:
+                self.con.executemany("INSERT OR REPLACE INTO fingerprints VALUES (?,?,?,?,?)", batch)
+                self.con.execute("COMMIT")
+            except Exception:
+                self.con.execute("ROLLBACK")
+                self._fp_pending[:0] = batch
+                raise
+
+    def import_json(self, market_id: str) -> int:
+        """기존 product_index_{market_id}.json 1회 이관 (이미 이관된 마켓이면 0)."""
+        if market_id in self._imported:
+            return 0
+        self._imported.add(market_id)
+        mapping, last_no = load_index(market_id)
+        if not mapping and not last_no:
+            return 0
+        with self._lock:
+            self.con.execute("BEGIN IMMEDIATE")
+            try:
+                if self.con.execute("SELECT 1 FROM counters WHERE market_id=?", (market_id,)).fetchone():
+                    self.con.execute("ROLLBACK")
+                    return 0
+                now = time.time()
+                self.con.executemany("INSERT OR IGNORE INTO products VALUES (?,?,?,?)",
+                                     [(market_id, pid, no, now) for pid, no in mapping.items()])
+                self.con.execute("INSERT INTO counters VALUES (?, ?)", (market_id, int(last_no)))
+                self.con.execute("COMMIT")
+            except Exception:
+                self.con.execute("ROLLBACK")
+                raise
+        print(f"[INDEX] {market_id}: JSON 인덱스 {len(mapping)}건 이관")
+        return len(mapping)
+
+    def import_all_json(self) -> int:
+        n = 0
+        for name in os.listdir(BASE_DIR):
+            m = re.fullmatch(r"product_index_(.+)\.json", name)
+            if m:
+                n += self.import_json(m.group(1))
+        return n
+
+_REGISTRY = None
+
+def product_registry() -> ProductRegistry:
+    global _REGISTRY
+    path = registry_path()
+    if _REGISTRY is None or _REGISTRY.path != path:
+        _REGISTRY = ProductRegistry(path)
+    return _REGISTRY
+
+# 구버전 JSON 인덱스 읽기 — 레지스트리 이관(import_json) 전용 (쓰기는 레지스트리가 담당)
 def load_index(market_id: str) -> Tuple[Dict[str, str], int]:
     path = os.path.join(BASE_DIR, f"product_index_{market_id}.json")
     if os.path.exists(path):
@@ -356,44 +1774,411 @@ def load_index(market_id: str) -> Tuple[Dict[str, str], int]:
         return data.get("map", {}), int(data.get("last_no", 0))
     return {}, 0
 
-def save_index(market_id: str, mapping: Dict[str, str], last_no: int):
-    path = os.path.join(BASE_DIR, f"product_index_{market_id}.json")
-    tmp = path + ".tmp"
-    with open(tmp, "w", encoding="utf-8") as f:
-        json.dump({"map": mapping, "last_no": last_no}, f, ensure_ascii=False, indent=2)
-    os.replace(tmp, path)
+# ──────────────────────────────────────────────────────────────
+# 크롤 저널 — URL/상품 단위 진행 기록 (재시작 시 이어서 수집)
+# ──────────────────────────────────────────────────────────────
+def journal_path() -> str:
+    return JOURNAL_PATH or os.path.join(BASE_DIR, "crawl_state.db")
+
+def stop_requested() -> bool:
+    return bool(STOP_FILE) and os.path.exists(STOP_FILE)
+
+def check_stop():
+    if stop_requested():
+        raise KeyboardInterrupt  # Ctrl-C 와 같은 경로로 진행분 저장 후 종료
+
+def page_of(url: str) -> int:
+    try:
+        return int(parse_qs(urlparse(url).query).get("page", ["1"])[0])
+    except ValueError:
+        return 1
+
+def page_url(url: str, page: int) -> str:
+    u = urlparse(url)
+    q = parse_qs(u.query, keep_blank_values=True)
+    q["page"] = [str(page)]
+    return u._replace(query=urlencode(q, doseq=True)).geturl()
+
+class CrawlJournal:
+    """
+    runs:    URL 별 상태 (open → done)
+    journal: (url, product_id) 별 상태 (queued → done | partial), 페이지, 이미지 수
+    sink_marks: 싱크 파일별 체크포인트 위치 — 저널과 한 커밋이라 이어서 수집할 때 그 뒤를 잘라 중복 행 방지
+             partial = 행은 기록됐으나 img_saved < img_total → 이어서 수집할 때 남은 이미지만 받고 done 으로
+    세션 = 마지막으로 모든 URL 이 done 으로 끝난 뒤 시작된 실행들. open URL 이 남아 있으면 다음 실행은 resuming.
+    """
+    def __init__(self, path: str, resuming: bool = None):
+        self.con = connect_sqlite(path)
+        self.con.execute("""CREATE TABLE IF NOT EXISTS runs (
+            url TEXT PRIMARY KEY, market TEXT, status TEXT, started REAL, updated REAL)""")
+        self.con.execute("""CREATE TABLE IF NOT EXISTS journal (
+            url TEXT, market TEXT, page INTEGER, product_id TEXT, status TEXT,
+            img_total INTEGER, img_saved INTEGER, updated REAL, PRIMARY KEY (url, product_id))""")
+        self.con.execute("CREATE TABLE IF NOT EXISTS sink_marks (path TEXT PRIMARY KEY, pos INTEGER)")
+        self.con.commit()
+        self._lock = threading.Lock()
+        if resuming is None:
+            resuming = RESUME and self.has_open_runs()
+            if not resuming:
+                self.reset()
+        self.resuming = resuming
+
+    def has_open_runs(self) -> bool:
+        return self.con.execute("SELECT 1 FROM runs WHERE status='open' LIMIT 1").fetchone() is not None
 
-def assign_product_no(prod_id: str, mapping: Dict[str, str], last_no: int) -> Tuple[str, int]:
-    if prod_id in mapping:
-        return mapping[prod_id], last_no
-    new_no = last_no + 1
-    prod_no = f"P{new_no:06d}"
-    mapping[prod_id] = prod_no
-    return prod_no, new_no
+    def reset(self):
+        with self._lock:
+            self.con.execute("DELETE FROM runs")
+            self.con.execute("DELETE FROM journal")
+            self.con.execute("DELETE FROM sink_marks")
+            self.con.commit()
+
+    def url_status(self, url: str) -> str:
+        row = self.con.execute("SELECT status FROM runs WHERE url=?", (url,)).fetchone()
+        return row[0] if row else ""
+
+    def open_url(self, market_id: str, url: str):
+        now = time.time()
+        with self._lock:
+            self.con.execute("INSERT OR IGNORE INTO runs VALUES (?,?,'open',?,?)", (url, market_id, now, now))
+            self.con.execute("UPDATE runs SET status='open', updated=? WHERE url=?", (now, url))
+            self.con.commit()
+
+    def finish_url(self, url: str):
+        with self._lock:
+            self.con.execute("UPDATE runs SET status='done', updated=? WHERE url=?", (time.time(), url))
+            self.con.commit()
+
+    def done_ids(self, url: str) -> set:
+        return {r[0] for r in self.con.execute("SELECT product_id FROM journal WHERE url=? AND status='done'", (url,))}
+
+    def partial_ids(self, url: str) -> set:
+        """행은 기록됐지만 이미지가 덜 받아진 상품 (중단으로 취소됐거나 다운로드 실패)."""
+        return {r[0] for r in self.con.execute("SELECT product_id FROM journal WHERE url=? AND status='partial'", (url,))}
+
+    def mark(self, url: str, market_id: str, page: int, product_id: str, status: str, img_total: int = 0, img_saved: int = 0):
+        with self._lock:
+            self.con.execute("INSERT OR REPLACE INTO journal VALUES (?,?,?,?,?,?,?,?)",
+                             (url, market_id, page, product_id, status, img_total, img_saved, time.time()))
+
+    def sink_marks(self) -> Dict[str, int]:
+        """싱크 파일/테이블별 마지막 체크포인트 위치 (-1 = 병합 끝난 파트 파일)."""
+        return {p: max(0, n) for p, n in self.con.execute("SELECT path, pos FROM sink_marks")}
+
+    def set_sink_marks(self, marks: Dict[str, int]):
+        """mark() 처럼 다음 commit() 에 함께 반영 — 행 상태와 싱크 위치가 항상 같은 시점을 가리킴."""
+        with self._lock:
+            self.con.executemany("INSERT OR REPLACE INTO sink_marks VALUES (?,?)", list(marks.items()))
+
+    def commit(self):
+        with self._lock:
+            self.con.commit()
+
+    def close(self):
+        self.commit()
+        self.con.close()
+
+_JOURNAL = None
+
+def crawl_journal() -> CrawlJournal:
+    global _JOURNAL
+    if _JOURNAL is None:
+        _JOURNAL = CrawlJournal(journal_path())
+    return _JOURNAL
+
+def end_journal_session():
+    """모든 URL 이 done 이면 세션 종료(기록 삭제). open 이 남아 있으면 다음 실행에서 이어받도록 유지."""
+    global _JOURNAL
+    if _JOURNAL is None:
+        return
+    if not _JOURNAL.has_open_runs():
+        _JOURNAL.reset()
+    _JOURNAL.close()
+    _JOURNAL = None
+
+# ──────────────────────────────────────────────────────────────
+# 셀렉터 통계 — 스토어·필드·전략별 시도/적중 (SQLite, 다음 실행의 시도 순서 결정)
+# ──────────────────────────────────────────────────────────────
+def selector_stats_path() -> str:
+    return os.path.join(BASE_DIR, "selector_stats.db")
+
+class SelectorStats:
+    """
+    카드마다 record() 로 메모리 카운트만 올리고, flush() 때 증분(+tries, +hits)을 DB 에 더한다
+    (여러 워커 프로세스가 같은 DB 에 써도 합산됨). SELECTOR_ADAPTIVE 필드만 (hits+1)/(tries+2) 순, 같으면 선언 순서.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.con = connect_sqlite(path, autocommit=True)
+        self.con.execute("""CREATE TABLE IF NOT EXISTS selector_stats (
+            store TEXT, field TEXT, strategy TEXT, tries INTEGER, hits INTEGER, updated REAL,
+            PRIMARY KEY (store, field, strategy))""")
+        self._lock = threading.Lock()
+        self._counts: Dict[Tuple[str, str, str], list] = {}   # (store, field, id) → [tries, hits] (DB + 미반영분)
+        self._pending: Dict[Tuple[str, str, str], list] = {}
+        self._loaded = set()
+        self._first: Dict[Tuple[str, str], str] = {}          # 이번 실행에서 처음 본 1순위 전략 (변화 출력용)
+        self._calls: Dict[str, int] = {}                      # 스토어별 order() 호출 수 (탐색 주기)
+        self._base: Dict[Tuple[str, str, str], Tuple[int, int]] = {}   # 이전 실행까지의 누적 (경고 기준)
+        self._run: Dict[Tuple[str, str, str], list] = {}      # 이번 실행분 [tries, hits]
+        self._warned = set()
+
+    def _load(self, store: str):
+        if store in self._loaded:
+            return
+        for field, sid, tries, hits in self.con.execute(
+                "SELECT field, strategy, tries, hits FROM selector_stats WHERE store=?", (store,)):
+            self._counts[(store, field, sid)] = [tries, hits]
+            self._base[(store, field, sid)] = (tries, hits)
+        self._loaded.add(store)
+
+    def _score(self, store: str, field: str, sid: str) -> float:
+        tries, hits = self._counts.get((store, field, sid), (0, 0))
+        return (hits + 1) / (tries + 2)
+
+    def _ranked(self, store: str) -> Dict[str, List[dict]]:
+        out = {}
+        for field, specs in COMPILED_STRATEGIES.items():
+            if field in SELECTOR_ADAPTIVE:
+                ranked = sorted(enumerate(specs), key=lambda t: (-self._score(store, field, t[1]["id"]), t[0]))
+                out[field] = [sp for _, sp in ranked]
+            else:
+                out[field] = list(specs)
+        return out
+
+    def order(self, store: str) -> Dict[str, List[dict]]:
+        """페이지마다 호출. 탐색 차례면 선언 순서 그대로 (통계가 앞 전략 적중도 다시 세도록)."""
+        if not COMPILED_STRATEGIES:
+            compile_strategies()
+        with self._lock:
+            self._load(store)
+            n = self._calls[store] = self._calls.get(store, -1) + 1
+            ranked = self._ranked(store)
+            for field, specs in ranked.items():
+                self._first.setdefault((store, field), specs[0]["id"])
+            if SELECTOR_PROBE_EVERY and n % SELECTOR_PROBE_EVERY == 0:
+                return {field: list(specs) for field, specs in COMPILED_STRATEGIES.items()}
+            return ranked
+
+    def record(self, store: str, sel: dict):
+        with self._lock:
+            for field, (tried, hit) in sel.items():
+                for i, sid in enumerate(tried):
+                    h = 1 if hit and i == len(tried) - 1 else 0
+                    for d in (self._counts, self._pending, self._run):
+                        c = d.setdefault((store, field, sid), [0, 0])
+                        c[0] += 1
+                        c[1] += h
+
+    def flush(self):
+        with self._lock:
+            items, self._pending = list(self._pending.items()), {}
+        if not items:
+            return
+        now = time.time()
+        self.con.executemany("""INSERT INTO selector_stats (store, field, strategy, tries, hits, updated) VALUES (?,?,?,?,?,?)
+            ON CONFLICT(store, field, strategy) DO UPDATE SET tries=tries+excluded.tries, hits=hits+excluded.hits, updated=excluded.updated""",
+            [(st, f, sid, t, h, now) for (st, f, sid), (t, h) in items])
+
+    def rows(self, store: str = None) -> List[dict]:
+        q = "SELECT store, field, strategy, tries, hits FROM selector_stats" + (" WHERE store=?" if store else "")
+        return [{"스토어": st, "필드": f, "전략": sid, "시도": t, "적중": h, "적중률": round(h / t, 3) if t else None}
+                for st, f, sid, t, h in self.con.execute(q + " ORDER BY store, field, hits*1.0/tries DESC", (store,) if store else ())]
+
+    def print_changes(self, store: str):
+        """이번 실행 중 1순위가 바뀐 필드 출력 — 클래스명 변경 등으로 기존 셀렉터가 빗나가기 시작했다는 신호."""
+        with self._lock:
+            self._load(store)
+            ranked = self._ranked(store)
+        for field, specs in ranked.items():
+            was = self._first.get((store, field))
+            self._warn_drop(store, field, was)
+            if was and specs[0]["id"] != was:
+                print(f"[SELECTOR] {store}.{field}: '{was}' 적중률 하락 → '{specs[0]['id']}' 우선")
+                self._first[(store, field)] = specs[0]["id"]
+
+    def _warn_drop(self, store: str, field: str, sid: str):
+        """순서가 고정된 필드도 1순위 적중률이 예전보다 크게 떨어지면 알림 — 카드마다 빗나가는 조회 비용을 내고 있다는 뜻."""
+        if not sid or (store, field, sid) in self._warned:
+            return
+        t, h = self._run.get((store, field, sid), (0, 0))
+        bt, bh = self._base.get((store, field, sid), (0, 0))
+        if t < SELECTOR_WARN_MIN or bt < SELECTOR_WARN_MIN:
+            return
+        now, before = h / t, bh / bt
+        if before - now >= SELECTOR_WARN_DROP:
+            self._warned.add((store, field, sid))
+            print(f"[SELECTOR] ⚠️ {store}.{field}: 1순위 '{sid}' 적중률 {before:.0%} → {now:.0%} (이번 실행 {t}회) — 셀렉터 점검 필요")
+            emit("selector_drop", market=store, field=field, strategy=sid, before=round(before, 3), now=round(now, 3))
+
+    def close(self):
+        self.flush()
+        self.con.close()
+
+_SELECTOR_STATS = None
+
+def selector_stats() -> SelectorStats:
+    global _SELECTOR_STATS
+    if _SELECTOR_STATS is None or _SELECTOR_STATS.path != selector_stats_path():
+        if _SELECTOR_STATS is not None:
+            _SELECTOR_STATS.close()
+        _SELECTOR_STATS = SelectorStats(selector_stats_path())
+    return _SELECTOR_STATS
+
+# ──────────────────────────────────────────────────────────────
+# 병렬 실행 — 브라우저 N개(프로세스) 워커 풀
+# ──────────────────────────────────────────────────────────────
+# 워커 프로세스에 그대로 넘겨줄 설정 (part_crawler 등에서 바꾼 값 포함)
+POOL_CONFIG_KEYS = (
+    "BASE_DIR", "IMG_ROOT", "EXCEL_PATH", "CHROMEDRIVER_PATH", "HEADLESS", "CAPTCHA_TIMEOUT", "CAPTCHA_TIMEOUT_HEADLESS", "CAPTCHA_POLL", "LEAN_BROWSER",
+    "DOWNLOAD_IMAGES", "WAIT_SEC", "PAGELOAD_TIMEOUT", "LOAD_RETRIES", "AUTOSAVE_EVERY",
+    "IMG_WORKERS", "IMG_PER_HOST", "IMG_DEDUPE", "IMG_REVALIDATE", "FAST_EXTRACT", "FETCH_MODE", "RESUME",
+    "JOURNAL_PATH", "STOP_FILE",
+    "FOLLOW_PAGES", "MAX_PAGES", "DELTA_MODE", "LAZY_TIMEOUT", "PAGE_MIN_INTERVAL", "PAGE_JITTER", "IMG_MIN_INTERVAL", "METRICS_ENABLED", "TRACE_PATH",
+)
+
+def pool_config() -> dict:
+    return {k: globals()[k] for k in POOL_CONFIG_KEYS}
+
+def parts_dir() -> str:
+    return os.path.splitext(EXCEL_PATH)[0] + ".parts"
+
+def part_path(market_id: str) -> str:
+    return os.path.join(parts_dir(), sheet_name(market_id) + ".jsonl")
+
+def group_urls_by_market(urls: List[str]) -> List[Tuple[str, List[str]]]:
+    # 같은 마켓 URL 은 한 워커가 순서대로 처리 → 마켓별 파트 파일 쓰기 충돌 없음
+    groups: Dict[str, List[str]] = {}
+    for u in urls:
+        groups.setdefault(market_id_from_url(u), []).append(u)
+    return list(groups.items())
+
+def _pool_worker(cfg: dict, tasks, results, resuming: bool):
+    global _SINK, _JOURNAL
+    globals().update(cfg)
+    add_event_hook(lambda ev: results.put({"event": ev}))  # 캡차 등 알림은 부모로 중계
+    _JOURNAL = CrawlJournal(journal_path(), resuming=resuming)  # 세션 시작/초기화는 부모가 담당
+    driver = LazyDriver() if FETCH_MODE != "http" else None  # auto 는 HTTP 가 실패할 때만 크롬 기동
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            market_id, urls = task
+            err = ""
+            try:
+                _SINK = JsonlSink(part_path(market_id), append=resuming, marks=_JOURNAL.sink_marks() if resuming else None)
+                try:
+                    for u in urls:
+                        collect_one_market(driver, None, u)
+                finally:
+                    _SINK.close(materialize=False)
+                    _SINK = None
+            except Exception as e:
+                err = f"{type(e).__name__}: {e}"
+            results.put({"market": market_id, "urls": len(urls), "error": err, "pid": os.getpid()})
+    except KeyboardInterrupt:
+        pass  # STOP_FILE/Ctrl-C — 진행분은 collect_one_market 이 저장함, 아래에서 정리
+    finally:
+        if _DOWNLOADER is not None:
+            _DOWNLOADER.shutdown()
+        if driver is not None:
+            driver.quit()
+        _JOURNAL.close()
+
+def merge_parts(market_ids: List[str]):
+    """워커별 파트 파일(jsonl)을 URL 순서대로 현재 싱크(SINK)에 합친다."""
+    sink, journal = output_sink(), crawl_journal()
+    for market_id in market_ids:
+        sink.begin_market(market_id)  # 파트가 없어도(이전 실행에서 병합 끝) 기존 행을 최종 출력에 포함
+        path = part_path(market_id)
+        if not os.path.exists(path):
+            continue
+        for m, values in read_jsonl_rows(path):
+            sink.append(m, values)
+        sink.checkpoint()
+        journal.set_sink_marks(dict(sink.positions(), **{path: -1}))  # 병합분과 "파트는 비움"을 한 커밋으로
+        journal.commit()
+        os.remove(path)
+
+def crawl_markets_parallel(urls: List[str], workers: int = 0, on_result=None) -> List[dict]:
+    """
+    URL 을 마켓 단위로 묶어 공유 큐에 넣고, 헤드리스 크롬 워커 프로세스 N개가 나눠 처리.
+    결과 행은 워커별 파트 파일로 모았다가 끝에서 마켓 순서대로 병합한다.
+    (URL 은 로컬 픽스처 서버 주소여도 됨 — 예: http://127.0.0.1:8000/store/category/...)
+    """
+    groups = group_urls_by_market(urls)
+    if not groups:
+        return []
+    n = workers or POOL_WORKERS or os.cpu_count() or 1
+    n = max(1, min(n, len(groups)))
+    os.makedirs(parts_dir(), exist_ok=True)
+
+    ctx = mp.get_context("spawn")
+    tasks, results = ctx.Queue(), ctx.Queue()
+    for g in groups:
+        tasks.put(g)
+    for _ in range(n):
+        tasks.put(None)
+    cfg = pool_config()
+    resuming = crawl_journal().resuming
+    procs = [ctx.Process(target=_pool_worker, args=(cfg, tasks, results, resuming)) for _ in range(n)]
+    for p in procs:
+        p.start()
+
+    done = []
+    try:
+        while len(done) < len(groups):
+            check_stop()  # 워커들도 같은 STOP_FILE 을 보고 스스로 저장·종료
+            try:
+                res = results.get(timeout=1)
+            except queue.Empty:
+                if not any(p.is_alive() for p in procs):
+                    break
+                continue
+            if "event" in res:
+                dispatch_event(res["event"])
+                continue
+            done.append(res)
+            if on_result:
+                on_result(res)
+    finally:
+        for p in procs:
+            p.join(timeout=30)
+            if p.is_alive():
+                p.terminate()
+        merge_parts([m for m, _ in groups])
+    return done
 
 # ──────────────────────────────────────────────────────────────
 # 실행
 # ──────────────────────────────────────────────────────────────
 if __name__ == "__main__":
-    driver, wait = make_driver()
+    driver = wait = None
     try:
-        for url in MARKETS:
-            collect_one_market(driver, wait, url)
-        safe_save_workbook(wb, EXCEL_PATH)
-        print("\n💾 엑셀 저장 완료 (정상 종료).")
+        if POOL_WORKERS != 1 and len(MARKETS) > 1:
+            HEADLESS = True
+            for res in crawl_markets_parallel(MARKETS, POOL_WORKERS):
+                print(f"[{res['pid']}] {res['market']} — URL {res['urls']}개 {'⚠️ ' + res['error'] if res['error'] else '완료'}")
+        else:
+            if FETCH_MODE != "http":
+                driver = LazyDriver()
+            for url in MARKETS:
+                collect_one_market(driver, wait, url)
+        print("\n💾 수집 완료 (정상 종료) — 최종 저장합니다.")
     except KeyboardInterrupt:
         print("\n🟥 메인: 사용자 중단 감지 — 저장 후 종료합니다.")
-        safe_save_workbook(wb, EXCEL_PATH)
     except Exception as e:
         print(f"\n🟠 메인 예외: {e} — 저장 후 종료합니다.")
-        safe_save_workbook(wb, EXCEL_PATH)
     finally:
         try:
-            safe_save_workbook(wb, EXCEL_PATH)
+            finalize_output()
+            print(f"💾 엑셀 저장 완료: {EXCEL_PATH}")
         except Exception as e:
             print(f"[SAVE ERROR] 최종 저장 실패: {e}")
-        try:
-            driver.quit()
-        except:
-            pass
+        if driver is not None:
+            try:
+                driver.quit()
+            except:
+                pass
         print("\n✅ 전체 크롤링 종료.")
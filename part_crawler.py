@@ -1,6 +1,7 @@
 # part_crawler.py
 # ENVY — Season 1 add-on section (본 섹션만 추가/교체, 기존 사이드바·레이아웃·환율/마진 계산기·PROXY_URL 블록은 절대 수정하지 않음)
-import os, time, json, random, traceback
+import os, time, json, threading, traceback
+from collections import deque
 from typing import List
 import streamlit as st
 
@@ -14,12 +15,165 @@ try:
     import crawler_core as core
 except Exception as e:
     core = None
+try:
+    import crawl_jobs as jobs
+except Exception:
+    jobs = None
 
 def _ensure_core_ready():
     if core is None:
         st.error("crawler_core.py 모듈을 찾을 수 없습니다. 현재 사용 중인 단독 스크립트를 같은 폴더에 `crawler_core.py`로 저장하세요.")
         st.stop()
 
+# ── 웜 드라이버(재실행 간 재사용) ───────────────────────────────────
+# 버튼 클릭마다 크롬을 새로 띄우지 않도록 옵션 조합별로 1개를 프로세스에 유지.
+# cache_resource 는 모든 세션이 공유하므로 lock 으로 한 번에 한 실행만 사용.
+
+@st.cache_resource(show_spinner=False)
+def _warm_driver_slot(headless: bool, lean: bool) -> dict:
+    return {"driver": None, "wait": None, "lock": threading.Lock(), "headless": headless, "lean": lean}
+
+def _acquire_warm_driver(headless: bool, lean: bool, pageload_timeout: int, wait_sec: int):
+    """잠금 획득한 슬롯 반환(죽은 드라이버는 재생성). 다른 실행이 사용 중이면 None."""
+    slot = _warm_driver_slot(headless, lean)
+    if not slot["lock"].acquire(blocking=False):
+        return None
+    try:
+        if slot["driver"] is None or not core.driver_alive(slot["driver"]):
+            if slot["driver"] is not None:
+                try:
+                    slot["driver"].quit()
+                except:
+                    pass
+            slot["driver"], _ = core.build_driver(headless=headless, lean=lean)
+        slot["driver"].set_page_load_timeout(pageload_timeout)
+        slot["wait"] = core.WebDriverWait(slot["driver"], wait_sec)
+        return slot
+    except Exception:
+        slot["driver"] = None
+        slot["lock"].release()
+        raise
+
+# ── 실시간 진행 표시 ────────────────────────────────────────────────
+class _LiveView:
+    """
+    core 이벤트(product/images/page/market_*)를 모아 상품/초·마켓별 진행·미리보기 표로 보여줌.
+    다시 그리기는 REFRESH 초에 한 번, 그리고 스크립트 스레드에서만 (다른 스레드 이벤트는 집계만).
+    """
+    REFRESH = 0.5
+    PREVIEW_ROWS = 300
+
+    def __init__(self, stats_box, market_box, preview_box):
+        self.stats_box, self.market_box, self.preview_box = stats_box, market_box, preview_box
+        self.start = time.time()
+        self.rows = deque(maxlen=self.PREVIEW_ROWS)
+        self.count = self.imgs_req = self.imgs_saved = 0
+        self.markets = {}
+        self._last = 0.0
+        self._owner = threading.current_thread()
+
+    def on_event(self, ev: dict):
+        kind = ev["type"]
+        m = self.markets.setdefault(ev.get("market") or "-", {"마켓": ev.get("market") or "-", "상태": "대기", "페이지": 0, "상품": 0, "이미지": 0})
+        if kind == "market_start":
+            m["상태"] = "수집 중"
+        elif kind == "page":
+            m["페이지"] = ev["page"]
+        elif kind == "product":
+            self.count += 1
+            m["상품"] += 1
+            self.rows.append(ev["row"])
+        elif kind == "images":
+            self.imgs_req += ev["requested"]
+            self.imgs_saved += ev["saved"]
+            m["이미지"] += ev["saved"]
+        elif kind == "captcha":
+            m["상태"] = "캡차 대기"
+        elif kind == "captcha_cleared":
+            m["상태"] = "수집 중"
+        elif kind == "market_done":
+            m["상태"] = "완료" if ev["completed"] else "중단/실패"
+        self.render(force=kind in ("market_done", "captcha"))
+
+    def render(self, force: bool = False):
+        if threading.current_thread() is not self._owner:
+            return
+        now = time.monotonic()
+        if not force and now - self._last < self.REFRESH:
+            return
+        self._last = now
+        elapsed = max(time.time() - self.start, 1e-6)
+        self.stats_box.markdown(f"**{self.count:,}개** 수집 · **{self.count / elapsed:0.1f}** 상품/초 · "
+                                f"이미지 {self.imgs_saved:,}/{self.imgs_req:,} · 경과 {elapsed:0.0f}s")
+        self.market_box.dataframe(list(self.markets.values()), hide_index=True, use_container_width=True)
+        if self.rows:
+            self.preview_box.dataframe(list(self.rows), hide_index=True, use_container_width=True, height=320)
+
+# ── 백그라운드 작업 목록 ────────────────────────────────────────────
+@st.cache_data(max_entries=4, show_spinner=False)
+def _read_result(path: str, mtime: float) -> bytes:
+    """끝난 작업의 결과 파일 — (경로, 수정 시각) 당 한 번만 읽음 (목록은 3초마다 다시 그려짐)."""
+    with open(path, "rb") as f:
+        return f.read()
+
+_JOB_STATUS_KO = {"queued": "⏳ 대기", "running": "▶️ 실행 중", "cancelling": "⏹ 취소 중", "done": "✅ 완료",
+                  "failed": "⚠️ 실패", "cancelled": "⏹ 취소됨"}
+
+def _jobs_panel_body():
+    owner = st.session_state.get("crawl_owner", "")
+    mine = st.session_state.get("crawl_jobs_mine", False)
+    rows = jobs.list_jobs(owner=owner if (mine and owner) else None)
+    if not rows:
+        st.caption("등록된 작업이 없습니다.")
+        return
+    now = time.time()
+    table = []
+    for j in rows:
+        p = j["progress"]
+        end = j["finished"] or now
+        dur = (end - j["started"]) if j["started"] else 0
+        table.append({
+            "작업": j["id"], "사용자": j["owner"] or "-", "상태": _JOB_STATUS_KO.get(j["status"], j["status"]),
+            "상품": p.get("rows", 0), "상품/초": round(p.get("rows", 0) / dur, 1) if dur else 0.0,
+            "이미지": p.get("images", 0), "경과(s)": round(dur), "캡차": p.get("captcha") or "",
+            "URL": j["title"],
+        })
+    st.dataframe(table, hide_index=True, use_container_width=True)
+
+    sel = st.selectbox("작업 선택", [j["id"] for j in rows], key="crawl_job_sel")
+    job = next((j for j in rows if j["id"] == sel), None)
+    if job is None:
+        return
+    c1, c2 = st.columns(2)
+    if job["status"] in ("queued", "running") and c1.button("⏹ 작업 취소", key=f"cancel_{sel}", use_container_width=True,
+                                                           disabled=bool(owner and job["owner"] and job["owner"] != owner)):
+        jobs.cancel(sel)
+    path = job.get("result_path") or ""
+    if job["status"] in ("done", "cancelled", "failed") and path and os.path.exists(path):
+        # 파일은 사용자가 원할 때만 읽음 — 폴링마다 엑셀 전체를 읽어 버튼에 싣지 않도록
+        ready = f"dl_ready_{sel}"
+        if not st.session_state.get(ready):
+            if c2.button("📦 결과 엑셀 준비", key=f"prep_{sel}", use_container_width=True):
+                st.session_state[ready] = True
+        if st.session_state.get(ready):
+            c2.download_button("⬇️ 결과 엑셀", _read_result(path, os.path.getmtime(path)), file_name=os.path.basename(path),
+                               key=f"dl_{sel}", use_container_width=True)
+    if job.get("error"):
+        st.caption(f"오류: {job['error']}")
+    with st.expander("로그", expanded=False):
+        st.code(jobs.tail_log(sel) or "(없음)", language=None)
+
+# Streamlit 1.37+ 는 fragment 만 주기적으로 다시 그림 (페이지 전체 rerun 없이 폴링)
+_jobs_panel_live = st.fragment(run_every=3)(_jobs_panel_body) if hasattr(st, "fragment") else _jobs_panel_body
+
+def _render_jobs_panel():
+    st.markdown("#### 🗂 크롤 작업 (백그라운드)")
+    with st.container(border=True):
+        c1, c2 = st.columns([3, 1])
+        c1.text_input("작업자 이름", key="crawl_owner", placeholder="공용 서버에서 내 작업 구분용")
+        c2.checkbox("내 작업만", key="crawl_jobs_mine")
+        _jobs_panel_live()
+
 # ── UI 섹션 렌더 ────────────────────────────────────────────────────
 def render_crawler_section():
     st.markdown("## 🧲 네이버 스마트스토어 크롤러")
@@ -35,11 +189,30 @@ def render_crawler_section():
             height=120,
             help="예) https://smartstore.naver.com/스토어ID/category/...&page=1&size=60"
         )
+        resume = st.checkbox("중단된 수집 이어하기(RESUME)", value=getattr(core, "RESUME", True),
+                             help="이전 실행이 중간에 끊겼다면 완료된 URL/상품은 건너뛰고 남은 것만 수집합니다.")
+        follow_pages = st.checkbox("다음 페이지 자동 수집(FOLLOW_PAGES)", value=getattr(core, "FOLLOW_PAGES", True),
+                                   help="URL 의 page= 값을 올려가며 새 상품이 안 나올 때까지 수집합니다.")
+        max_pages = st.number_input("최대 페이지 수(MAX_PAGES)", min_value=1, max_value=500, value=getattr(core, "MAX_PAGES", 50), step=1)
+        delta_mode = st.checkbox("변경된 상품만 기록(DELTA_MODE)", value=getattr(core, "DELTA_MODE", False),
+                                 help="이전 수집과 상품명/가격/배송비/리뷰/평점/이미지가 같으면 건너뛰고, 신규·변경 상품만 '변경필드'와 함께 저장합니다.")
         download_images = st.checkbox("이미지 저장(DOWNLOAD_IMAGES)", value=getattr(core, "DOWNLOAD_IMAGES", True))
         headless = st.checkbox("헤드리스(브라우저 창 숨김)", value=True)
+        lean_browser = st.checkbox("가벼운 브라우저(LEAN_BROWSER)", value=getattr(core, "LEAN_BROWSER", True),
+                                   help="브라우저에서 이미지·동영상·폰트·광고/분석 스크립트를 받지 않고 DOM 만 읽습니다. 이미지 파일은 별도로 내려받습니다.")
+        metrics_on = st.checkbox("단계별 시간 표시(METRICS)", value=getattr(core, "METRICS_ENABLED", False),
+                                 help="페이지 로딩·스크롤·카드 파싱·이미지 다운로드·자동 저장 등 단계별 소요 시간을 표로 보여줍니다.")
+        mode_opts = ["auto", "http", "browser"]
+        fetch_mode = st.selectbox("수집 방식(FETCH_MODE)", mode_opts, index=mode_opts.index(getattr(core, "FETCH_MODE", "auto")),
+                                  help="auto: HTTP 로 먼저 받아 파싱, 상품 앵커가 없을 때만 브라우저 / http: 브라우저 미사용 / browser: 항상 셀레니움")
+        sink_opts = ["xlsx", "jsonl", "csv", "sqlite"]
+        sink = st.selectbox("저장 방식(SINK)", sink_opts, index=sink_opts.index(getattr(core, "SINK", "xlsx")),
+                            help="xlsx: 자동 저장마다 워크북 전체 저장 / jsonl·csv·sqlite: 행 단위 즉시 기록 후 종료 시 엑셀 생성(대량 수집용)")
         autosave_every = st.number_input("자동 저장 간격(AUTOSAVE_EVERY)", min_value=1, max_value=100, value=getattr(core, "AUTOSAVE_EVERY", 10), step=1)
         wait_sec = st.number_input("대기시간(초)", min_value=3, max_value=60, value=getattr(core, "WAIT_SEC", 12), step=1)
         pageload_timeout = st.number_input("페이지로드 타임아웃(초)", min_value=10, max_value=120, value=getattr(core, "PAGELOAD_TIMEOUT", 25), step=1)
+        pool_workers = st.number_input("동시 브라우저 수(마켓 병렬)", min_value=1, max_value=max(1, os.cpu_count() or 1), value=1, step=1,
+                                       help="2 이상이면 마켓(스토어)별로 헤드리스 크롬 프로세스를 나눠 동시에 수집합니다.")
 
         base_dir = st.text_input("BASE_DIR", value=getattr(core, "BASE_DIR", r"C:\singlefiless"))
         excel_path = st.text_input("엑셀 경로", value=getattr(core, "EXCEL_PATH", os.path.join(base_dir, "네이버_상품정보_수집_확장.xlsx")))
@@ -47,52 +220,111 @@ def render_crawler_section():
     urls: List[str] = [u.strip() for u in urls_text.splitlines() if u.strip()]
     log_box = st.empty()
     prog = st.progress(0, text="대기 중…")
-    run = st.button("🚀 크롤링 시작", type="primary", use_container_width=True)
+    metrics_box = st.empty()
+    captcha_box = st.empty()
+    live_stats, live_markets, live_preview = st.empty(), st.empty(), st.empty()
+    cfg = {
+        "BASE_DIR": base_dir, "EXCEL_PATH": excel_path, "DOWNLOAD_IMAGES": bool(download_images),
+        "AUTOSAVE_EVERY": int(autosave_every), "SINK": sink, "RESUME": bool(resume), "FOLLOW_PAGES": bool(follow_pages),
+        "MAX_PAGES": int(max_pages), "DELTA_MODE": bool(delta_mode), "FETCH_MODE": fetch_mode, "WAIT_SEC": int(wait_sec),
+        "PAGELOAD_TIMEOUT": int(pageload_timeout), "METRICS_ENABLED": bool(metrics_on), "LEAN_BROWSER": bool(lean_browser),
+    }
+    c1, c2 = st.columns([3, 2])
+    run = c1.button("🚀 크롤링 시작", type="primary", use_container_width=True)
+    queue_job = c2.button("📥 백그라운드 작업으로 추가", use_container_width=True, disabled=jobs is None,
+                          help="브라우저 탭을 닫거나 새로고침해도 계속 수집합니다. 아래 '크롤 작업'에서 진행 상황 확인/결과 다운로드.")
+
+    if queue_job:
+        if not urls:
+            st.warning("URL 을 입력하세요.")
+        else:
+            job_id = jobs.submit(urls, dict(cfg, HEADLESS=bool(headless), POOL_WORKERS=int(pool_workers)),
+                                 owner=st.session_state.get("crawl_owner", ""))
+            st.success(f"작업 {job_id} 대기열에 추가됨")
+
+    if jobs is not None:
+        _render_jobs_panel()
 
     if run:
-        core.BASE_DIR = base_dir
-        core.EXCEL_PATH = excel_path
-        core.DOWNLOAD_IMAGES = bool(download_images)
-        core.AUTOSAVE_EVERY = int(autosave_every)
-        core.WAIT_SEC = int(wait_sec)
-        core.PAGELOAD_TIMEOUT = int(pageload_timeout)
-
-        from selenium.webdriver.chrome.options import Options
-        def _make_driver_with_headless():
-            d, w = core.make_driver()
-            if headless:
-                try:
-                    d.quit()
-                except: pass
-                opts = Options()
-                opts.add_argument("--disable-blink-features=AutomationControlled")
-                opts.add_argument("--lang=ko-KR")
-                opts.add_argument("start-maximized")
-                opts.add_argument(f"user-agent={core.UA}")
-                opts.add_argument("--headless=new")
-                try:
-                    d = core.webdriver.Chrome(options=opts)
-                except:
-                    from selenium.webdriver.chrome.service import Service
-                    d = core.webdriver.Chrome(service=Service(core.CHROMEDRIVER_PATH), options=opts)
-                d.set_page_load_timeout(core.PAGELOAD_TIMEOUT)
-                d.execute_cdp_cmd(
-                    "Page.addScriptToEvaluateOnNewDocument",
-                    {"source": "Object.defineProperty(navigator,'webdriver',{get:()=>undefined});"}
-                )
-                w = core.WebDriverWait(d, core.WAIT_SEC)
-            return d, w
+        for k, v in cfg.items():
+            setattr(core, k, v)
+        core.METRICS.hook = (lambda rows: metrics_box.dataframe(rows, use_container_width=True, hide_index=True)) if metrics_on else None
 
-        try:
-            driver, wait = _make_driver_with_headless()
-        except Exception as e:
-            st.error(f"웹드라이버 생성 실패: {e}")
-            st.stop()
+        live = _LiveView(live_stats, live_markets, live_preview)
+
+        def _on_event(ev: dict):
+            live.on_event(ev)
+            # 캡차가 뜬 브라우저만 멈춰 있고, 풀리면 코어가 알아서 재개함 — 여기선 알림만
+            if ev["type"] == "captcha":
+                captcha_box.warning(f"🧩 {ev['market']}: 캡차/보안 확인 감지 — 열린 브라우저 창에서 해결하면 자동으로 이어서 수집합니다 "
+                                    f"(최대 {ev['timeout']}초).")
+            elif ev["type"] == "captcha_cleared":
+                captcha_box.success(f"▶️ {ev['market']}: 캡차 해결 확인 — 수집 재개")
+            elif ev["type"] == "captcha_timeout":
+                if ev.get("headless"):
+                    captcha_box.error(f"⏭️ {ev['market']}: 캡차/보안 확인 감지 — 헤드리스 모드에서는 풀 수 없어 해당 페이지 건너뜀. "
+                                      f"헤드리스를 끄고 다시 실행하세요.")
+                else:
+                    captcha_box.error(f"⏭️ {ev['market']}: 캡차 대기 시간 초과 — 해당 페이지 건너뜀")
+            elif ev["type"] == "selector_drop":
+                st.toast(f"⚠️ {ev['market']}.{ev['field']}: 셀렉터 '{ev['strategy']}' 적중률 {ev['before']:.0%} → {ev['now']:.0%} — 점검 필요")
+
+        def _show_result(done: int, total: int, start_time: float, unit: str):
+            live.render(force=True)
+            try:
+                core.finalize_output()
+            except Exception as e:
+                log_box.warning(f"[저장 경고] 최종 저장 재시도 중: {e}")
+
+            dur = time.time() - start_time
+            st.success(f"완료. {done}/{total} {unit} 처리, 소요 {dur:0.1f}s")
+            if os.path.exists(core.EXCEL_PATH):
+                st.link_button("엑셀 열기", url=f"file:///{core.EXCEL_PATH}".replace("\\", "/"), use_container_width=True)
+            st.caption(f"엑셀: {core.EXCEL_PATH}")
+            img_root = getattr(core, "IMG_ROOT", os.path.join(core.BASE_DIR, "images"))
+            st.caption(f"이미지 저장 루트: {img_root}")
+
+        if int(pool_workers) > 1 and len(urls) > 1:
+            core.HEADLESS = True
+            total = max(len(core.group_urls_by_market(urls)), 1)
+            done = 0
+            start_time = time.time()
+            prog.progress(0, text=f"브라우저 {int(pool_workers)}개 병렬 수집 중… (0/{total} 마켓)")
+
+            def _on_result(res: dict):
+                nonlocal done
+                done += 1
+                if res.get("error"):
+                    log_box.error(f"[에러] {res['market']}\n{res['error']}")
+                else:
+                    log_box.write(f"### ✔ {res['market']} (URL {res['urls']}개, pid {res['pid']})")
+                prog.progress(done / total, text=f"진행 {done}/{total} 마켓")
+
+            core.add_event_hook(_on_event)
+            try:
+                core.crawl_markets_parallel(urls, int(pool_workers), on_result=_on_result)
+            finally:
+                core.remove_event_hook(_on_event)
+            _show_result(done, total, start_time, "마켓")
+            return
+
+        # 크롬은 처음 필요할 때만 — http 모드는 아예 안 띄우고, auto 는 HTTP 가 실패한 페이지가 나올 때 띄움
+        warm = {}
+        def _open_driver():
+            slot = _acquire_warm_driver(bool(headless), bool(lean_browser), int(pageload_timeout), int(wait_sec))
+            if slot is not None:
+                warm["slot"] = slot
+                return slot["driver"], slot["wait"]
+            # 다른 세션이 공용 드라이버 사용 중 → 이번 실행만 쓸 임시 드라이버
+            return core.build_driver(headless=bool(headless), lean=bool(lean_browser))
+        driver = None if fetch_mode == "http" else core.LazyDriver(_open_driver)
+        wait = None
 
         done = 0
         total = max(len(urls), 1)
         start_time = time.time()
 
+        core.add_event_hook(_on_event)
         try:
             for u in urls:
                 prog.progress(done / total, text=f"로딩 중… ({done}/{total})")
@@ -103,25 +335,14 @@ def render_crawler_section():
                     log_box.error(f"[에러] {u}\n{e}\n{traceback.format_exc()}")
                 done += 1
                 prog.progress(done / total, text=f"진행 {done}/{total}")
-                time.sleep(random.uniform(0.3, 0.8))
-
-            try:
-                core.safe_save_workbook(core.wb, core.EXCEL_PATH)
-            except Exception as e:
-                log_box.warning(f"[저장 경고] 최종 저장 재시도 중: {e}")
 
-            dur = time.time() - start_time
-            st.success(f"완료. {done}/{total} URL 처리, 소요 {dur:0.1f}s")
-            if os.path.exists(core.EXCEL_PATH):
-                st.link_button("엑셀 열기", url=f"file:///{core.EXCEL_PATH}".replace("\\", "/"), use_container_width=True)
-            st.caption(f"엑셀: {core.EXCEL_PATH}")
-            img_root = getattr(core, "IMG_ROOT", os.path.join(core.BASE_DIR, "images"))
-            st.caption(f"이미지 저장 루트: {img_root}")
+            _show_result(done, total, start_time, "URL")
         finally:
-            try:
-                driver.quit()
-            except:
-                pass
+            core.remove_event_hook(_on_event)
+            if "slot" in warm:
+                warm["slot"]["lock"].release()  # 드라이버는 다음 실행을 위해 살려 둠
+            elif driver is not None:
+                driver.quit()  # 임시 드라이버 (띄운 적 없으면 아무것도 안 함)
 
 if __name__ == "__main__":
     st.set_page_config(page_title="ENVY — SmartStore Crawler", layout="wide")